@@ -1,8 +1,27 @@
 from .connection import create_connection, SSDBConnection
-from .errors import SSDBError, ReplyError, ConnectionClosedError, ProtocolError, PoolClosedError
+from .errors import SSDBError, ReplyError, ConnectionClosedError, ProtocolError, PoolClosedError, CircuitOpenError, \
+    CompressionError
 from .parser import SSDBParser
 from .pool import create_pool, SSDBConnectionPool
 from .client import Client
+from .slowlog import SlowLog, SlowLogEntry
+from .retry import RetryPolicy, CircuitBreaker
+from .flow import FlowControl
+from .consumer import QueueConsumer, QueueProducer
+from .scan import ParallelScan
+from .lanes import Lane
+from .autoscale import AutoScaler
+from .compression import Compression, CompressionPolicy
+from .codecs import Codec, register_codec, get_codec
+from .columnar import ColumnarList, ColumnarPairs
+from .offload import ReplyOffload
+from .hedge import HedgePolicy
+from .sync import SyncClient
+from .negcache import NegativeCache
+from .counters import CounterAggregator
+from .capture import TrafficCapture
+from .stubserver import StubServer
+from .serverstats import ServerStatsPoller
 
 __version__ = '0.0.1'
 __author__ = "Kevin Du"
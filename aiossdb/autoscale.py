@@ -0,0 +1,111 @@
+import time
+import collections
+
+
+AutoScaleDecision = collections.namedtuple('AutoScaleDecision', [
+    'timestamp', 'action', 'size', 'maxsize', 'wait', 'waiting', 'latency'])
+
+
+class AutoScaler:
+    """根据获取连接的等待时间和服务器延迟动态调整连接池的maxsize
+
+    每个interval秒做一次决策:
+        等待时间的EWMA超过target_wait，或者等待连接的协程数超过max_waiting时扩容step条连接，
+        但是如果命令延迟明显高于基线(latency_factor倍)或者超过latency_ceiling，
+        说明SSDB已经饱和，增加连接只会更慢，这时保持不变
+        没有等待并且有空闲超过idle_timeout秒的连接时，关闭空闲连接并缩小maxsize，但不低于minsize
+
+    :param max_limit: maxsize可以增长到的上限
+    """
+
+    GROW = 'grow'
+    SHRINK = 'shrink'
+    HOLD = 'hold'
+    SATURATED = 'saturated'
+    AT_LIMIT = 'at_limit'
+
+    def __init__(self, max_limit, *, target_wait=0.005, max_waiting=0, interval=1.0, idle_timeout=30.0, step=1,
+                 latency_factor=2.0, latency_ceiling=None, alpha=0.3, history=64):
+        assert max_limit > 0, ("max_limit must be > 0", max_limit)
+        assert 0 < alpha <= 1, ("alpha must be in (0, 1]", alpha)
+        self.max_limit = max_limit
+        self.target_wait = target_wait
+        self.max_waiting = max_waiting
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.step = step
+        self.latency_factor = latency_factor
+        self.latency_ceiling = latency_ceiling
+        self.alpha = alpha
+        self.wait = 0.0
+        self.latency = None
+        self.baseline_latency = None
+        self._observed = 0
+        self._decisions = collections.Counter()
+        self._history = collections.deque(maxlen=history)
+
+    def observe(self, wait, latency):
+        """每条命令完成后调用，记录获取连接的等待时间和命令的执行时间"""
+        self._observed += 1
+        self.wait += self.alpha * (wait - self.wait)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+
+    @property
+    def saturated(self):
+        if self.latency is None:
+            return False
+        if self.latency_ceiling is not None and self.latency > self.latency_ceiling:
+            return True
+        return self.baseline_latency is not None and self.latency > self.baseline_latency * self.latency_factor
+
+    def _update_baseline(self):
+        if self.latency is None:
+            return
+        if self.baseline_latency is None or self.latency < self.baseline_latency:
+            self.baseline_latency = self.latency
+        else:
+            # 基线缓慢的向当前延迟靠拢，避免一次偶然的低延迟让基线一直过低
+            self.baseline_latency += 0.01 * (self.latency - self.baseline_latency)
+
+    def decide(self, *, size, maxsize, minsize, waiting, idle):
+        """返回本次的决策，idle是空闲超过idle_timeout的连接数"""
+        if not self._observed:
+            # 这段时间没有命令也就没有等待，只是衰减的话永远不会降到0，target_wait为0时会一直扩容
+            self.wait = 0.0
+        self._observed = 0
+        if self.wait > self.target_wait or waiting > self.max_waiting:
+            if self.saturated:
+                action = self.SATURATED
+            elif maxsize >= self.max_limit:
+                action = self.AT_LIMIT
+            else:
+                action = self.GROW
+        elif idle and size > minsize:
+            action = self.SHRINK
+        else:
+            action = self.HOLD
+        if action != self.SATURATED:
+            self._update_baseline()
+        self._decisions[action] += 1
+        self._history.append(AutoScaleDecision(time.time(), action, size, maxsize, self.wait, waiting, self.latency))
+        return action
+
+    def history(self, count=None):
+        """最近的决策记录，最新的在最前面"""
+        entries = list(reversed(self._history))
+        return entries if count is None else entries[:count]
+
+    def stats(self):
+        return {
+            'wait': self.wait,
+            'latency': self.latency,
+            'baseline_latency': self.baseline_latency,
+            'decisions': dict(self._decisions),
+            'last_action': self._history[-1].action if self._history else None,
+        }
+
+    def __repr__(self):
+        return '<AutoScaler [max_limit:{}, wait:{:.6f}, latency:{}]>'.format(self.max_limit, self.wait, self.latency)
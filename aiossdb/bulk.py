@@ -0,0 +1,487 @@
+"""SSDB数据的批量导入导出
+
+从源数据库使用scan/hscan/zscan分页读取数据，再使用multi_set/multi_hset/multi_zset
+分批写入目标数据库，写入使用多条连接并发，每条连接上一次发送多个批次(pipeline)
+也可以导出到文件或者从文件导入，文件中每条记录就是一条编码好的multi_*请求
+
+kv的过期时间会被保留: 每页数据在同一条连接上连续查询ttl，有过期时间的key使用setx写入剩余的秒数，
+期间已经过期或者被删除的key不会复制；导出到文件的是导出时剩余的秒数，导入时从导入的时间重新开始计算；
+hash和zset在SSDB中没有过期时间
+
+命令行用法:
+    python -m aiossdb.bulk copy 127.0.0.1:8888 127.0.0.1:8889
+    python -m aiossdb.bulk dump 127.0.0.1:8888 backup.dump.gz
+    python -m aiossdb.bulk load backup.dump.gz 127.0.0.1:8889
+
+源和目标连接池应该使用encoding=None创建，否则二进制数据无法正确复制
+"""
+import os
+import gzip
+import json
+import asyncio
+import argparse
+import collections
+
+from .log import logger
+from .parser import encode_command
+from .pool import create_pool
+
+
+DUMP_HEADER = b'AIOSSDB-DUMP 1\n'
+
+KV, HASH, ZSET = 'kv', 'hash', 'zset'
+STAGES = (KV, HASH, ZSET)
+
+# 一个写入批次，args是编码前的参数，marker是写完这个批次之后可以断点续传的位置
+# setx的批次包含多个key，args是(key, value, ttl)依次排列，每个key写入一条setx
+Chunk = collections.namedtuple('Chunk', ['command', 'args', 'count', 'marker'])
+
+
+def _chunk_commands(chunk):
+    if chunk.command == 'setx':
+        return [('setx', chunk.args[i:i + 3]) for i in range(0, len(chunk.args), 3)]
+    return [(chunk.command, chunk.args)]
+
+
+def _to_text(value):
+    """二进制的key保存到json中，latin-1可以无损的来回转换"""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode('latin-1')
+    return value
+
+
+def _to_bytes(value):
+    return value.encode('latin-1') if isinstance(value, str) else value
+
+
+class RateLimiter:
+    """令牌桶限速，rate是每秒允许写入的条数"""
+
+    def __init__(self, rate, burst=None, loop=None):
+        assert rate > 0, ("rate must be > 0", rate)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.rate = rate
+        self.burst = burst or rate
+        self._loop = loop
+        self._tokens = self.burst
+        self._last = loop.time()
+
+    @asyncio.coroutine
+    def acquire(self, count):
+        while 1:
+            now = self._loop.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # 一个批次可能比burst还大，令牌攒满之后就放行，允许令牌变成负数
+            if self._tokens >= min(count, self.burst):
+                self._tokens -= count
+                return
+            yield from asyncio.sleep((min(count, self.burst) - self._tokens) / self.rate, loop=self._loop)
+
+
+class Checkpoint:
+    """断点续传的检查点，记录按顺序全部写完的最后一个位置
+
+    写入是并发的，批次完成的顺序和读取的顺序不一定相同，
+    只有某个批次之前的所有批次都完成了，才会把它的位置保存下来
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # 导出到文件的时候，检查点对应的文件位置(未压缩的)
+        self.offset = None
+        self._next_seq = 0
+        self._done = {}
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            state = json.load(f)
+        self.offset = state.get('offset')
+        return state['marker']
+
+    def done(self, seq, marker, offset=None):
+        self._done[seq] = marker, offset
+        advanced = False
+        while self._next_seq in self._done:
+            marker, offset = self._done.pop(self._next_seq)
+            self._next_seq += 1
+            advanced = True
+        if advanced:
+            self.save(marker, offset)
+
+    def save(self, marker, offset=None):
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'marker': marker, 'offset': offset}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _open_dump(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def _truncate_dump(path, offset):
+    """丢弃dump文件中最后一个检查点之后写入的记录，offset是未压缩的文件位置"""
+    if not path.endswith('.gz'):
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+        return
+    # gzip文件不能直接截断，中断时最后一段压缩数据也可能不完整，把offset之前的数据复制到新文件
+    tmp = path + '.tmp'
+    with gzip.open(path, 'rb') as src, gzip.open(tmp, 'wb') as dst:
+        remaining = offset
+        while remaining:
+            data = src.read(min(remaining, 1 << 20))
+            if not data:
+                raise ValueError("Dump file {} is shorter than the checkpoint offset {}".format(path, offset))
+            dst.write(data)
+            remaining -= len(data)
+    os.replace(tmp, path)
+
+
+@asyncio.coroutine
+def _kv_ttls(pool, keys):
+    """返回每个key剩余的过期秒数，没有过期时间的是-1，已经不存在的是None
+
+    ttl对不存在的key也返回-1，所以之后再用exists确认，避免把已经过期的key复制成永久的key"""
+    conn, address = yield from pool.get_connection()
+    try:
+        replies = yield from asyncio.gather(*[conn.execute(command, key)
+                                              for key in keys for command in ('ttl', 'exists')])
+    finally:
+        yield from pool.release(conn)
+    ttls = []
+    for i in range(0, len(replies), 2):
+        ttl, exists = int(replies[i][0]), int(replies[i + 1][0])
+        ttls.append(ttl if exists else None)
+    return ttls
+
+
+@asyncio.coroutine
+def scan_chunks(pool, queue, *, chunk_size=1000, marker=None):
+    """从连接池分页读取所有的kv、hash、zset数据，放入queue，最后放入None
+    marker是上次中断时保存的位置: [stage, name, key, score]"""
+    stage, name, key, score = marker or (KV, '', '', '')
+    name, key, score = _to_bytes(name), _to_bytes(key), _to_bytes(score)
+    stage_index = STAGES.index(stage)
+
+    if stage_index == 0:
+        while 1:
+            res = yield from pool.execute('scan', key, '', chunk_size)
+            if not res:
+                break
+            previous, key = [KV, '', _to_text(key), ''], res[-2]
+            ttls = yield from _kv_ttls(pool, res[::2])
+            plain, expiring = [], []
+            for i, ttl in enumerate(ttls):
+                if ttl is None:
+                    continue
+                if ttl < 0:
+                    plain.extend(res[i * 2:i * 2 + 2])
+                else:
+                    expiring.extend((res[i * 2], res[i * 2 + 1], max(ttl, 1)))
+            # 同一页拆成两个批次，只有后一个批次写完之后才能从这一页之后续传
+            chunks = [Chunk('multi_set', plain, len(plain) // 2, previous)] if plain else []
+            if expiring:
+                chunks.append(Chunk('setx', expiring, len(expiring) // 3, previous))
+            for i, chunk in enumerate(chunks):
+                if i == len(chunks) - 1:
+                    chunk = chunk._replace(marker=[KV, '', _to_text(key), ''])
+                yield from queue.put(chunk)
+            if len(res) < chunk_size * 2:
+                break
+        name, key, score = b'', b'', b''
+
+    for list_cmd, stage in (('hlist', HASH), ('zlist', ZSET)):
+        if STAGES.index(stage) < stage_index:
+            continue
+        if STAGES.index(stage) > stage_index:
+            name, key, score = b'', b'', b''
+        # 续传的时候先把中断的那个hash/zset剩下的部分写完
+        names = [name] if name else []
+        name_start = name
+        while 1:
+            for name in names:
+                if stage == HASH:
+                    yield from _scan_hash(pool, queue, name, key, chunk_size)
+                else:
+                    yield from _scan_zset(pool, queue, name, key, score, chunk_size)
+                key, score = b'', b''
+            names = yield from pool.execute(list_cmd, name_start, '', chunk_size)
+            if not names:
+                break
+            name_start = names[-1]
+    yield from queue.put(None)
+
+
+@asyncio.coroutine
+def _scan_hash(pool, queue, name, key, chunk_size):
+    while 1:
+        res = yield from pool.execute('hscan', name, key, '', chunk_size)
+        if not res:
+            return
+        key = res[-2]
+        yield from queue.put(Chunk('multi_hset', [name] + res, len(res) // 2,
+                                   [HASH, _to_text(name), _to_text(key), '']))
+        if len(res) < chunk_size * 2:
+            return
+
+
+@asyncio.coroutine
+def _scan_zset(pool, queue, name, key, score, chunk_size):
+    while 1:
+        res = yield from pool.execute('zscan', name, key, score, '', chunk_size)
+        if not res:
+            return
+        key, score = res[-2], res[-1]
+        yield from queue.put(Chunk('multi_zset', [name] + res, len(res) // 2,
+                                   [ZSET, _to_text(name), _to_text(key), _to_text(score)]))
+        if len(res) < chunk_size * 2:
+            return
+
+
+def _read_record(f):
+    """读取一条dump记录，返回命令和参数的列表，文件结束返回None"""
+    blocks = []
+    while 1:
+        line = f.readline()
+        if not line:
+            if blocks:
+                raise ValueError("Truncated dump record")
+            return None
+        if line == b'\n':
+            return blocks
+        size = int(line)
+        blocks.append(f.read(size))
+        f.read(1)
+
+
+@asyncio.coroutine
+def read_dump_chunks(path, queue, *, marker=None, loop=None):
+    """从dump文件读取记录放入queue，marker是上次中断时的文件位置"""
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    with _open_dump(path, 'rb') as f:
+        header = f.readline()
+        if header != DUMP_HEADER:
+            raise ValueError("Invalid dump file header: {!r}".format(header))
+        if marker:
+            f.seek(marker[1])
+        while 1:
+            record = yield from loop.run_in_executor(None, _read_record, f)
+            if record is None:
+                break
+            command = record[0].decode('ascii')
+            args = record[1:]
+            if command == 'setx':
+                count = 1
+            else:
+                count = len(args) // 2 if command == 'multi_set' else (len(args) - 1) // 2
+            yield from queue.put(Chunk(command, args, count, ['offset', f.tell()]))
+    yield from queue.put(None)
+
+
+class BulkLoader:
+    """批量数据的搬运，producer读取数据放入有界队列，多个writer并发写入
+
+    :param chunk_size: 每个批次的条数
+    :param concurrency: 并发写入的连接数
+    :param pipeline: 每条连接上一次最多同时发送的批次数
+    :param rate: 每秒最多写入的条数，None不限速
+    :param checkpoint: 检查点文件路径，存在的时候从上次中断的位置继续
+    """
+
+    def __init__(self, *, chunk_size=1000, concurrency=4, pipeline=4, rate=None, checkpoint=None, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.pipeline = pipeline
+        self._loop = loop
+        self._limiter = RateLimiter(rate, loop=loop) if rate else None
+        self._checkpoint = Checkpoint(checkpoint)
+        # 有界队列，写入跟不上的时候读取会在这里等待
+        self._queue = asyncio.Queue(maxsize=concurrency * pipeline * 2, loop=loop)
+        self._seq = 0
+        self.items = 0
+        self.chunks = 0
+
+    @asyncio.coroutine
+    def copy(self, source, target):
+        """从源连接池复制到目标连接池"""
+        return (yield from self._run(self._scan_producer(source), self._pool_writer(target), self.concurrency))
+
+    @asyncio.coroutine
+    def dump(self, source, path):
+        """从源连接池导出到文件，续传的时候先截断到检查点的位置，再追加到原来的文件"""
+        resume = self._checkpoint.load() is not None and os.path.exists(path)
+        if resume and self._checkpoint.offset is not None:
+            yield from self._loop.run_in_executor(None, _truncate_dump, path, self._checkpoint.offset)
+        f = _open_dump(path, 'ab' if resume else 'wb')
+        # gzip追加的时候是一个新的压缩段，tell从0开始，需要加上之前的数据长度
+        base = (self._checkpoint.offset or 0) if resume and path.endswith('.gz') else 0
+        try:
+            if not resume:
+                f.write(DUMP_HEADER)
+            # 文件需要按顺序写入，所以只有一个writer
+            return (yield from self._run(self._scan_producer(source), self._file_writer(f, base), 1))
+        finally:
+            f.close()
+
+    @asyncio.coroutine
+    def load(self, path, target):
+        """从文件导入到目标连接池"""
+        producer = read_dump_chunks(path, self._queue, marker=self._checkpoint.load(), loop=self._loop)
+        return (yield from self._run(producer, self._pool_writer(target), self.concurrency))
+
+    def _scan_producer(self, source):
+        return scan_chunks(source, self._queue, chunk_size=self.chunk_size, marker=self._checkpoint.load())
+
+    @asyncio.coroutine
+    def _run(self, producer, writer, workers):
+        start = self._loop.time()
+        tasks = [asyncio.ensure_future(producer, loop=self._loop)]
+        tasks.extend(asyncio.ensure_future(writer(), loop=self._loop) for i in range(workers))
+        try:
+            yield from asyncio.gather(*tasks, loop=self._loop)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        self._checkpoint.clear()
+        elapsed = self._loop.time() - start
+        logger.info("Bulk transfer finished: %d items in %d chunks, %.2fs", self.items, self.chunks, elapsed)
+        return {'items': self.items, 'chunks': self.chunks, 'elapsed': elapsed}
+
+    @asyncio.coroutine
+    def _next_batch(self):
+        """取出最多pipeline个批次，第一个需要等待，后面的有多少取多少
+        批次的编号在取出的时候分配，和producer放入的顺序一致"""
+        batch = []
+        chunk = yield from self._queue.get()
+        while chunk is not None:
+            batch.append((self._seq, chunk))
+            self._seq += 1
+            if len(batch) >= self.pipeline or self._queue.empty():
+                break
+            chunk = self._queue.get_nowait()
+        if chunk is None:
+            # 放回结束标记，让其它writer也能结束
+            self._queue.put_nowait(None)
+        return batch, chunk is None
+
+    def _finish(self, batch, offsets=None):
+        for i, (seq, chunk) in enumerate(batch):
+            self.items += chunk.count
+            self.chunks += 1
+            self._checkpoint.done(seq, chunk.marker, offsets[i] if offsets else None)
+
+    def _pool_writer(self, pool):
+        @asyncio.coroutine
+        def writer():
+            while 1:
+                batch, finished = yield from self._next_batch()
+                if batch:
+                    if self._limiter is not None:
+                        yield from self._limiter.acquire(sum(chunk.count for seq, chunk in batch))
+                    conn, address = yield from pool.get_connection()
+                    try:
+                        # 一次发送多个批次，然后统一等待返回
+                        yield from asyncio.gather(*[conn.execute(command, *args) for seq, chunk in batch
+                                                    for command, args in _chunk_commands(chunk)], loop=self._loop)
+                    finally:
+                        yield from pool.release(conn)
+                    self._finish(batch)
+                if finished:
+                    return
+        return writer
+
+    def _file_writer(self, f, base=0):
+        @asyncio.coroutine
+        def writer():
+            while 1:
+                batch, finished = yield from self._next_batch()
+                if batch:
+                    if self._limiter is not None:
+                        yield from self._limiter.acquire(sum(chunk.count for seq, chunk in batch))
+                    records = [b''.join(encode_command(command, *args) for command, args in _chunk_commands(chunk))
+                               for seq, chunk in batch]
+                    # 每个批次写完之后的文件位置，续传的时候截断到检查点对应的位置
+                    offsets = []
+                    offset = base + f.tell()
+                    for record in records:
+                        offset += len(record)
+                        offsets.append(offset)
+                    yield from self._loop.run_in_executor(None, f.write, b''.join(records))
+                    yield from self._loop.run_in_executor(None, f.flush)
+                    self._finish(batch, offsets)
+                if finished:
+                    return
+        return writer
+
+
+def _parse_address(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m aiossdb.bulk', description="SSDB bulk copy/dump/load",
+        epilog="kv expiry is preserved: keys with a TTL are written with setx using the remaining seconds, "
+               "keys that expire during the transfer are skipped. hash and zset have no TTL in SSDB.")
+    parser.add_argument('action', choices=['copy', 'dump', 'load'])
+    parser.add_argument('source', help="host:port, or dump file for load")
+    parser.add_argument('target', help="host:port, or dump file for dump")
+    parser.add_argument('--source-password')
+    parser.add_argument('--target-password')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--pipeline', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=None, help="max items per second")
+    parser.add_argument('--checkpoint', default=None, help="checkpoint file used to resume")
+    args = parser.parse_args(argv)
+
+    loop = asyncio.get_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        loader = BulkLoader(chunk_size=args.chunk_size, concurrency=args.concurrency, pipeline=args.pipeline,
+                            rate=args.rate, checkpoint=args.checkpoint, loop=loop)
+        pools = []
+        try:
+            if args.action != 'load':
+                source = yield from create_pool(_parse_address(args.source), password=args.source_password,
+                                                encoding=None, loop=loop)
+                pools.append(source)
+            if args.action != 'dump':
+                target = yield from create_pool(_parse_address(args.target), password=args.target_password,
+                                                encoding=None, loop=loop, maxsize=args.concurrency)
+                pools.append(target)
+            if args.action == 'copy':
+                return (yield from loader.copy(source, target))
+            elif args.action == 'dump':
+                return (yield from loader.dump(source, args.target))
+            return (yield from loader.load(args.source, target))
+        finally:
+            for pool in pools:
+                pool.close()
+                yield from pool.wait_closed()
+
+    result = loop.run_until_complete(run())
+    print("{items} items in {chunks} chunks, {elapsed:.2f}s".format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""命令流量的录制，录制的文件可以使用aiossdb.replay回放
+
+文件是文本格式(路径以.gz结尾时使用gzip压缩)，第一行是文件头，之后每行一条命令:
+    时间(相对录制开始的秒数)\t命令\t参数\t参数...
+参数的格式:
+    #100        value参数，只记录长度，回放时使用相同长度的填充数据
+    k1f2e...    匿名化之后的key，相同的key得到相同的值，保留了热点key的分布
+    =abc        原样保存的参数(经过url编码)，limit、过期时间、分数这类参数(见commands.LITERAL_ARGS)
+                和空字符串总是原样保存
+auth命令不会被录制，避免密码出现在文件中
+"""
+import time
+import gzip
+import random
+import asyncio
+import hashlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_from_bytes, unquote_to_bytes
+
+from .commands import VALUE_ARGS, literal_positions, value_positions
+from .log import logger
+from .parser import utf8_encode
+
+
+CAPTURE_HEADER = '# aiossdb-capture 1\n'
+
+# 不录制的命令
+UNRECORDED_COMMANDS = frozenset(['auth'])
+
+# 一条录制的命令，time是相对录制开始的秒数
+Record = collections.namedtuple('Record', ['time', 'command', 'args'])
+
+
+def _open_capture(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='ascii')
+    return open(path, mode, encoding='ascii')
+
+
+class TrafficCapture:
+    """录制连接上发送的命令，通过create_pool或者create_connection的capture参数使用
+
+    只在内存中缓存格式化之后的行，达到buffer_size行或者调用flush的时候交给一个后台线程写入文件，
+    压缩和写文件不会阻塞事件循环，value只记录长度，不会在内存中保留value
+
+    :param sample_rate: 录制的命令比例，回放时的速率也是原来的这个比例，可以使用回放的speed参数补偿
+    :param anonymize: key使用加盐的哈希代替，为False时原样保存key
+    :param salt: 哈希使用的盐，默认随机生成，需要多次录制的key保持一致时指定
+    :param max_records: 最多录制的命令数，达到之后不再录制
+    """
+
+    def __init__(self, path, *, sample_rate=1.0, anonymize=True, salt=None, max_records=None, buffer_size=1024,
+                 clock=time.monotonic, loop=None):
+        assert 0 < sample_rate <= 1, ("sample_rate must be in (0, 1]", sample_rate)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.path = path
+        self.sample_rate = sample_rate
+        self.anonymize = anonymize
+        self.max_records = max_records
+        self.buffer_size = buffer_size
+        self._salt = utf8_encode(salt) if salt is not None else random.getrandbits(64).to_bytes(8, 'big')
+        self._clock = clock
+        self._start = clock()
+        self._loop = loop
+        self._file = _open_capture(path, 'w')
+        self._file.write(CAPTURE_HEADER)
+        # 只有一个线程，写入按照flush的顺序进行
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._buffer = []
+        self._closed = False
+        # 统计数据
+        self._records = 0
+        self._skipped = 0
+        self._bytes = 0
+        self._errors = 0
+
+    def record(self, command, args):
+        if self._closed or command in UNRECORDED_COMMANDS or (
+                self.max_records is not None and self._records >= self.max_records):
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self._skipped += 1
+            return
+        self._records += 1
+        values = value_positions(VALUE_ARGS, command, len(args)) if command in VALUE_ARGS else ()
+        literals = literal_positions(command, len(args))
+        fields = ['{:.6f}'.format(self._clock() - self._start), command]
+        for i, arg in enumerate(args):
+            arg = utf8_encode(arg)
+            if i in values:
+                fields.append('#{}'.format(len(arg)))
+            elif self.anonymize and arg and i not in literals:
+                fields.append('k' + hashlib.sha1(self._salt + arg).hexdigest()[:16])
+            else:
+                # 空字符串(scan这类命令的范围边界)和limit等参数原样保存才能正确回放
+                fields.append('=' + quote_from_bytes(arg, safe=''))
+        self._buffer.append('\t'.join(fields))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """把缓存的行交给后台线程写入，返回写入完成的期物，没有需要写入的数据时返回None"""
+        if not self._buffer or self._closed:
+            return None
+        data = '\n'.join(self._buffer) + '\n'
+        self._buffer = []
+        self._bytes += len(data)
+        future = self._loop.run_in_executor(self._executor, self._write, data)
+        future.add_done_callback(self._write_done)
+        return future
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+
+    def _write_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self._errors += 1
+            logger.error("Write capture file %s encountered error: %r", self.path, future.exception())
+
+    def close(self):
+        """写入剩余的数据并关闭文件，会阻塞直到后台线程写完，停止录制的时候调用一次"""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._executor.submit(self._file.close)
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            'records': self._records,
+            'skipped': self._skipped,
+            'buffered': len(self._buffer),
+            'bytes': self._bytes,
+            'errors': self._errors,
+        }
+
+    def __repr__(self):
+        return '<TrafficCapture [path:{}, records:{}, sample_rate:{}]>'.format(
+            self.path, self._records, self.sample_rate)
+
+
+def read_capture(path):
+    """逐条读取录制的命令，返回Record的生成器，匿名化的key回放时作为bytes类型的key"""
+    fillers = {}
+    with _open_capture(path, 'r') as f:
+        header = f.readline()
+        if header != CAPTURE_HEADER:
+            raise ValueError("Not an aiossdb capture file: {}".format(path))
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            args = []
+            for field in fields[2:]:
+                if field[0] == '#':
+                    size = int(field[1:])
+                    if size not in fillers:
+                        fillers[size] = b'x' * size
+                    args.append(fillers[size])
+                elif field[0] == '=':
+                    args.append(unquote_to_bytes(field[1:]))
+                else:
+                    args.append(field.encode('ascii'))
+            yield Record(float(fields[0]), fields[1], args)
@@ -1,15 +1,37 @@
 import asyncio
 import functools
+from aiossdb.codecs import get_codec, encode_args, decode_reply
+from aiossdb.commands import VALUE_ARGS, VALUE_REPLIES
+from aiossdb.errors import ReplyError
 from aiossdb.pool import create_pool
+from aiossdb.scan import ParallelScan
 
 
 class Client:
-    def __init__(self, host='127.0.0.1', port=8888, password=None, timeout=None, max_connection=100, loop=None):
+    def __init__(self, host='127.0.0.1', port=8888, password=None, timeout=None, max_connection=100, loop=None,
+                 slowlog=None, retry_policy=None, circuit_breaker=None, compression=None, codec=None,
+                 negative_cache=None, missing_ok=False, **pool_kwargs):
         self.host = host
         self.port = port
         self.password = password
         self.timeout = timeout
         self.max_connection = max_connection
+        # SlowLog对象，通过client.slowlog.get()读取慢命令记录
+        self.slowlog = slowlog
+        # 连接出错时的重试策略以及熔断器
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        # Compression对象，写入时压缩较大的value，读取时自动解压
+        self.compression = compression
+        # value的序列化方式，名称(raw、str、json、msgpack)或者Codec对象，执行命令时可以通过codec参数覆盖
+        self.codec = get_codec(codec)
+        # NegativeCache对象，最近返回not_found的get/hget在本地直接回答
+        self.negative_cache = negative_cache
+        # 为True时not_found返回None而不是引发ReplyError，执行命令时可以通过missing_ok参数覆盖
+        self.missing_ok = missing_ok
+        # 其它传给create_pool的参数，比如max_pending等
+        self.pool_kwargs = pool_kwargs
+        self.encoding = pool_kwargs.get('encoding', 'utf-8')
 
         if loop is None:
             loop = asyncio.new_event_loop()
@@ -22,15 +44,87 @@ class Client:
     def get_pool(self):
         if self._pool is None:
             self._pool = yield from create_pool((self.host, self.port), password=self.password, loop=self.loop,
-                                                timeout=self.timeout, maxsize=self.max_connection)
+                                                timeout=self.timeout, maxsize=self.max_connection,
+                                                slowlog=self.slowlog, retry_policy=self.retry_policy,
+                                                circuit_breaker=self.circuit_breaker, **self.pool_kwargs)
         return self._pool
 
     @asyncio.coroutine
-    def execute(self, cmd, *args):
-        pool = yield from self.get_pool()
-        res = yield from pool.execute(cmd, *args)
+    def execute(self, cmd, *args, **kwargs):
+        missing_ok = kwargs.pop('missing_ok', self.missing_ok)
+        cache = self.negative_cache
+        if cache is None:
+            res = yield from self._execute(cmd, *args, missing_ok=missing_ok, **kwargs)
+            return res
+        command = cmd.lower().strip()
+        if cache.get(command, args):
+            if missing_ok:
+                return None
+            raise ReplyError('not_found', command)
+        # 写命令在发送之前使缓存失效，读命令记下版本号，期间有写入的时候不记录not_found
+        cache.invalidate(command, args)
+        if command not in cache.commands:
+            try:
+                res = yield from self._execute(cmd, *args, missing_ok=missing_ok, **kwargs)
+            finally:
+                # 写入在途的时候，其它连接上开始的读取可能先于写入返回not_found，
+                # 写入完成之后再失效一次，清除这样的记录，并且让还在途的读取不再记录
+                cache.invalidate(command, args)
+            return res
+        version = cache.version
+        res = yield from self._execute(cmd, *args, missing_ok=True, **kwargs)
+        if res is None:
+            cache.add(command, args, version)
+            if not missing_ok:
+                raise ReplyError('not_found', command)
         return res
 
+    @asyncio.coroutine
+    def _execute(self, cmd, *args, **kwargs):
+        pool = yield from self.get_pool()
+        codec = get_codec(kwargs.pop('codec', self.codec))
+        if (self.compression is None and codec is None) or kwargs.get('reply_factory') is not None:
+            res = yield from pool.execute(cmd, *args, **kwargs)
+            return res
+        command = cmd.lower().strip()
+        if command in VALUE_ARGS:
+            # 先序列化再压缩，读取的时候顺序相反
+            if codec is not None:
+                args = encode_args(codec, command, args)
+            if self.compression is not None:
+                args = yield from self.compression.compress_args(command, args)
+        if command not in VALUE_REPLIES:
+            res = yield from pool.execute(cmd, *args, **kwargs)
+            return res
+        # 读取原始的bytes，解压和反序列化之后再解码其它元素
+        encoding = kwargs.pop('encoding', self.encoding)
+        if self.compression is None:
+            # 反序列化交给连接完成，配置了offload的时候较大的返回会在executor中反序列化
+            decoder = functools.partial(decode_reply, codec, command, encoding=encoding)
+            res = yield from pool.execute(cmd, *args, encoding=None, decoder=decoder, **kwargs)
+            return res
+        res = yield from pool.execute(cmd, *args, encoding=None, **kwargs)
+        if codec is None:
+            res = yield from self.compression.decompress_reply(command, res, encoding)
+            return res
+        res = yield from self.compression.decompress_reply(command, res)
+        return decode_reply(codec, command, res, encoding)
+
+    @asyncio.coroutine
+    def after_fork(self, loop=None):
+        """在fork出的子进程(比如gunicorn worker)启动时调用，使用子进程的事件循环，
+        丢弃从父进程继承的连接，并预先建立minsize条连接"""
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        if self._pool is None:
+            yield from self.get_pool()
+            return
+        yield from self._pool.after_fork(self.loop)
+
+    def parallel_scan(self, command='scan', name=None, start='', end='', **kwargs):
+        """并发的scan，返回ParallelScan，可以使用async for按页读取"""
+        kwargs.setdefault('loop', self.loop)
+        return ParallelScan(self, command, name, start, end, **kwargs)
+
     def __getattr__(self, item):
         if item not in self.__dict__:
             self.__dict__[item] = functools.partial(self.execute, item)
@@ -0,0 +1,138 @@
+import sys
+import json
+
+from .commands import VALUE_ARGS, VALUE_REPLIES, value_positions
+from .parser import utf8_encode
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec:
+    """value的序列化方式，decode的参数是解析器读到的bytearray，不需要先解码成str"""
+
+    name = None
+
+    def encode(self, value):
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '<{} [name:{}]>'.format(self.__class__.__name__, self.name)
+
+
+class RawCodec(Codec):
+    """原样返回bytes"""
+
+    name = 'raw'
+
+    def encode(self, value):
+        return utf8_encode(value)
+
+    def decode(self, data):
+        return bytes(data)
+
+
+class StrCodec(Codec):
+    name = 'str'
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+
+    def encode(self, value):
+        value = str(value) if isinstance(value, int) else value
+        return value.encode(self.encoding) if isinstance(value, str) else value
+
+    def decode(self, data):
+        return data.decode(self.encoding)
+
+
+class JsonCodec(Codec):
+    """安装了orjson的时候使用orjson，否则使用标准库json"""
+
+    name = 'json'
+
+    def __init__(self, use_orjson=True):
+        self.use_orjson = use_orjson and orjson is not None
+
+    def encode(self, value):
+        if self.use_orjson:
+            return orjson.dumps(value)
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def decode(self, data):
+        if self.use_orjson:
+            return orjson.loads(data)
+        if sys.version_info < (3, 6):
+            # Python3.5的json.loads不接受bytes
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    name = 'msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise ValueError("Codec msgpack requires the msgpack package")
+
+    def encode(self, value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+_CODECS = {}
+
+
+def register_codec(name, factory):
+    """注册codec，factory是无参数的可调用对象，第一次使用的时候创建codec"""
+    _CODECS[name] = factory
+
+
+def get_codec(codec):
+    """codec可以是名称或者Codec对象，None表示不使用codec"""
+    if codec is None or isinstance(codec, Codec):
+        return codec
+    try:
+        factory = _CODECS[codec]
+    except KeyError:
+        raise ValueError("Unknown codec: {}".format(codec))
+    if not isinstance(factory, Codec):
+        factory = _CODECS[codec] = factory()
+    return factory
+
+
+register_codec('raw', RawCodec)
+register_codec('str', StrCodec)
+register_codec('json', JsonCodec)
+register_codec('msgpack', MsgpackCodec)
+
+
+def encode_args(codec, command, args):
+    """序列化写命令中的value参数，其它参数不变"""
+    if command not in VALUE_ARGS:
+        return args
+    args = list(args)
+    for i in value_positions(VALUE_ARGS, command, len(args)):
+        args[i] = codec.encode(args[i])
+    return args
+
+
+def decode_reply(codec, command, reply, encoding=None):
+    """使用codec反序列化返回值中的value，key等其它元素按照encoding解码"""
+    if not isinstance(reply, list):
+        return reply
+    values = set(value_positions(VALUE_REPLIES, command, len(reply))) if command in VALUE_REPLIES else ()
+    return [codec.decode(val) if i in values else (val.decode(encoding) if encoding else val)
+            for i, val in enumerate(reply)]
@@ -0,0 +1,93 @@
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnarList:
+    """把返回的数据块连续保存在一个bytearray中，offsets记录每个数据块的边界，
+    适合keys、hkeys、zkeys这类返回大量成员的命令
+
+    作为reply_factory传给execute，解析器直接把数据块写入，不会为每个元素创建Python对象
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+        # 解析过程中出现的错误，解析器会继续读完整个返回，由连接设置到期物上
+        self.error = None
+
+    def add(self, buf, start, end):
+        with memoryview(buf) as view:
+            self.data += view[start:end]
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        for i in range(len(offsets) - 1):
+            yield bytes(data[offsets[i]:offsets[i + 1]])
+
+    def decode(self, encoding='utf-8'):
+        return [item.decode(encoding) for item in self]
+
+    def to_numpy(self):
+        """返回(data, offsets)两个numpy数组，不复制数据"""
+        if numpy is None:
+            raise ImportError("to_numpy requires numpy")
+        return numpy.frombuffer(self.data, dtype=numpy.uint8), numpy.frombuffer(self.offsets, dtype=numpy.int64)
+
+    def __repr__(self):
+        return '<{} [size:{}, bytes:{}]>'.format(self.__class__.__name__, len(self), len(self.data))
+
+
+class ColumnarPairs(ColumnarList):
+    """key/整数value交替出现的返回，比如zrange、zscan的(成员, 分数)和multi_get的计数器，
+    key保存方式和ColumnarList相同，value保存在array('q')中"""
+
+    def __init__(self):
+        super().__init__()
+        self.values = array('q')
+        self._key = True
+
+    def add(self, buf, start, end):
+        if self._key:
+            super().add(buf, start, end)
+        else:
+            try:
+                self.values.append(int(buf[start:end]))
+            except (ValueError, OverflowError):
+                if self.error is None:
+                    self.error = ValueError("Value is not int64: {!r}".format(bytes(buf[start:end][:64])))
+                self.values.append(0)
+        self._key = not self._key
+
+    @property
+    def keys(self):
+        return ColumnarList.__iter__(self)
+
+    def __iter__(self):
+        """迭代(key, value)"""
+        return zip(ColumnarList.__iter__(self), self.values)
+
+    def __getitem__(self, i):
+        return ColumnarList.__getitem__(self, i), self.values[i]
+
+    def decode(self, encoding='utf-8'):
+        return [(key.decode(encoding), value) for key, value in self]
+
+    def to_numpy(self):
+        """返回(data, offsets, values)三个numpy数组，不复制数据"""
+        data, offsets = super().to_numpy()
+        return data, offsets, numpy.frombuffer(self.values, dtype=numpy.int64)
@@ -0,0 +1,78 @@
+"""SSDB命令的分类，用于判断命令是否可以安全地重试、对冲等"""
+
+# 只读命令，重复执行不会有任何副作用
+READONLY_COMMANDS = frozenset([
+    'get', 'substr', 'strlen', 'getbit', 'countbit', 'exists', 'ttl', 'keys', 'rkeys', 'scan', 'rscan',
+    'multi_get', 'hget', 'hexists', 'hsize', 'hlist', 'hrlist', 'hkeys', 'hgetall', 'hscan', 'hrscan',
+    'multi_hget', 'zget', 'zexists', 'zsize', 'zlist', 'zrlist', 'zkeys', 'zscan', 'zrscan', 'zrank',
+    'zrrank', 'zrange', 'zrrange', 'zcount', 'zsum', 'zavg', 'multi_zget', 'qsize', 'qlist', 'qrlist',
+    'qfront', 'qback', 'qget', 'qrange', 'qslice', 'dbsize', 'info', 'ping',
+])
+
+# 写命令中重复执行结果相同的命令，连接断开时即使已经执行过也可以重新发送
+IDEMPOTENT_COMMANDS = READONLY_COMMANDS | frozenset([
+    'auth', 'set', 'setx', 'expire', 'del', 'multi_set', 'multi_del', 'hset', 'hdel', 'hclear',
+    'multi_hset', 'multi_hdel', 'zset', 'zdel', 'zclear', 'multi_zset', 'multi_zdel', 'qclear', 'qset',
+])
+
+# 写命令参数中value的位置: (第一个value的下标, 步长)，步长为0表示只有一个value，
+# 步长为2表示key/value交替出现，value前面一个参数就是它的key
+VALUE_ARGS = {
+    'set': (1, 0), 'setx': (1, 0), 'setnx': (1, 0), 'getset': (1, 0),
+    'hset': (2, 0), 'qset': (2, 0),
+    'multi_set': (1, 2), 'multi_hset': (2, 2),
+    'qpush': (1, 1), 'qpush_back': (1, 1), 'qpush_front': (1, 1),
+}
+
+# 读命令返回值中value的位置，格式同VALUE_ARGS
+VALUE_REPLIES = {
+    'get': (0, 0), 'getset': (0, 0), 'hget': (0, 0), 'qfront': (0, 0), 'qback': (0, 0), 'qget': (0, 0),
+    'multi_get': (1, 2), 'multi_hget': (1, 2), 'hgetall': (1, 2), 'scan': (1, 2), 'rscan': (1, 2),
+    'hscan': (1, 2), 'hrscan': (1, 2),
+    'qpop': (0, 1), 'qpop_front': (0, 1), 'qpop_back': (0, 1), 'qrange': (0, 1), 'qslice': (0, 1),
+}
+
+# 可能让不存在的key变成存在的写命令中key的位置，格式同VALUE_ARGS，用于使否定缓存失效
+KEY_WRITES = {
+    'set': (0, 0), 'setx': (0, 0), 'setnx': (0, 0), 'getset': (0, 0), 'incr': (0, 0), 'decr': (0, 0),
+    'setbit': (0, 0), 'multi_set': (0, 2),
+}
+
+# 同上，hash命令的第一个参数是名称
+HASH_KEY_WRITES = {
+    'hset': (1, 0), 'hincr': (1, 0), 'hdecr': (1, 0), 'multi_hset': (1, 2),
+}
+
+# 不是key也不是value的参数(limit、计数、过期时间、分数、偏移量等)的位置，
+# 流量录制的时候原样保存，其它参数即使是数字也可能是key(比如用户id)，需要匿名化
+LITERAL_ARGS = {
+    'setx': (2,), 'expire': (1,), 'incr': (1,), 'decr': (1,), 'hincr': (2,), 'hdecr': (2,),
+    'setbit': (1, 2), 'getbit': (1,), 'bitcount': (1, 2), 'countbit': (1, 2), 'substr': (1, 2),
+    'getrange': (1, 2),
+    'scan': (2,), 'rscan': (2,), 'keys': (2,), 'rkeys': (2,),
+    'hscan': (3,), 'hrscan': (3,), 'hkeys': (3,),
+    'hlist': (2,), 'hrlist': (2,), 'zlist': (2,), 'zrlist': (2,), 'qlist': (2,), 'qrlist': (2,),
+    'zset': (2,), 'zincr': (2,), 'zdecr': (2,), 'zscan': (2, 3, 4), 'zrscan': (2, 3, 4), 'zkeys': (2, 3, 4),
+    'zrange': (1, 2), 'zrrange': (1, 2), 'zcount': (1, 2), 'zsum': (1, 2), 'zavg': (1, 2),
+    'zremrangebyscore': (1, 2), 'zremrangebyrank': (1, 2), 'zpop_front': (1,), 'zpop_back': (1,),
+    'qrange': (1, 2), 'qslice': (1, 2), 'qget': (1,), 'qset': (1,), 'qtrim_front': (1,), 'qtrim_back': (1,),
+    'qpop': (1,), 'qpop_front': (1,), 'qpop_back': (1,),
+    'info': (0,),
+}
+
+
+def literal_positions(command, count):
+    """返回command的参数中LITERAL_ARGS的下标，multi_zset的分数在key之后交替出现"""
+    if command == 'multi_zset':
+        return range(2, count, 2)
+    return LITERAL_ARGS.get(command, ())
+
+
+def value_positions(table, command, count):
+    """返回command的参数或返回值中所有value的下标"""
+    start, step = table[command]
+    if start >= count:
+        return range(0)
+    if not step:
+        return range(start, start + 1)
+    return range(start, count, step)
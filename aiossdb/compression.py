@@ -0,0 +1,211 @@
+import asyncio
+import zlib
+
+from .commands import VALUE_ARGS, VALUE_REPLIES, value_positions
+from .errors import CompressionError
+from .log import logger
+from .parser import utf8_encode
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+# 压缩后的value以MAGIC加一个字节的算法编号开头，\xff不会出现在UTF-8文本中，
+# 所以不会和JSON之类的文本数据混淆，压缩和未压缩的数据可以同时存在
+MAGIC = b'\xff\x1fz'
+HEADER_SIZE = len(MAGIC) + 1
+
+# 未压缩但是本身以MAGIC开头的value，加上头部原样保存，避免读取时被误认为是压缩数据
+STORED = 0
+
+
+class _ZlibCodec:
+    id = 1
+    name = 'zlib'
+
+    def __init__(self, level=None):
+        self.level = 6 if level is None else level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class _ZstdCodec:
+    id = 2
+    name = 'zstd'
+
+    def __init__(self, level=None):
+        self.level = 3 if level is None else level
+
+    def compress(self, data):
+        # ZstdCompressor不是线程安全的，每次新建，开销很小
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class _Lz4Codec:
+    id = 3
+    name = 'lz4'
+
+    def __init__(self, level=None):
+        self.level = 0 if level is None else level
+
+    def compress(self, data):
+        return lz4_frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        return lz4_frame.decompress(data)
+
+
+_CODECS = {codec.name: codec for codec in (_ZlibCodec, _ZstdCodec, _Lz4Codec)}
+_CODEC_IDS = {codec.id: codec for codec in (_ZlibCodec, _ZstdCodec, _Lz4Codec)}
+_AVAILABLE = {'zlib': True, 'zstd': zstandard is not None, 'lz4': lz4_frame is not None}
+
+
+def available_codecs():
+    return [name for name, available in _AVAILABLE.items() if available]
+
+
+class CompressionPolicy:
+    """value的压缩策略
+
+    :param codec: zlib、zstd或lz4，zstd和lz4需要安装zstandard和lz4，没有安装时使用zlib
+    :param threshold: 只压缩不小于threshold字节的value
+    :param level: 压缩级别，None使用各算法的默认值
+    """
+
+    def __init__(self, codec='zstd', threshold=1024, level=None):
+        if codec not in _CODECS:
+            raise ValueError("Unknown compression codec: {}".format(codec))
+        if not _AVAILABLE[codec]:
+            logger.warning("Compression codec %s is not installed, fallback to zlib", codec)
+            codec = 'zlib'
+        self.codec = _CODECS[codec](level)
+        self.threshold = threshold
+
+    def __repr__(self):
+        return '<CompressionPolicy [codec:{}, threshold:{}]>'.format(self.codec.name, self.threshold)
+
+
+class Compression:
+    """Client的value压缩层，写入时压缩set、hset、multi_set、qpush等命令的value，
+    读取时根据头部识别压缩过的value并解压
+
+    :param policy: 默认的CompressionPolicy，None表示默认不压缩
+    :param prefixes: {key前缀: CompressionPolicy或None}，最长的匹配前缀优先，
+                     hash和队列按照名称匹配
+    :param offload_threshold: 超过这个字节数的压缩和解压放到executor中执行，避免阻塞事件循环
+    :param executor: 为None时使用事件循环默认的线程池
+    """
+
+    def __init__(self, policy=None, *, prefixes=None, offload_threshold=256 * 1024, executor=None, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.policy = policy
+        self.offload_threshold = offload_threshold
+        self._prefixes = sorted(((utf8_encode(prefix), p) for prefix, p in (prefixes or {}).items()),
+                                key=lambda item: len(item[0]), reverse=True)
+        self._executor = executor
+        self._loop = loop
+        # 统计数据
+        self._compressed = 0
+        self._skipped = 0
+        self._raw_bytes = 0
+        self._compressed_bytes = 0
+        self._decompressed = 0
+        self._offloaded = 0
+
+    def get_policy(self, key):
+        key = utf8_encode(key)
+        for prefix, policy in self._prefixes:
+            if key.startswith(prefix):
+                return policy
+        return self.policy
+
+    @asyncio.coroutine
+    def _run(self, func, data):
+        if len(data) >= self.offload_threshold:
+            self._offloaded += 1
+            return (yield from self._loop.run_in_executor(self._executor, func, data))
+        return func(data)
+
+    @asyncio.coroutine
+    def compress(self, value, policy):
+        data = utf8_encode(value)
+        if policy is None or len(data) < policy.threshold:
+            if data[:len(MAGIC)] == MAGIC:
+                return MAGIC + bytes([STORED]) + data
+            return data
+        compressed = yield from self._run(policy.codec.compress, data)
+        if len(compressed) + HEADER_SIZE >= len(data):
+            # 压缩没有效果，保存原始数据
+            self._skipped += 1
+            return MAGIC + bytes([STORED]) + data if data[:len(MAGIC)] == MAGIC else data
+        self._compressed += 1
+        self._raw_bytes += len(data)
+        self._compressed_bytes += len(compressed) + HEADER_SIZE
+        return MAGIC + bytes([policy.codec.id]) + compressed
+
+    @asyncio.coroutine
+    def decompress(self, data):
+        """返回解压后的bytes，没有压缩过的数据原样返回"""
+        if data[:len(MAGIC)] != MAGIC or len(data) < HEADER_SIZE:
+            return data
+        codec_id = data[len(MAGIC)]
+        payload = bytes(data[HEADER_SIZE:])
+        if codec_id == STORED:
+            return payload
+        codec = _CODEC_IDS.get(codec_id)
+        if codec is None or not _AVAILABLE[codec.name]:
+            raise CompressionError("Compression codec {} is not available".format(
+                codec.name if codec is not None else codec_id))
+        self._decompressed += 1
+        return (yield from self._run(codec().decompress, payload))
+
+    @asyncio.coroutine
+    def compress_args(self, command, args):
+        if command not in VALUE_ARGS:
+            return args
+        args = list(args)
+        for i in value_positions(VALUE_ARGS, command, len(args)):
+            # multi_set按照每个key匹配前缀，其它命令按照第一个参数(key或者hash/队列名称)匹配
+            key = args[i - 1] if command == 'multi_set' else args[0]
+            args[i] = yield from self.compress(args[i], self.get_policy(key))
+        return args
+
+    @asyncio.coroutine
+    def decompress_reply(self, command, reply, encoding=None):
+        """解压返回值中的value，然后把所有元素按照encoding解码"""
+        if command in VALUE_REPLIES and isinstance(reply, list):
+            reply = list(reply)
+            for i in value_positions(VALUE_REPLIES, command, len(reply)):
+                reply[i] = yield from self.decompress(reply[i])
+        if encoding and isinstance(reply, list):
+            reply = [val.decode(encoding) for val in reply]
+        return reply
+
+    def stats(self):
+        return {
+            'compressed': self._compressed,
+            'skipped': self._skipped,
+            'raw_bytes': self._raw_bytes,
+            'compressed_bytes': self._compressed_bytes,
+            'ratio': self._compressed_bytes / self._raw_bytes if self._raw_bytes else None,
+            'decompressed': self._decompressed,
+            'offloaded': self._offloaded,
+        }
+
+    def __repr__(self):
+        return '<Compression [policy:{}, prefixes:{}]>'.format(self.policy, [p for p, _ in self._prefixes])
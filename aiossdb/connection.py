@@ -6,16 +6,20 @@ from collections import deque
 from .log import logger
 from .parser import SSDBParser, encode_command
 from .errors import ProtocolError, ReplyError, ConnectionClosedError
+from .offload import ReplyFramer, finish_reply, parse_frame
 from .utils import wait_ok, set_result, set_exception
 
 
 MAX_CHUNK_SIZE = 65536
 _NOTSET = object()
+# 命令名称 -> 小写并去掉空白之后的名称，避免每条命令都创建新的字符串
+_COMMAND_NAMES = {}
 
 
 @asyncio.coroutine
 def create_connection(address, *, password=None, encoding='utf-8', parser=None, loop=None,
-                      timeout=None, connect_cls=None, reusable=True):
+                      timeout=None, connect_cls=None, reusable=True, slowlog=None, flow=None,
+                      write_buffer_limits=None, offload=None, capture=None):
     '''
     创建SSDB数据库连接
     :param address: 类似于socket的地址，如果是tuple或者list，则应该是(host, port)这种形式，
@@ -28,6 +32,12 @@ def create_connection(address, *, password=None, encoding='utf-8', parser=None,
                     也可以使用这个参数来定义创建连接所花的时间
     :param connect_cls:
     :param reusable: 设置端口重用，默认为True
+    :param slowlog: SlowLog对象，用来记录慢命令，默认为None不记录
+    :param flow: FlowControl对象，用来限制在途的命令数以及字节数，默认为None不限制
+    :param write_buffer_limits: (high, low)，设置transport写缓冲区的高低水位，
+                                超过高水位的时候wait_writable会等待缓冲区降到低水位以下
+    :param offload: ReplyOffload对象，超过阈值的返回交给executor解析，默认为None全部在事件循环中解析
+    :param capture: TrafficCapture对象，记录发送的命令用于回放压测，默认为None不记录
     :return: 返回一个SSDBConnection对象，如果传递了connect_cls,则会返回这个类的实例
     '''
     # 首先判断address
@@ -59,9 +69,13 @@ def create_connection(address, *, password=None, encoding='utf-8', parser=None,
         sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         address = sock.getpeername()
     address = tuple(address[:2])
+    if write_buffer_limits is not None:
+        high, low = write_buffer_limits
+        writer.transport.set_write_buffer_limits(high=high, low=low)
 
     conn = connect_cls(reader, writer, encoding=encoding,
-                       address=address, parser=parser, loop=loop)
+                       address=address, parser=parser, loop=loop, slowlog=slowlog, flow=flow,
+                       offload=offload, capture=capture)
 
     try:
         if password is not None:
@@ -73,8 +87,33 @@ def create_connection(address, *, password=None, encoding='utf-8', parser=None,
     return conn
 
 
+class _Waiter:
+    """记录一条已发送的命令，在解析到返回数据的时候填充期物，
+    被采样的命令还会记录各个阶段的时间点，用于慢日志"""
+
+    __slots__ = ('future', 'reply_factory', 'decoder', 'missing_ok', 'encoding', 'command', 'args', 'sampled',
+                 'nbytes', 'queue_time', 'started', 'written', 'first_byte')
+
+    def __init__(self, future, encoding, command, args=(), sampled=False, reply_factory=None, decoder=None,
+                 missing_ok=False):
+        self.future = future
+        self.reply_factory = reply_factory
+        self.decoder = decoder
+        self.missing_ok = missing_ok
+        self.encoding = encoding
+        self.command = command
+        self.args = args
+        self.sampled = sampled
+        self.nbytes = 0
+        self.queue_time = 0.0
+        self.started = None
+        self.written = None
+        self.first_byte = None
+
+
 class SSDBConnection:
-    def __init__(self, reader, writer, *, address, encoding=None, parser=None, loop=None):
+    def __init__(self, reader, writer, *, address, encoding=None, parser=None, loop=None, slowlog=None,
+                 flow=None, offload=None, capture=None):
         if loop is None:
             # 默认使用asyncio的事件循环
             loop = asyncio.get_event_loop()
@@ -87,7 +126,9 @@ class SSDBConnection:
         self._loop = loop
         # 使用双端队列来记录发送的命令，在解析数据的时候popleft
         self._waiters = deque()
-        self._parser = parser(encoding=encoding)
+        # 解析器只返回bytes，在_process_data中按照每条命令的encoding解码，
+        # 这样同一条连接上可以混合执行需要str和需要bytes的命令
+        self._parser = parser(encoding=None)
         # 创建读取的task, self._read_data()是一个协程，用来在套接字生存期间读取数据
         # ensure_future 排定协程在事件循环的执行，如果参数是Future对象，将直接返回，返回的类型是Task对象
         self._reader_task = asyncio.ensure_future(self._read_data(), loop=self._loop)
@@ -96,6 +137,13 @@ class SSDBConnection:
         # 添加读取任务结束后(套接字关闭)的回调函数
         self._reader_task.add_done_callback(self._close_waiter.set_result)
         self._encoding = encoding
+        self._slowlog = slowlog
+        self._flow = flow
+        # 使用offload的时候先切分出完整的返回，再决定在哪里解析
+        self._offload = offload
+        self._framer = ReplyFramer()
+        self._capture = capture
+        self._frame_buf = bytearray()
 
         self._closing = False
         self._closed = False
@@ -120,10 +168,20 @@ class SSDBConnection:
             if data == b'' and self._reader.at_eof():
                 # 如果读取数据为空，并且reader处于关闭状态，则说明服务器断开连接
                 logger.debug('Connection has been closed by server')
+            if self._slowlog is not None:
+                self._mark_first_byte()
+            if self._offload is not None:
+                ok = yield from self._read_frames(data)
+                if not ok:
+                    return
+                continue
             # 在这里解析器工作，解析数据
             self._parser.feed(data)
             # 获取数据,填充期物
             while 1:
+                if self._waiters:
+                    # 返回数据的格式由队首的命令决定
+                    self._parser.reply_factory = self._waiters[0].reply_factory
                 try:
                     obj = self._parser.gets()
                 except ProtocolError as e:
@@ -134,20 +192,104 @@ class SSDBConnection:
                         break
                     # 这里将获取数据，填充期物（返回值）
                     self._process_data(obj)
+                    if self._slowlog is not None and getattr(self._parser, 'buf', None):
+                        # 同一批数据中可能还有下一条命令的返回
+                        self._mark_first_byte()
         self._closing = True
-        self._do_close(None)
+        # 服务器断开连接，等待中的命令会收到ConnectionClosedError，调用者可以据此重试
+        self._do_close(ConnectionClosedError("Connection closed by server"))
+
+    @asyncio.coroutine
+    def _read_frames(self, data):
+        """切分出完整的返回，超过阈值的交给executor解析，连接出错的时候返回False"""
+        offload = self._offload
+        self._frame_buf.extend(data)
+        while 1:
+            try:
+                end = self._framer.frame(self._frame_buf)
+            except ProtocolError as e:
+                self._do_close(e)
+                return False
+            if end < 0:
+                return True
+            frame = bytes(self._frame_buf[:end])
+            del self._frame_buf[:end]
+            assert len(self._waiters) > 0, frame[:64]
+            waiter = self._waiters[0]
+            args = (frame, waiter.encoding, waiter.reply_factory, waiter.decoder)
+            try:
+                if end >= offload.threshold:
+                    obj = yield from offload.run(self._loop, *args)
+                else:
+                    offload.inline += 1
+                    obj = parse_frame(*args)
+            except asyncio.CancelledError:
+                raise
+            except ProtocolError as e:
+                self._do_close(e)
+                return False
+            except Exception as e:
+                # 解码或者反序列化出错只影响这一条命令
+                obj = e
+            if self._closed:
+                return False
+            self._process_data(obj, reply_size=end, finished=True)
+            if self._slowlog is not None and self._frame_buf:
+                self._mark_first_byte()
+
+    def _mark_first_byte(self):
+        """记录队首命令第一次收到返回数据的时间"""
+        if self._waiters:
+            waiter = self._waiters[0]
+            if waiter.sampled and waiter.first_byte is None:
+                waiter.first_byte = self._loop.time()
 
-    def _process_data(self, obj):
+    def _process_data(self, obj, reply_size=None, finished=False):
+        """finished为True表示obj已经经过了finish_reply，是最终的返回值或者异常"""
         assert len(self._waiters) > 0, (type(obj), obj)
-        waiter, encoding, command = self._waiters.popleft()
+        waiter = self._waiters.popleft()
+        if self._flow is not None:
+            self._flow.release(waiter.nbytes)
+        if waiter.sampled:
+            self._record_slowlog(waiter, obj, reply_size)
+        if not finished:
+            try:
+                obj = finish_reply(obj, waiter.encoding, waiter.reply_factory, waiter.decoder)
+            except Exception as e:
+                # 解码或者反序列化出错只影响这一条命令，连接上的数据流仍然是完整的
+                obj = e
         if isinstance(obj, ReplyError):
-            obj.command = command
-            set_exception(waiter, obj)
+            if waiter.missing_ok and obj.etype == 'not_found':
+                # 不存在的key返回None，不需要抛出和捕获异常
+                set_result(waiter.future, None)
+                return
+            obj.command = waiter.command
+        if isinstance(obj, Exception):
+            set_exception(waiter.future, obj)
         else:
-            set_result(waiter, obj)
+            set_result(waiter.future, obj)
 
-    def execute(self, command, *args, encoding=_NOTSET):
-        '''执行ssdb命令，返回期物等待结果'''
+    def _record_slowlog(self, waiter, obj, reply_size=None):
+        now = self._loop.time()
+        first_byte = waiter.first_byte if waiter.first_byte is not None else now
+        if reply_size is None:
+            reply_size = getattr(self._parser, 'reply_size', 0)
+        self._slowlog.record(self._address, waiter.command, waiter.args,
+                             reply_size=reply_size,
+                             blocks=len(obj) if isinstance(obj, list) else 0,
+                             queue_time=waiter.queue_time,
+                             write_time=waiter.written - waiter.started,
+                             server_time=max(first_byte - waiter.written, 0.0),
+                             parse_time=now - first_byte)
+
+    def execute(self, command, *args, encoding=_NOTSET, queue_time=0.0, reply_factory=None, decoder=None,
+                missing_ok=False):
+        '''执行ssdb命令，返回期物等待结果
+        queue_time是调用者在获取该连接之前等待的时间，只用于慢日志统计
+        reply_factory比如ColumnarPairs，指定之后返回该类型的对象而不是列表，encoding不起作用
+        decoder的参数是bytearray组成的列表，返回值作为命令的结果，指定之后encoding不起作用，
+        使用offload的时候较大的返回会在executor中调用decoder
+        missing_ok为True的时候，服务器返回not_found时结果为None，而不是引发ReplyError'''
         if self._reader is None or self._reader.at_eof():
             raise ConnectionClosedError("Connection closed or corrupted")
         if command is None:
@@ -155,17 +297,51 @@ class SSDBConnection:
         if None in args:
             raise TypeError("args must not contain None")
         # 命令推荐小写
-        command = command.lower().strip()
+        try:
+            command = _COMMAND_NAMES[command]
+        except KeyError:
+            name = command.lower().strip()
+            if len(_COMMAND_NAMES) < 1024:
+                _COMMAND_NAMES[command] = name
+            command = name
 
+        if self._capture is not None:
+            self._capture.record(command, args)
         if encoding is _NOTSET:
             encoding = self._encoding
         future = asyncio.Future(loop=self._loop)
+        sampled = self._slowlog is not None and self._slowlog.sample()
+        waiter = _Waiter(future, encoding, command, args, sampled, reply_factory, decoder, missing_ok)
+        if sampled:
+            waiter.queue_time = queue_time
+            waiter.started = self._loop.time()
         # 将命令和参数编码成协议要求的格式
-        self._writer.write(encode_command(command, *args))
+        data = encode_command(command, *args)
+        self._writer.write(data)
+        if self._flow is not None:
+            waiter.nbytes = len(data)
+            self._flow.add(waiter.nbytes)
+        if sampled:
+            waiter.written = self._loop.time()
         # 将future进入队列，将来在接收到返回值的时候填充future
-        self._waiters.append((future, encoding, command))
+        self._waiters.append(waiter)
         return future
 
+    @asyncio.coroutine
+    def wait_writable(self):
+        """等待直到可以继续发送命令: transport的写缓冲区低于高水位，
+        并且在途的命令数和字节数没有超过限制，返回后应该立即调用execute"""
+        if self._writer is None:
+            raise ConnectionClosedError("Connection closed or corrupted")
+        yield from self._writer.drain()
+        if self._flow is not None:
+            yield from self._flow.wait()
+        if self._writer is None:
+            if self._flow is not None:
+                # 等待期间连接关闭了，不会发送命令，把名额让给连接池中其它等待的协程
+                self._flow.abandon()
+            raise ConnectionClosedError("Connection closed or corrupted")
+
     def auth(self, password):
         future = self.execute('auth', password)
         return wait_ok(future)
@@ -185,12 +361,36 @@ class SSDBConnection:
         self._reader = None
         while self._waiters:
             # 将队列中还有的期物弹出并且取消
-            waiter, *spam = self._waiters.popleft()
-            logger.debug("Cancelling waiter %r", (waiter, spam))
+            waiter = self._waiters.popleft()
+            if self._flow is not None:
+                self._flow.release(waiter.nbytes)
+            logger.debug("Cancelling waiter %r", (waiter.future, waiter.command))
             if exc is None:
-                waiter.cancel()
+                waiter.future.cancel()
             else:
-                waiter.set_exception(exc)
+                set_exception(waiter.future, exc)
+        if self._flow is not None:
+            # 等待发送的协程会发现连接已经关闭
+            self._flow.wake_all()
+
+    def orphan(self):
+        """fork之后在子进程中放弃从父进程继承的连接
+
+        只关闭子进程中的文件描述符，不调用transport.close，也不取消读取任务，
+        因为它们都属于继承下来的事件循环，selector(比如epoll)和父进程共享，修改它会影响父进程；
+        没有shutdown套接字，父进程中的同一条连接不受影响"""
+        if self._closed:
+            return
+        self._closing = True
+        self._closed = True
+        sock = self._writer.transport.get_extra_info('socket')
+        # 新版本的asyncio返回的是TransportSocket包装
+        sock = getattr(sock, '_sock', sock)
+        if sock is not None:
+            sock.close()
+        # 保留transport和读取任务的引用，调用者应该一直持有放弃的连接，避免它们被回收时访问旧的事件循环
+        self._reader = None
+        self._waiters.clear()
 
     @asyncio.coroutine
     def wait_closed(self):
@@ -213,3 +413,20 @@ class SSDBConnection:
     @property
     def address(self):
         return self._address
+
+    @property
+    def slowlog(self):
+        return self._slowlog
+
+    @property
+    def offload(self):
+        return self._offload
+
+    @property
+    def flow(self):
+        return self._flow
+
+    @property
+    def pending(self):
+        """已经发送但还没有收到返回的命令数"""
+        return len(self._waiters)
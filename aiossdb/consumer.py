@@ -0,0 +1,201 @@
+import asyncio
+
+from .log import logger
+from .utils import set_result, set_exception
+
+
+class QueueConsumer:
+    """批量消费SSDB队列
+
+    每次使用qpop_front(或qpop_back)一次弹出最多batch_size个元素，放入本地的预取缓冲区，
+    再由concurrency个worker并发调用handler处理，队列为空时轮询间隔按照backoff倍数
+    从min_interval增长到max_interval，取到数据之后恢复为立即轮询
+
+    :param executor: Client或者SSDBConnectionPool，只需要有execute协程
+    :param name: 队列名称
+    :param handler: 协程函数，参数为一个元素，异常会被记录日志，不会中断消费
+    :param prefetch: 本地缓冲区最多保存的元素数，默认为batch_size的两倍
+    """
+
+    def __init__(self, executor, name, handler, *, batch_size=100, concurrency=10, prefetch=None,
+                 min_interval=0.01, max_interval=1.0, backoff=2.0, side='front', loop=None):
+        assert side in ('front', 'back'), ("side must be front or back", side)
+        assert batch_size > 0 and concurrency > 0, ("batch_size and concurrency must be > 0", batch_size, concurrency)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.name = name
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.prefetch = prefetch or batch_size * 2
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._executor = executor
+        self._handler = handler
+        self._pop_command = 'qpop_' + side
+        self._loop = loop
+        self._buffer = asyncio.Queue(loop=loop)
+        # 缓冲区有空位或者停止的时候唤醒拉取任务
+        self._wakeup = asyncio.Event(loop=loop)
+        self._interval = 0
+        self._running = False
+        self._fetcher = None
+        self._workers = []
+        # 统计数据
+        self._popped = 0
+        self._processed = 0
+        self._failed = 0
+        self._polls = 0
+        self._empty_polls = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._fetcher = asyncio.ensure_future(self._fetch(), loop=self._loop)
+        self._workers = [asyncio.ensure_future(self._work(), loop=self._loop) for i in range(self.concurrency)]
+
+    @asyncio.coroutine
+    def stop(self, push_back=True):
+        """停止消费，等待正在处理的元素完成，缓冲区中还没有处理的元素默认放回队列头部"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        yield from self._fetcher
+        items = []
+        while not self._buffer.empty():
+            items.append(self._buffer.get_nowait())
+        if items and push_back:
+            # qpush_front逐个放入头部，反序之后队列中的顺序和原来一致
+            yield from self._executor.execute('qpush_front', self.name, *reversed(items))
+        elif items:
+            logger.warning("Dropped %d prefetched items of queue %s", len(items), self.name)
+        for i in range(self.concurrency):
+            self._buffer.put_nowait(None)
+        yield from asyncio.gather(*self._workers, loop=self._loop)
+        self._workers = []
+
+    @asyncio.coroutine
+    def _wait(self, timeout):
+        self._wakeup.clear()
+        try:
+            yield from asyncio.wait_for(self._wakeup.wait(), timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            pass
+
+    @asyncio.coroutine
+    def _fetch(self):
+        while self._running:
+            room = self.prefetch - self._buffer.qsize()
+            if room < min(self.batch_size, self.prefetch):
+                # 缓冲区的空位不够一个批次，等待worker取走元素，避免频繁的小批量弹出
+                yield from self._wait(None)
+                continue
+            try:
+                items = yield from self._executor.execute(self._pop_command, self.name, self.batch_size)
+            except Exception as e:
+                logger.error("Pop from queue %s encountered error: %r", self.name, e)
+                items = []
+            self._polls += 1
+            if items:
+                self._interval = 0
+                self._popped += len(items)
+                for item in items:
+                    self._buffer.put_nowait(item)
+                continue
+            # 队列为空，轮询间隔指数增长
+            self._empty_polls += 1
+            self._interval = min(max(self._interval * self.backoff, self.min_interval), self.max_interval)
+            yield from self._wait(self._interval)
+
+    @asyncio.coroutine
+    def _work(self):
+        while 1:
+            item = yield from self._buffer.get()
+            if item is None:
+                return
+            self._wakeup.set()
+            try:
+                yield from self._handler(item)
+            except Exception as e:
+                self._failed += 1
+                logger.error("Handler of queue %s encountered error: %r", self.name, e, exc_info=True)
+            else:
+                self._processed += 1
+
+    def stats(self):
+        return {
+            'buffered': self._buffer.qsize(),
+            'popped': self._popped,
+            'processed': self._processed,
+            'failed': self._failed,
+            'polls': self._polls,
+            'empty_polls': self._empty_polls,
+            'interval': self._interval,
+        }
+
+    def __repr__(self):
+        return '<QueueConsumer [name:{}, buffered:{}, concurrency:{}]>'.format(
+            self.name, self._buffer.qsize(), self.concurrency)
+
+
+class QueueProducer:
+    """批量写入SSDB队列，put的元素攒够batch_size个或者等待linger秒之后，
+    使用一条qpush_back一起写入，put会一直等待到所在的批次写入完成"""
+
+    def __init__(self, executor, name, *, batch_size=100, linger=0.005, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.name = name
+        self.batch_size = batch_size
+        self.linger = linger
+        self._executor = executor
+        self._loop = loop
+        self._items = []
+        self._batch = None
+        self._timer = None
+        self._flushing = set()
+
+    @asyncio.coroutine
+    def put(self, *items):
+        if not items:
+            # 没有元素的时候不创建批次，否则这个批次永远不会写入
+            return 0
+        if not self._items:
+            self._batch = asyncio.Future(loop=self._loop)
+            self._timer = self._loop.call_later(self.linger, self._flush_soon)
+        self._items.extend(items)
+        batch = self._batch
+        if len(self._items) >= self.batch_size:
+            self._flush_soon()
+        yield from asyncio.shield(batch, loop=self._loop)
+
+    def _flush_soon(self):
+        if not self._items:
+            return
+        self._timer.cancel()
+        items, batch = self._items, self._batch
+        self._items, self._batch, self._timer = [], None, None
+        task = asyncio.ensure_future(self._push(items, batch), loop=self._loop)
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    @asyncio.coroutine
+    def _push(self, items, batch):
+        try:
+            yield from self._executor.execute('qpush_back', self.name, *items)
+        except Exception as e:
+            set_exception(batch, e)
+        else:
+            set_result(batch, len(items))
+
+    @asyncio.coroutine
+    def flush(self):
+        """立即写入缓冲区中的元素，并等待所有批次完成"""
+        self._flush_soon()
+        if self._flushing:
+            yield from asyncio.wait(list(self._flushing), loop=self._loop)
+
+    def __repr__(self):
+        return '<QueueProducer [name:{}, pending:{}]>'.format(self.name, len(self._items))
@@ -0,0 +1,209 @@
+import asyncio
+
+from .errors import PoolClosedError, ReplyError
+from .log import logger
+
+
+class CounterAggregator:
+    """计数器的延迟写入，在内存中按key累加incr/hincr的增量，定时或者key数量达到上限的时候，
+    把每个key合并后的增量作为一条incr/hincr写入，同一个批次在连接上连续发送(pipeline)
+
+    同一个key在interval秒内的多次incr只产生一条写命令，计数最多延迟interval秒(加上写入的时间)可见
+
+    写入失败的处理:
+        命令还没有发送(比如连接已经关闭、获取不到连接)，增量放回缓冲区等下一次写入
+        命令已经发送但是没有收到返回，无法知道服务器是否执行过，为了不重复计数不再重试，记为丢失
+        服务器返回错误(比如value不是整数)，记为丢失
+
+    :param executor: Client或者SSDBConnectionPool
+    :param interval: 第一次累加之后最多等待的秒数
+    :param max_keys: 缓冲区中的key达到这个数量时立即写入
+    :param max_pending: 缓冲区中key数量的硬上限，写入跟不上的时候新的key直接丢弃并记为丢失，默认为max_keys的10倍
+    :param batch_size: 一条连接上一次最多发送的命令数，更多的命令分成多个批次并发写入
+    """
+
+    def __init__(self, executor, *, interval=1.0, max_keys=10000, max_pending=None, batch_size=500, loop=None):
+        assert interval > 0 and max_keys > 0 and batch_size > 0, \
+            ("interval, max_keys and batch_size must be > 0", interval, max_keys, batch_size)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.interval = interval
+        self.max_keys = max_keys
+        self.max_pending = max_pending or max_keys * 10
+        self.batch_size = batch_size
+        self._executor = executor
+        self._loop = loop
+        # key -> 增量，hash的key为(name, key)
+        self._kv = {}
+        self._hash = {}
+        self._timer = None
+        self._flushing = set()
+        self._closed = False
+        # 统计数据
+        self._increments = 0
+        self._flushes = 0
+        self._commands = 0
+        self._requeued = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._uncertain = 0
+        self._lost_delta = 0
+        self._last_flush_time = 0.0
+
+    @property
+    def pending(self):
+        return len(self._kv) + len(self._hash)
+
+    def incr(self, key, delta=1):
+        self._add(self._kv, key, delta)
+
+    def hincr(self, name, key, delta=1):
+        self._add(self._hash, (name, key), delta)
+
+    def _add(self, counters, key, delta):
+        if self._closed:
+            raise PoolClosedError("CounterAggregator is closed")
+        self._increments += 1
+        if key in counters:
+            counters[key] += delta
+            return
+        if self.pending >= self.max_pending:
+            # 写入跟不上，丢弃新的key，已经在缓冲区中的key仍然可以累加
+            self._dropped += 1
+            self._lost_delta += abs(delta)
+            return
+        counters[key] = delta
+        if self._timer is None:
+            self._timer = self._loop.call_later(self.interval, self._flush_soon)
+        if self.pending >= self.max_keys:
+            self._flush_soon()
+
+    def _flush_soon(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        commands = [('incr', (key, delta)) for key, delta in self._kv.items() if delta]
+        commands.extend(('hincr', (name, key, delta)) for (name, key), delta in self._hash.items() if delta)
+        self._kv, self._hash = {}, {}
+        if not commands:
+            return
+        self._flushes += 1
+        task = asyncio.ensure_future(self._flush_commands(commands), loop=self._loop)
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    @asyncio.coroutine
+    def _get_pool(self):
+        get_pool = getattr(self._executor, 'get_pool', None)
+        if get_pool is not None:
+            return (yield from get_pool())
+        return self._executor
+
+    @asyncio.coroutine
+    def _flush_commands(self, commands):
+        start = self._loop.time()
+        cache = getattr(self._executor, 'negative_cache', None)
+        if cache is not None:
+            for command, args in commands:
+                cache.invalidate(command, args)
+        chunks = [commands[i:i + self.batch_size] for i in range(0, len(commands), self.batch_size)]
+        try:
+            pool = yield from self._get_pool()
+        except Exception as e:
+            logger.error("Flush counters encountered error: %r", e)
+            self._requeue(commands)
+            return
+        try:
+            yield from asyncio.gather(*[self._send(pool, chunk) for chunk in chunks], loop=self._loop)
+        finally:
+            if cache is not None:
+                # 和Client一样，写入完成之后再失效一次，期间其它连接上的读取返回的not_found不再缓存
+                for command, args in commands:
+                    cache.invalidate(command, args)
+        self._last_flush_time = self._loop.time() - start
+
+    @asyncio.coroutine
+    def _send(self, pool, commands):
+        try:
+            conn, address = yield from pool.get_connection()
+        except Exception as e:
+            logger.error("Flush counters encountered error: %r", e)
+            self._requeue(commands)
+            return
+        try:
+            sent = []
+            unsent = []
+            for command, args in commands:
+                try:
+                    sent.append((command, args, conn.execute(command, *args)))
+                except Exception:
+                    unsent.append((command, args))
+            if unsent:
+                self._requeue(unsent)
+            for command, args, future in sent:
+                try:
+                    yield from future
+                except ReplyError as e:
+                    self._rejected += 1
+                    self._lost_delta += abs(args[-1])
+                    logger.error("Counter %s %r rejected: %r", command, args, e)
+                except Exception as e:
+                    self._uncertain += 1
+                    self._lost_delta += abs(args[-1])
+                    logger.error("Counter %s %r lost: %r", command, args, e)
+                else:
+                    self._commands += 1
+        finally:
+            yield from pool.release(conn)
+
+    def _requeue(self, commands):
+        """没有发送的增量放回缓冲区，和期间新的增量合并"""
+        if self._closed:
+            for command, args in commands:
+                self._dropped += 1
+                self._lost_delta += abs(args[-1])
+            logger.error("Dropped %d counters of closed CounterAggregator", len(commands))
+            return
+        for command, args in commands:
+            self._requeued += 1
+            counters, key = (self._kv, args[0]) if command == 'incr' else (self._hash, args[:2])
+            counters[key] = counters.get(key, 0) + args[-1]
+        if self._timer is None:
+            self._timer = self._loop.call_later(self.interval, self._flush_soon)
+
+    @asyncio.coroutine
+    def flush(self):
+        """立即写入缓冲区中的增量，并等待所有批次完成"""
+        self._flush_soon()
+        if self._flushing:
+            yield from asyncio.wait(list(self._flushing), loop=self._loop)
+
+    @asyncio.coroutine
+    def close(self):
+        """写入所有增量，之后的incr引发PoolClosedError，这时还没有写入成功的增量记为丢失"""
+        if self._closed:
+            return
+        yield from self.flush()
+        self._closed = True
+        # flush期间放回缓冲区的增量再尝试一次
+        self._flush_soon()
+        if self._flushing:
+            yield from asyncio.wait(list(self._flushing), loop=self._loop)
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'increments': self._increments,
+            'flushes': self._flushes,
+            'commands': self._commands,
+            'requeued': self._requeued,
+            'dropped': self._dropped,
+            'rejected': self._rejected,
+            'uncertain': self._uncertain,
+            'lost_delta': self._lost_delta,
+            'last_flush_time': self._last_flush_time,
+        }
+
+    def __repr__(self):
+        return '<CounterAggregator [pending:{}, interval:{}, closed:{}]>'.format(
+            self.pending, self.interval, self._closed)
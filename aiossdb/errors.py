@@ -10,7 +10,8 @@ class ReplyError(SSDBError):
     """ssdb服务器返回的错误类型，可能有:
        not_found, error, fail, client_error
     """
-    def __int__(self, etype, command=None):
+    def __init__(self, etype, command=None):
+        super().__init__(etype)
         self.etype = etype
         self.command = command
 
@@ -23,3 +24,11 @@ class ProtocolError(SSDBError):
 
 class PoolClosedError(SSDBError):
     """如果连接池已经关闭，引发该异常"""
+
+
+class CircuitOpenError(SSDBError):
+    """熔断器处于断开状态时，请求直接失败，引发该异常"""
+
+
+class CompressionError(SSDBError):
+    """压缩数据无法解压，比如使用的压缩算法没有安装"""
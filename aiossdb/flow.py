@@ -0,0 +1,162 @@
+import asyncio
+import collections
+
+from .utils import set_result
+
+
+class FlowControl:
+    """在途命令的准入控制，限制已经发送但还没有收到返回的命令数以及字节数
+
+    连接上的FlowControl可以指定parent(连接池的FlowControl)，计数会同时累加到parent，
+    这样就可以同时限制单条连接以及整个连接池
+    超过限制之后，wait会一直等待直到有命令返回，等待的协程按照先来先服务的顺序被唤醒
+    """
+
+    def __init__(self, max_commands=None, max_bytes=None, *, parent=None, loop=None):
+        assert max_commands is None or max_commands > 0, ("max_commands must be None or > 0", max_commands)
+        assert max_bytes is None or max_bytes > 0, ("max_bytes must be None or > 0", max_bytes)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.max_commands = max_commands
+        self.max_bytes = max_bytes
+        self.parent = parent
+        self._loop = loop
+        self.pending = 0
+        self.pending_bytes = 0
+        self._waiters = collections.deque()
+        # 已经唤醒但是还没有调用add的协程数
+        self._woken = 0
+        # 统计数据
+        self._waits = 0
+        self._wait_time = 0.0
+        self._peak_pending = 0
+        self._peak_bytes = 0
+
+    @property
+    def full(self):
+        # 没有在途命令的时候总是放行，否则一条超过max_bytes的命令会永远等待
+        if not self.pending:
+            return False
+        if self.max_commands is not None and self.pending >= self.max_commands:
+            return True
+        return self.max_bytes is not None and self.pending_bytes >= self.max_bytes
+
+    def _blocking(self):
+        """返回当前阻塞的FlowControl，自己或者某一级parent"""
+        flow = self
+        while flow is not None:
+            if flow.full:
+                return flow
+            flow = flow.parent
+        return None
+
+    @asyncio.coroutine
+    def wait(self):
+        """等待直到本身以及所有parent都没有超过限制
+        返回之后应该立即(不再yield)调用add，否则可能会有其它协程抢先占用额度"""
+        blocking = self._blocking()
+        if blocking is None:
+            return
+        start = self._loop.time()
+        self._waits += 1
+        try:
+            while blocking is not None:
+                yield from blocking._wait_once()
+                previous, blocking = blocking, self._blocking()
+                if blocking is not None:
+                    # 又被阻塞(可能是另一级)，不会使用previous的名额，让给其它协程
+                    previous._wake_up()
+        finally:
+            self._wait_time += self._loop.time() - start
+
+    @asyncio.coroutine
+    def _wait_once(self):
+        fut = asyncio.Future(loop=self._loop)
+        self._waiters.append(fut)
+        try:
+            yield from fut
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # 已经被唤醒，但是在使用名额之前被取消了
+                self._woken -= 1
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            # 没有使用名额就离开，把名额让给下一个
+            self._wake_up()
+            raise
+        self._woken -= 1
+
+    def add(self, nbytes):
+        self.pending += 1
+        self.pending_bytes += nbytes
+        if self.pending > self._peak_pending:
+            self._peak_pending = self.pending
+        if self.pending_bytes > self._peak_bytes:
+            self._peak_bytes = self.pending_bytes
+        if self.parent is not None:
+            self.parent.add(nbytes)
+        # 被唤醒的协程已经占用了名额，剩下的名额继续唤醒其它协程
+        self._wake_up()
+
+    def release(self, nbytes):
+        self.pending -= 1
+        self.pending_bytes -= nbytes
+        if self.parent is not None:
+            self.parent.release(nbytes)
+        self._wake_up()
+
+    def abandon(self):
+        """wait返回之后不再调用add的时候调用(比如连接已经关闭)，把名额让给其它等待的协程"""
+        flow = self
+        while flow is not None:
+            flow._wake_up()
+            flow = flow.parent
+
+    def _has_room(self):
+        """算上已经唤醒但还没有调用add的协程，是否还可以再唤醒一个"""
+        if not self._woken:
+            return not self.full
+        if self.max_bytes is not None:
+            # 被唤醒的协程的字节数要到add的时候才知道，add之后会继续唤醒
+            return False
+        return self.max_commands is None or self.pending + self._woken < self.max_commands
+
+    def _wake_up(self):
+        # 一直唤醒到名额用完，被唤醒的协程会重新检查是否超过限制
+        while self._waiters and self._has_room():
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._woken += 1
+                set_result(fut, None)
+
+    def wake_all(self):
+        """唤醒所有等待的协程，比如连接关闭的时候"""
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._woken += 1
+                set_result(fut, None)
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'pending_bytes': self.pending_bytes,
+            'max_commands': self.max_commands,
+            'max_bytes': self.max_bytes,
+            'waiting': len(self._waiters),
+            'waits': self._waits,
+            'wait_time': self._wait_time,
+            'peak_pending': self._peak_pending,
+            'peak_bytes': self._peak_bytes,
+        }
+
+    def __repr__(self):
+        return '<FlowControl [pending:{}/{}, bytes:{}/{}]>'.format(
+            self.pending, self.max_commands, self.pending_bytes, self.max_bytes)
@@ -0,0 +1,82 @@
+import collections
+
+from .commands import READONLY_COMMANDS
+
+
+class HedgePolicy:
+    """对冲请求策略，只读命令在delay秒内没有返回的时候，在另一条连接(或者副本)上再发送一次，
+    先返回的结果有效，另一个请求正常执行完成后丢弃结果，不会打乱连接上的返回顺序
+
+    :param delay: 发送对冲请求前等待的秒数，指定了percentile的时候作为初始值
+    :param percentile: 比如0.95，使用最近window条命令耗时的这个分位数作为delay
+    :param min_delay: delay的下限，避免延迟很低的时候几乎所有请求都被对冲
+    :param budget: 对冲请求占请求数的比例上限，使用令牌桶控制，每个请求增加budget个令牌
+    :param burst: 令牌桶的容量
+    :param commands: 可以对冲的命令集合，默认为只读命令
+    """
+
+    def __init__(self, delay=0.01, *, percentile=None, min_delay=0.001, budget=0.05, burst=10, commands=None,
+                 window=1024):
+        assert percentile is None or 0 < percentile < 1, ("percentile must be in (0, 1)", percentile)
+        assert 0 <= budget <= 1, ("budget must be in [0, 1]", budget)
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = budget
+        self.burst = burst
+        self.commands = READONLY_COMMANDS if commands is None else frozenset(commands)
+        self._tokens = burst
+        self._latencies = collections.deque(maxlen=window)
+        self._current_delay = max(delay, min_delay)
+        self._since_update = 0
+        # 统计数据
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._budget_exhausted = 0
+
+    def should_hedge(self, command):
+        if command.lower().strip() not in self.commands:
+            return False
+        self._requests += 1
+        self._tokens = min(self._tokens + self.budget, self.burst)
+        return True
+
+    def get_delay(self):
+        return self._current_delay
+
+    def try_hedge(self):
+        """消耗一个令牌，预算用完的时候返回False"""
+        if self._tokens < 1:
+            self._budget_exhausted += 1
+            return False
+        self._tokens -= 1
+        self._hedged += 1
+        return True
+
+    def record(self, latency, hedge_won=False):
+        if hedge_won:
+            self._hedge_wins += 1
+        if self.percentile is None:
+            return
+        self._latencies.append(latency)
+        self._since_update += 1
+        # 每64条重新计算一次分位数，避免每个请求都排序
+        if self._since_update >= 64 and len(self._latencies) >= 100:
+            self._since_update = 0
+            latencies = sorted(self._latencies)
+            value = latencies[min(int(len(latencies) * self.percentile), len(latencies) - 1)]
+            self._current_delay = max(value, self.min_delay)
+
+    def stats(self):
+        return {
+            'delay': self._current_delay,
+            'requests': self._requests,
+            'hedged': self._hedged,
+            'hedge_wins': self._hedge_wins,
+            'budget_exhausted': self._budget_exhausted,
+        }
+
+    def __repr__(self):
+        return '<HedgePolicy [delay:{:.6f}, percentile:{}, budget:{}]>'.format(
+            self._current_delay, self.percentile, self.budget)
@@ -0,0 +1,172 @@
+import asyncio
+import collections
+
+from .utils import set_result
+
+
+class Lane:
+    """连接池中的一个优先级通道
+
+    :param name: 通道名称，执行命令时通过priority参数指定
+    :param weight: 多个通道同时等待连接时，按照权重分配释放出来的连接
+    :param reserved: 为这个通道保留的连接数，其它通道不能占用
+    """
+
+    def __init__(self, name, weight=1, reserved=0):
+        assert weight > 0, ("weight must be > 0", weight)
+        assert reserved >= 0, ("reserved must be >= 0", reserved)
+        self.name = name
+        self.weight = weight
+        self.reserved = reserved
+        self.in_use = 0
+        self._waiters = collections.deque()
+        # 平滑加权轮询的当前权重
+        self._current_weight = 0
+        # 统计数据
+        self._acquired = 0
+        self._waited = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._recent_waits = collections.deque(maxlen=1024)
+
+    def _record_wait(self, wait):
+        self._acquired += 1
+        self._recent_waits.append(wait)
+        if wait > 0:
+            self._waited += 1
+            self._wait_time += wait
+            if wait > self._max_wait:
+                self._max_wait = wait
+
+    def stats(self):
+        waits = sorted(self._recent_waits)
+
+        def percentile(p):
+            return waits[min(int(len(waits) * p), len(waits) - 1)] if waits else 0.0
+
+        return {
+            'in_use': self.in_use,
+            'waiting': len(self._waiters),
+            'reserved': self.reserved,
+            'weight': self.weight,
+            'acquired': self._acquired,
+            'waited': self._waited,
+            'wait_time': self._wait_time,
+            'max_wait': self._max_wait,
+            'p50_wait': percentile(0.5),
+            'p99_wait': percentile(0.99),
+        }
+
+    def __repr__(self):
+        return '<Lane [name:{}, weight:{}, reserved:{}, in_use:{}]>'.format(
+            self.name, self.weight, self.reserved, self.in_use)
+
+
+class LaneScheduler:
+    """按照通道分配连接池的连接数额度
+
+    同时使用的连接数不超过capacity，每个通道在额度以内的时候直接获取，
+    否则在自己的通道中排队，有连接释放的时候使用平滑加权轮询选择下一个通道
+    """
+
+    def __init__(self, lanes, capacity, *, default=None, loop=None):
+        assert lanes, "at least one lane is required"
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._lanes = collections.OrderedDict((lane.name, lane) for lane in lanes)
+        assert len(self._lanes) == len(lanes), "lane names must be unique"
+        assert sum(lane.reserved for lane in lanes) <= capacity, ("reserved connections exceed capacity", capacity)
+        self.capacity = capacity
+        self.default = default if default is not None else lanes[0].name
+        self._loop = loop
+        self._in_use = 0
+
+    def get_lane(self, name):
+        if name is None:
+            name = self.default
+        try:
+            return self._lanes[name]
+        except KeyError:
+            raise ValueError("Unknown priority lane: {}".format(name))
+
+    def _can_grant(self, lane):
+        if self._in_use >= self.capacity:
+            return False
+        if lane.in_use < lane.reserved:
+            return True
+        # 其它通道还没有用完的保留额度不能占用
+        held = sum(max(other.reserved - other.in_use, 0) for other in self._lanes.values() if other is not lane)
+        return self._in_use + held < self.capacity
+
+    def _grant(self, lane):
+        lane.in_use += 1
+        self._in_use += 1
+
+    @asyncio.coroutine
+    def acquire(self, lane):
+        if not lane._waiters and self._can_grant(lane):
+            self._grant(lane)
+            lane._record_wait(0.0)
+            return
+        fut = asyncio.Future(loop=self._loop)
+        start = self._loop.time()
+        lane._waiters.append(fut)
+        try:
+            yield from fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 已经分配了额度，但是等待的协程被取消了，归还额度
+                self.release(lane)
+            else:
+                try:
+                    lane._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+        lane._record_wait(self._loop.time() - start)
+
+    def release(self, lane):
+        lane.in_use -= 1
+        self._in_use -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        """把空闲的额度分配给等待中的协程，capacity变化之后也需要调用"""
+        while 1:
+            candidates = [lane for lane in self._lanes.values() if lane._waiters and self._can_grant(lane)]
+            if not candidates:
+                return
+            total = 0
+            chosen = None
+            for lane in candidates:
+                lane._current_weight += lane.weight
+                total += lane.weight
+                if chosen is None or lane._current_weight > chosen._current_weight:
+                    chosen = lane
+            chosen._current_weight -= total
+            fut = chosen._waiters.popleft()
+            if fut.done():
+                continue
+            self._grant(chosen)
+            set_result(fut, None)
+
+    def reset(self, loop):
+        """连接池换到新的事件循环(比如fork之后)时调用，清空使用中的额度和等待的协程，
+        等待的期物属于旧的事件循环，直接丢弃，统计数据保留"""
+        self._loop = loop
+        self._in_use = 0
+        for lane in self._lanes.values():
+            lane.in_use = 0
+            lane._current_weight = 0
+            lane._waiters.clear()
+
+    @property
+    def lanes(self):
+        return list(self._lanes.values())
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    def __repr__(self):
+        return '<LaneScheduler [capacity:{}, in_use:{}, lanes:{}]>'.format(
+            self.capacity, self._in_use, list(self._lanes))
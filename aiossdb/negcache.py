@@ -0,0 +1,156 @@
+import time
+import collections
+
+from .commands import KEY_WRITES, HASH_KEY_WRITES, value_positions
+from .parser import utf8_encode
+
+
+class _Segment:
+    """一个key前缀对应的有上限的TTL集合，按照加入的顺序淘汰"""
+
+    __slots__ = ('ttl', 'maxsize', 'entries')
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+
+
+class NegativeCache:
+    """否定缓存，记录最近返回not_found的get/hget，在ttl秒内直接在本地回答，不再访问服务器
+
+    通过Client执行的写命令(set、incr、hset、multi_set等)会使对应的记录失效，
+    其它客户端写入的key最多在ttl秒之后才能读到，只适合可以接受这个延迟的key
+
+    没有使用Bloom filter: 误判会把存在的key当作不存在，对否定缓存来说是错误的结果，
+    所以每个前缀使用精确的集合并限制大小
+
+    :param ttl: 默认的过期秒数，None表示没有匹配前缀的key不缓存
+    :param maxsize: 每个前缀最多记录的key数量，超过时淘汰最早加入的记录
+    :param prefixes: {key前缀: ttl或None}，最长的匹配前缀优先，hash按照名称匹配，
+                     每个前缀单独计算maxsize，热点前缀不会挤掉其它前缀的记录
+    :param commands: 使用缓存的命令，默认为get和hget
+    """
+
+    def __init__(self, ttl=1.0, maxsize=10000, *, prefixes=None, commands=('get', 'hget'), clock=time.monotonic):
+        assert maxsize > 0, ("maxsize must be > 0", maxsize)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.commands = frozenset(commands)
+        self._clock = clock
+        self._default = _Segment(ttl, maxsize) if ttl is not None else None
+        self._prefixes = sorted(((utf8_encode(prefix), _Segment(t, maxsize) if t is not None else None)
+                                 for prefix, t in (prefixes or {}).items()),
+                                key=lambda item: len(item[0]), reverse=True)
+        # 每次失效加一，读取之前记下版本号，返回not_found的时候如果期间key被写过就不再记录
+        self._version = 0
+        # 最近失效的key -> 失效时的版本号，超过maxsize的部分丢弃，_floor为丢弃的最大版本号
+        self._invalidated = collections.OrderedDict()
+        self._floor = 0
+        # 统计数据
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._skipped = 0
+        self._invalidations = 0
+        self._evicted = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def _key(self, command, args):
+        """返回(前缀的集合, 缓存的key)，不缓存的时候集合为None"""
+        if command == 'hget':
+            name, key = utf8_encode(args[0]), (utf8_encode(args[0]), utf8_encode(args[1]))
+        else:
+            name = key = utf8_encode(args[0])
+        for prefix, segment in self._prefixes:
+            if name.startswith(prefix):
+                return segment, key
+        return self._default, key
+
+    def get(self, command, args):
+        """key已知不存在并且没有过期的时候返回True"""
+        if command not in self.commands or len(args) != (2 if command == 'hget' else 1):
+            return False
+        segment, key = self._key(command, args)
+        if segment is not None:
+            expires = segment.entries.get(key)
+            if expires is not None:
+                if expires > self._clock():
+                    self._hits += 1
+                    return True
+                del segment.entries[key]
+        self._misses += 1
+        return False
+
+    def add(self, command, args, version):
+        """记录返回了not_found的key，version是发送命令之前读取的版本号"""
+        if command not in self.commands or len(args) != (2 if command == 'hget' else 1):
+            return
+        segment, key = self._key(command, args)
+        if segment is None:
+            return
+        if version < self._version and (version < self._floor or self._invalidated.get(key, 0) > version):
+            # 命令在途的时候key被写过，服务器上可能已经存在
+            self._skipped += 1
+            return
+        entries = segment.entries
+        entries[key] = self._clock() + segment.ttl
+        entries.move_to_end(key)
+        self._stored += 1
+        while len(entries) > segment.maxsize:
+            entries.popitem(last=False)
+            self._evicted += 1
+
+    def invalidate(self, command, args):
+        """写命令发送之前调用，使可能被创建的key失效"""
+        if command in KEY_WRITES:
+            keys = [utf8_encode(args[i]) for i in value_positions(KEY_WRITES, command, len(args))]
+            self._discard('get', keys)
+        elif command in HASH_KEY_WRITES:
+            name = utf8_encode(args[0]) if args else b''
+            keys = [(name, utf8_encode(args[i])) for i in value_positions(HASH_KEY_WRITES, command, len(args))]
+            self._discard('hget', keys)
+        elif command == 'flushdb':
+            self.clear()
+
+    def _discard(self, command, keys):
+        self._version += 1
+        for key in keys:
+            segment, _ = self._key(command, key if command == 'hget' else (key,))
+            if segment is not None and segment.entries.pop(key, None) is not None:
+                self._invalidations += 1
+            self._invalidated[key] = self._version
+            self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.maxsize:
+            _, version = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, version)
+
+    def clear(self):
+        self._version += 1
+        self._floor = self._version
+        self._invalidated.clear()
+        for segment in [self._default] + [segment for _, segment in self._prefixes]:
+            if segment is not None:
+                segment.entries.clear()
+
+    def __len__(self):
+        return sum(len(segment.entries) for segment in [self._default] + [s for _, s in self._prefixes]
+                   if segment is not None)
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'hits': self._hits,
+            'misses': self._misses,
+            'stored': self._stored,
+            'skipped': self._skipped,
+            'invalidations': self._invalidations,
+            'evicted': self._evicted,
+        }
+
+    def __repr__(self):
+        return '<NegativeCache [ttl:{}, size:{}, prefixes:{}]>'.format(
+            self.ttl, len(self), [p for p, _ in self._prefixes])
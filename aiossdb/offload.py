@@ -0,0 +1,104 @@
+import asyncio
+
+from .errors import ProtocolError, ReplyError
+from .parser import SSDBParser
+
+
+class ReplyFramer:
+    """只根据长度行找到一条完整返回的结束位置，不创建数据块对象，
+    数据不完整的时候记住扫描位置，下次从这里继续"""
+
+    def __init__(self):
+        self.pos = 0
+
+    def frame(self, buf):
+        """返回buf中第一条完整返回的结束位置，返回不完整的时候返回-1"""
+        pos = self.pos
+        while 1:
+            offset = buf.find(b'\n', pos)
+            if offset < 0:
+                self.pos = pos
+                return -1
+            if offset == pos:
+                # 空行是返回的结束符
+                self.pos = 0
+                return offset + 1
+            try:
+                size = int(buf[pos:offset])
+            except ValueError:
+                raise ProtocolError("Expected int")
+            end = offset + size + 2
+            if end > len(buf):
+                self.pos = pos
+                return -1
+            pos = end
+
+
+def finish_reply(obj, encoding=None, reply_factory=None, decoder=None):
+    """把解析器返回的数据转换成命令的返回值，可能在事件循环中执行，也可能在executor中执行"""
+    if isinstance(obj, ReplyError):
+        return obj
+    if reply_factory is not None:
+        if obj.error is not None:
+            raise obj.error
+        return obj
+    if decoder is not None:
+        return decoder(obj)
+    if encoding and isinstance(obj, list):
+        return [val.decode(encoding) for val in obj]
+    return obj
+
+
+def parse_frame(frame, encoding=None, reply_factory=None, decoder=None):
+    """解析一条完整的返回，包括切分数据块、解码以及decoder的反序列化"""
+    parser = SSDBParser()
+    parser.reply_factory = reply_factory
+    parser.feed(frame)
+    obj = parser.gets()
+    if obj is False:
+        raise ProtocolError("Incomplete reply")
+    return finish_reply(obj, encoding, reply_factory, decoder)
+
+
+class ReplyOffload:
+    """超过threshold字节的返回交给executor解析，避免大的返回长时间阻塞事件循环
+
+    连接只负责按照长度行切分出完整的返回，较小的返回仍然在事件循环中解析
+    executor可以是线程池或者进程池，为None的时候使用事件循环默认的线程池，
+    使用进程池的时候decoder和reply_factory需要可以pickle
+    """
+
+    def __init__(self, threshold=1024 * 1024, executor=None):
+        assert threshold > 0, ("threshold must be > 0", threshold)
+        self.threshold = threshold
+        self.executor = executor
+        # 统计数据
+        self.inline = 0
+        self._offloaded = 0
+        self._offloaded_bytes = 0
+        self._max_frame = 0
+        self._executor_time = 0.0
+
+    @asyncio.coroutine
+    def run(self, loop, frame, *args):
+        self._offloaded += 1
+        self._offloaded_bytes += len(frame)
+        self._max_frame = max(self._max_frame, len(frame))
+        start = loop.time()
+        try:
+            return (yield from loop.run_in_executor(self.executor, parse_frame, frame, *args))
+        finally:
+            self._executor_time += loop.time() - start
+
+    def stats(self):
+        return {
+            'threshold': self.threshold,
+            'inline': self.inline,
+            'offloaded': self._offloaded,
+            'offloaded_bytes': self._offloaded_bytes,
+            'max_frame': self._max_frame,
+            'executor_time': self._executor_time,
+        }
+
+    def __repr__(self):
+        return '<ReplyOffload [threshold:{}, offloaded:{}]>'.format(self.threshold, self._offloaded)
@@ -19,22 +19,49 @@ def encode_command(command, *args):
         get
         3
         key
+
+    直接写入一个bytearray，不创建中间的列表和格式化字符串
     """
     if command == "delete":
         command = "del"
 
-    args = [utf8_encode(command)] + [utf8_encode(i) for i in args]
-    buf = utf8_encode('').join(utf8_encode('%d\n%s\n') % (len(i), i) for i in args) + utf8_encode('\n')
+    data = utf8_encode(command)
+    buf = bytearray(b'%d\n' % len(data))
+    buf += data
+    buf += b'\n'
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf8')
+        elif isinstance(arg, int):
+            arg = str(arg).encode('utf8')
+        buf += b'%d\n' % len(arg)
+        buf += arg
+        buf += b'\n'
+    buf += b'\n'
     return buf
 
 
 class SSDBParser:
+    """状态机实现的解析器
+
+    Response := Status Block*
+    Status   := Block
+    每条返回以空行结束。buf中的数据使用pos游标读取，只在数据全部解析完或者
+    返回False(数据不完整)的时候压缩一次buf，避免每读一行都移动整个缓冲区
+    """
+
     def __init__(self, encoding=None):
         # 字节数组
         self.buf = bytearray()
         self.pos = 0
-        self._gen = None
         self.encoding = encoding
+        # 当前(或者上一条)返回数据已经消费的字节数
+        self.reply_size = 0
+        # 不为None的时候，返回数据块不再组成列表，而是交给reply_factory()创建的对象的add方法，
+        # 由连接在解析每条返回之前设置
+        self.reply_factory = None
+        # 正在解析的返回: 还没有读到状态时为None，状态不是ok时为ReplyError，否则为数据列表
+        self._reply = None
 
     def feed(self, data, o=0, l=-1):
         if l == -1:
@@ -43,88 +70,73 @@ class SSDBParser:
             raise ValueError("negative input")
         if o + l > len(data):
             raise ValueError("input is larger than buffer size")
-        self.buf.extend(data[o:o+l])
-
-    def gets(self):
-        """获取解析的数据，或者返回False"""
-        return self.parse_one()
-
-    def wait_some(self, size):
-        """如果buf长度一直小于所需要的size，则一直迭代False，
-        这样就要从套接字来读取数据，直到拿到所有数据"""
-        while len(self.buf) < self.pos + size:
-            yield False
-
-    def wait_any(self):
-        """等待buf进入任意一个字符"""
-        yield from self.wait_some(len(self.buf) + 1)
-
-    def read_line(self, size=None):
-        if size is not None:
-            # size是要读取的数据长度，不会包含\n
-            if len(self.buf) < size + 1 + self.pos:
-                yield from self.wait_some(size+1)
-            offset = self.pos + size
-            # 如果请求的该行结束符不是\n的话
-            if self.buf[offset:offset+1] != b'\n':
-                raise ProtocolError(msg="Expected b'\n'")
+        if o == 0 and l == len(data):
+            self.buf += data
         else:
-            # 从self.pos开始查找b'\n'的最早出现的位置，如果没有返回-1
-            offset = self.buf.find(b'\n', self.pos)
-            while offset < 0:
-                yield from self.wait_any()
-                offset = self.buf.find(b'\n', self.pos)
-        val = self.buf[self.pos:offset]
-        # 读取一行后重置
-        self.pos = 0
-        # 删除该行数据
-        del self.buf[:offset + 1]
-        if self.encoding:
-            val = val.decode(self.encoding)
-        return val
+            self.buf += data[o:o+l]
 
-    def read_int(self):
-        """读取协议中定义为数据长度的行"""
-        try:
-            value = yield from self.read_line()
-            return int(value)
-        except ValueError:
-            raise ProtocolError("Expected int")
-
-    def parse(self):
-        size = yield from self.read_int()
-        status = yield from self.read_line(size)
-        if status != 'ok':
-            return ReplyError(status)
-        data = []
-        try:
-            # 可能没有数据，所以在读完状态后的值可能不是int，而是换行符
-            # 如果有异常则数据为空
-            size = yield from self.read_int()
-        except ProtocolError:
-            return data
-        while True:
-            val = yield from self.read_line(size)
-            data.append(val)
+    def gets(self):
+        """获取解析的数据，数据还不完整的时候返回False"""
+        buf = self.buf
+        pos = self.pos
+        reply = self._reply
+        length = len(buf)
+        while 1:
+            offset = buf.find(b'\n', pos)
+            if offset < 0:
+                break
+            if offset == pos:
+                # 空行，返回结束
+                if reply is None:
+                    self._reset(pos)
+                    raise ProtocolError("Expected int")
+                self.reply_size += 1
+                self._reply = None
+                pos += 1
+                if pos == length:
+                    del buf[:]
+                    pos = 0
+                self.pos = pos
+                return reply
             try:
-                size = yield from self.read_int()
-            except ProtocolError:
+                size = int(buf[pos:offset])
+            except ValueError:
+                self._reset(pos)
+                raise ProtocolError("Expected int")
+            start = offset + 1
+            end = start + size
+            if end >= length:
+                # 数据块还没有完整读到
                 break
-        return data
+            if buf[end] != 10:
+                self._reset(pos)
+                raise ProtocolError("Expected b'\\n'")
+            if reply is None:
+                # 状态块
+                self.reply_size = 0
+                if size == 2 and buf[start] == 111 and buf[start + 1] == 107:
+                    reply = [] if self.reply_factory is None else self.reply_factory()
+                else:
+                    reply = ReplyError(buf[start:end].decode('ascii', 'replace'))
+            elif reply.__class__ is list:
+                val = buf[start:end]
+                if self.encoding:
+                    val = val.decode(self.encoding)
+                reply.append(val)
+            elif not isinstance(reply, ReplyError):
+                reply.add(buf, start, end)
+            # 错误状态后面的数据块(错误信息)直接跳过
+            self.reply_size += end + 1 - pos
+            pos = end + 1
+        self._reply = reply
+        # 数据不完整，丢掉已经解析的部分，下次从不完整的那一行开始
+        if pos:
+            del buf[:pos]
+        self.pos = 0
+        return False
 
-    def parse_one(self):
-        # 用来驱动生成器获取需要的数据
-        # 读取一行，偶数行是数字，奇数行是数据
-        if self._gen is None:
-            self._gen = self.parse()
-        try:
-            # 激活协程
-            self._gen.send(None)
-        except StopIteration as e:
-            self._gen = None
-            return e.value
-        except Exception:
-            self._gen = None
-            raise
-        else:
-            return False
+    def _reset(self, pos):
+        """协议错误之后丢弃已经读取的部分"""
+        self._reply = None
+        del self.buf[:pos]
+        self.pos = 0
@@ -1,19 +1,59 @@
+import os
 import asyncio
+import itertools
 import collections
 
 from .connection import create_connection
-from .errors import PoolClosedError
+from .errors import PoolClosedError, ReplyError
+from .autoscale import AutoScaler
+from .flow import FlowControl
+from .lanes import LaneScheduler
 from .log import logger
+from .retry import RETRYABLE_ERRORS
+from .scan import ParallelScan
+
+
+_pid = os.getpid()
+
+
+def _after_fork_in_child():
+    global _pid
+    _pid = os.getpid()
+
+
+# 支持register_at_fork的时候只在fork之后更新一次pid，检查时不需要系统调用
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+    def _getpid():
+        return _pid
+else:
+    _getpid = os.getpid
 
 
 def create_pool(address, *, password=None, encoding='utf-8', minsize=1, maxsize=10,
-                parser=None, loop=None, timeout=None, pool_cls=None, connection_cls=None):
+                parser=None, loop=None, timeout=None, pool_cls=None, connection_cls=None, slowlog=None,
+                retry_policy=None, circuit_breaker=None, max_pending=None, max_pending_bytes=None,
+                conn_max_pending=None, conn_max_pending_bytes=None, write_buffer_limits=None, lanes=None,
+                autoscaler=None, offload=None, hedge_policy=None, hedge_pool=None, capture=None,
+                server_stats=None):
+    """创建连接池并填充minsize条连接
+
+    max_pending/max_pending_bytes限制整个连接池的在途命令，conn_max_pending/conn_max_pending_bytes
+    限制单条连接，但是execute独占连接，只有通过get_connection取出连接自己pipeline的时候才会用到后者
+    """
     if pool_cls is None:
         pool_cls = SSDBConnectionPool
 
     pool = pool_cls(address, password=password, encoding=encoding,
                     parser=parser, minsize=minsize, maxsize=maxsize,
-                    loop=loop, timeout=timeout, connection_cls=connection_cls)
+                    loop=loop, timeout=timeout, connection_cls=connection_cls, slowlog=slowlog,
+                    retry_policy=retry_policy, circuit_breaker=circuit_breaker,
+                    max_pending=max_pending, max_pending_bytes=max_pending_bytes,
+                    conn_max_pending=conn_max_pending, conn_max_pending_bytes=conn_max_pending_bytes,
+                    write_buffer_limits=write_buffer_limits, lanes=lanes, autoscaler=autoscaler,
+                    offload=offload, hedge_policy=hedge_policy, hedge_pool=hedge_pool, capture=capture,
+                    server_stats=server_stats)
 
     # 首先先填充空闲连接
     try:
@@ -26,10 +66,19 @@ def create_pool(address, *, password=None, encoding='utf-8', minsize=1, maxsize=
     return pool
 
 
+def _discard_result(fut):
+    """对冲请求中落后的一方，取出异常避免asyncio报告没有被获取的异常"""
+    if not fut.cancelled():
+        fut.exception()
+
+
 class SSDBConnectionPool:
 
     def __init__(self, address, *, password=None, parser=None, encoding=None, minsize, maxsize,
-                 connection_cls=None, timeout=None, loop=None):
+                 connection_cls=None, timeout=None, loop=None, slowlog=None, retry_policy=None,
+                 circuit_breaker=None, max_pending=None, max_pending_bytes=None, conn_max_pending=None,
+                 conn_max_pending_bytes=None, write_buffer_limits=None, lanes=None, autoscaler=None,
+                 offload=None, hedge_policy=None, hedge_pool=None, capture=None, server_stats=None):
         assert isinstance(minsize, int) and minsize >= 0, ("minsize must be int >=0", minsize, type(minsize))
         assert isinstance(maxsize, int) and maxsize >= minsize, (
             "maxsize must be int >= minsize", maxsize, type(maxsize), minsize)
@@ -47,20 +96,187 @@ class SSDBConnectionPool:
         self._minsize = minsize
         self._maxsize = maxsize
         self._encoding = encoding
+        # 所有连接共享同一个慢日志
+        self._slowlog = slowlog
+        # 连接出错时的重试策略以及熔断器，都是可选的
+        self._retry_policy = retry_policy
+        self._circuit_breaker = circuit_breaker
+        # 在途命令的限制，整个连接池一个FlowControl，每条连接一个FlowControl并以前者为parent
+        # execute独占一条连接直到返回，每条连接上最多只有一条在途命令，所以conn_max_pending和
+        # conn_max_pending_bytes对execute不起作用，只限制通过get_connection取出连接、
+        # 在上面连续发送多条命令(pipeline)并且每次发送之前调用conn.wait_writable的调用者
+        self._flow = None
+        if (max_pending, max_pending_bytes, conn_max_pending, conn_max_pending_bytes) != (None,) * 4:
+            self._flow = FlowControl(max_pending, max_pending_bytes, loop=loop)
+        self._conn_max_pending = conn_max_pending
+        self._conn_max_pending_bytes = conn_max_pending_bytes
+        self._write_buffer_limits = write_buffer_limits
+        # 所有连接共享同一个ReplyOffload，较大的返回交给executor解析
+        self._offload = offload
+        # 所有连接共享同一个TrafficCapture，记录发送的命令
+        self._capture = capture
+        # 只读命令的对冲请求，hedge_pool为副本的连接池，为None的时候在本连接池的另一条连接上发送
+        self._hedge_policy = hedge_policy
+        self._hedge_pool = hedge_pool
+        # 优先级通道，lanes是Lane的列表，第一个为默认通道
+        self._lanes = LaneScheduler(lanes, maxsize, loop=loop) if lanes else None
         # 用于release后同步各个其他获取新连接的协程，使其开始工作，否则等待条件
         self._cond = asyncio.Condition(lock=asyncio.Lock(loop=loop), loop=loop)
         self._waiter = None
         self._closing = False
         self._closed = False
+        # 正在等待获取连接的协程数，以及其中在条件变量上等待release通知的协程数
+        self._waiting = 0
+        self._cond_waiters = 0
+        # 自动伸缩，maxsize是初始大小，会在minsize和autoscaler.max_limit之间调整
+        self._autoscaler = autoscaler
+        self._autoscale_task = None
+        self._released_at = {}
+        if autoscaler is not None:
+            assert autoscaler.max_limit >= maxsize, ("autoscaler max_limit must be >= maxsize", autoscaler.max_limit)
+            # 收缩时可能还有正在创建的连接，deque按照上限分配，避免append时丢掉连接
+            self._pool = collections.deque(maxlen=autoscaler.max_limit)
+            self._autoscale_task = asyncio.ensure_future(self._autoscale(), loop=loop)
+        # ServerStatsPoller，在单独的连接上轮询服务端的info，不占用连接池中的连接
+        self._server_stats = server_stats
+        if server_stats is not None:
+            server_stats.start(address, password=password, loop=loop)
+        # 创建连接池的进程，fork之后在子进程中使用时丢弃继承的连接
+        self._pid = _getpid()
+        # 子进程中放弃的连接，一直持有它们，避免被回收时访问父进程的事件循环
+        self._orphans = []
+
+    @asyncio.coroutine
+    def execute(self, command, *args, priority=None, **kwargs):
+        """执行命令，配置了优先级通道的时候，priority指定使用哪个通道，默认为第一个通道"""
+        if self._pid != _getpid():
+            self._reset_after_fork()
+        if self._lanes is not None:
+            kwargs['lane'] = self._lanes.get_lane(priority)
+        if self._retry_policy is None and self._circuit_breaker is None:
+            return (yield from self._attempt(command, *args, **kwargs))
+        breaker = self._circuit_breaker
+        attempt = 0
+        while 1:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                res = yield from self._attempt(command, *args, **kwargs)
+            except ReplyError:
+                # 服务器正常返回了错误，说明节点是可用的
+                if breaker is not None:
+                    breaker.record_success()
+                raise
+            except RETRYABLE_ERRORS as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                if self._retry_policy is None or not self._retry_policy.should_retry(command, attempt):
+                    raise
+                delay = self._retry_policy.get_delay(attempt)
+                attempt += 1
+                logger.warning("Command %s failed with %r, retry %d in %.3fs", command, e, attempt, delay)
+                # 关闭的连接会在获取连接的时候被丢弃，重试会使用新的连接
+                yield from asyncio.sleep(delay, loop=self._loop)
+            except BaseException:
+                # 其它异常(比如被取消)不能说明节点的状态，只释放半开状态的探测名额
+                if breaker is not None:
+                    breaker.release_probe()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return res
+
+    def _attempt(self, command, *args, **kwargs):
+        if self._hedge_policy is not None and self._hedge_policy.should_hedge(command):
+            return self._execute_hedged(command, *args, **kwargs)
+        return self._execute(command, *args, **kwargs)
+
+    def _hedge_pool_healthy(self):
+        server_stats = getattr(self._hedge_pool, 'server_stats', None)
+        return server_stats is None or server_stats.healthy
+
+    @asyncio.coroutine
+    def _execute_hedged(self, command, *args, **kwargs):
+        """先在一条连接上发送，超过对冲延迟还没有返回的时候再发送一次，使用先返回的结果
+
+        落后的请求不会被取消，而是正常执行完成并释放连接，结果直接丢弃，
+        这样不需要从连接的_waiters中间移除命令"""
+        policy = self._hedge_policy
+        start = self._loop.time()
+        primary = asyncio.ensure_future(self._execute(command, *args, **kwargs), loop=self._loop)
+        try:
+            done, pending = yield from asyncio.wait([primary], timeout=policy.get_delay(), loop=self._loop)
+        except BaseException:
+            primary.add_done_callback(_discard_result)
+            raise
+        # 副本不可用或者复制状态不正常的时候不发送对冲请求
+        if done or not self._hedge_pool_healthy() or not policy.try_hedge():
+            res = yield from primary
+            policy.record(self._loop.time() - start)
+            return res
+        if self._hedge_pool is not None:
+            # 副本连接池有自己的优先级通道
+            kwargs.pop('lane', None)
+            hedge = asyncio.ensure_future(self._hedge_pool.execute(command, *args, **kwargs), loop=self._loop)
+        else:
+            hedge = asyncio.ensure_future(self._execute(command, *args, **kwargs), loop=self._loop)
+        pending = {primary, hedge}
+        winner = None
+        try:
+            while winner is None:
+                done, pending = yield from asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED,
+                                                        loop=self._loop)
+                for fut in sorted(done, key=lambda f: f is not primary):
+                    exc = fut.exception()
+                    # 连接出错的请求只有在另一个也结束的时候才作为结果
+                    if exc is None or isinstance(exc, ReplyError) or not pending:
+                        winner = fut
+                        break
+        finally:
+            for fut in pending:
+                fut.add_done_callback(_discard_result)
+        for fut in done:
+            if fut is not winner:
+                _discard_result(fut)
+        res = winner.result()
+        policy.record(self._loop.time() - start, hedge_won=winner is hedge)
+        return res
 
     @asyncio.coroutine
-    def execute(self, command, *args, **kwargs):
-        conn, address = yield from self.get_connection()
+    def _execute(self, command, *args, lane=None, **kwargs):
+        timed = self._slowlog is not None or self._autoscaler is not None
+        if timed:
+            start = self._loop.time()
+        if lane is not None:
+            yield from self._lanes.acquire(lane)
         try:
-            fut = yield from conn.execute(command, *args, **kwargs)
+            self._waiting += 1
+            try:
+                conn, address = yield from self.get_connection()
+            finally:
+                self._waiting -= 1
+            if timed:
+                acquired = self._loop.time()
+                kwargs['queue_time'] = acquired - start
+            try:
+                if self._flow is not None or self._write_buffer_limits is not None:
+                    # 超过在途限制或者写缓冲区超过高水位的时候在这里等待
+                    yield from conn.wait_writable()
+                res = yield from conn.execute(command, *args, **kwargs)
+            finally:
+                yield from self.release(conn)
+            if self._autoscaler is not None:
+                self._autoscaler.observe(acquired - start, self._loop.time() - acquired)
+            return res
         finally:
-            yield from self.release(conn)
-        return fut
+            if lane is not None:
+                self._lanes.release(lane)
+
+    def parallel_scan(self, command='scan', name=None, start='', end='', **kwargs):
+        """把范围分成多个子范围，使用多条连接并发的scan，返回ParallelScan，参数见ParallelScan"""
+        kwargs.setdefault('loop', self._loop)
+        return ParallelScan(self, command, name, start, end, **kwargs)
 
     @property
     def minsize(self):
@@ -78,6 +294,80 @@ class SSDBConnectionPool:
     def size(self):
         return len(self._pool) + len(self._used)
 
+    @property
+    def slowlog(self):
+        return self._slowlog
+
+    @property
+    def flow(self):
+        return self._flow
+
+    def stats(self):
+        """连接池当前负载的统计数据"""
+        stats = {
+            'size': self.size,
+            'freesize': self.freesize,
+            'used': len(self._used),
+            'pending': sum(conn.pending for conn in itertools.chain(self._pool, self._used)),
+        }
+        if self._flow is not None:
+            stats['flow'] = self._flow.stats()
+        if self._circuit_breaker is not None:
+            stats['circuit_breaker'] = self._circuit_breaker.stats()
+        if self._lanes is not None:
+            stats['lanes'] = self._lanes.stats()
+        if self._autoscaler is not None:
+            stats['autoscaler'] = self._autoscaler.stats()
+        if self._offload is not None:
+            stats['offload'] = self._offload.stats()
+        if self._hedge_policy is not None:
+            stats['hedge'] = self._hedge_policy.stats()
+        if self._capture is not None:
+            stats['capture'] = self._capture.stats()
+        if self._server_stats is not None:
+            stats['server'] = self._server_stats.stats()
+        return stats
+
+    @property
+    def hedge_policy(self):
+        return self._hedge_policy
+
+    @property
+    def offload(self):
+        return self._offload
+
+    @property
+    def server_stats(self):
+        return self._server_stats
+
+    @property
+    def capture(self):
+        return self._capture
+
+    @property
+    def autoscaler(self):
+        return self._autoscaler
+
+    @property
+    def waiting(self):
+        """正在等待获取连接的协程数，包括在优先级通道中排队的"""
+        waiting = self._waiting
+        if self._lanes is not None:
+            waiting += sum(len(lane._waiters) for lane in self._lanes.lanes)
+        return waiting
+
+    @property
+    def lanes(self):
+        return self._lanes
+
+    @property
+    def retry_policy(self):
+        return self._retry_policy
+
+    @property
+    def circuit_breaker(self):
+        return self._circuit_breaker
+
     @asyncio.coroutine
     def get_connection(self):
         """获取连接，要么在空闲连接中直接获取，要么等待直到获得新的连接，
@@ -85,9 +375,12 @@ class SSDBConnectionPool:
 
         如果连接池自己调用的execute会自动调用release
         如果直接调用这个函数获取的连接，使用完成之后必须显式调用release方法"""
+        if self._pid != _getpid():
+            self._reset_after_fork()
         # 在pool中寻找
         for i in range(self.freesize):
-            conn = self._pool.popleft()
+            # 自动伸缩的时候优先使用最近释放的连接，多余的连接才会空闲下来被回收
+            conn = self._pool.pop() if self._autoscaler is not None else self._pool.popleft()
             # 如果连接已经关闭，则查找pool中下一个连接
             if conn.closed:
                 continue
@@ -125,7 +418,88 @@ class SSDBConnectionPool:
                 else:
                     # 等待release的释放连接，然后调用notify方法来通知此处
                     # wait的时候会将lock释放
-                    yield from self._cond.wait()
+                    self._cond_waiters += 1
+                    try:
+                        yield from self._cond.wait()
+                    finally:
+                        self._cond_waiters -= 1
+
+    def _reset_after_fork(self, loop=None):
+        """在fork出的子进程中丢弃从父进程继承的连接和等待状态，之后按需重新建立连接
+
+        继承的连接只关闭子进程中的文件描述符，不会向服务器发送任何数据，
+        否则父子进程的返回会混在同一条连接上，打乱_waiters的顺序"""
+        logger.info("Pool %r is inherited from process %d, dropping %d connections",
+                    self, self._pid, self.size)
+        self._pid = _getpid()
+        self._reset_loop(loop, inherited=True)
+
+    def _reset_loop(self, loop=None, *, inherited=False):
+        """丢弃所有连接和等待状态，换到新的事件循环中，inherited表示连接是从父进程继承的
+
+        同一个进程中的连接正常关闭，但是旧的事件循环已经关闭的时候transport无法再关闭，
+        这时和继承的连接一样只关闭套接字"""
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        old_loop_closed = self._loop.is_closed()
+        for conn in itertools.chain(self._pool, self._used):
+            if inherited or old_loop_closed:
+                conn.orphan()
+                self._orphans.append(conn)
+            else:
+                conn.close()
+        self._pool = collections.deque(maxlen=self._pool.maxlen)
+        self._used = set()
+        self._released_at = {}
+        self._loop = loop
+        self._cond = asyncio.Condition(lock=asyncio.Lock(loop=loop), loop=loop)
+        self._waiting = 0
+        self._cond_waiters = 0
+        if self._flow is not None:
+            self._flow = FlowControl(self._flow.max_commands, self._flow.max_bytes, loop=loop)
+        if self._lanes is not None:
+            self._lanes.reset(loop)
+        if self._autoscale_task is not None:
+            if not inherited and not old_loop_closed:
+                self._autoscale_task.cancel()
+            # 旧的任务属于原来的事件循环，不会在新的事件循环中运行
+            self._autoscale_task = asyncio.ensure_future(self._autoscale(), loop=loop)
+        if self._server_stats is not None:
+            if inherited:
+                self._server_stats.after_fork(loop)
+            else:
+                self._server_stats.restart(loop)
+
+    @asyncio.coroutine
+    def after_fork(self, loop=None):
+        """在子进程的事件循环中调用，比如gunicorn worker启动的时候，
+        丢弃继承的连接并预先建立minsize条连接，第一批请求不需要等待建立连接
+
+        在同一个进程中换到新的事件循环时也可以调用，这时原来的连接会被正常关闭"""
+        if self._pid != _getpid():
+            self._reset_after_fork(loop)
+        elif loop is not None and loop is not self._loop:
+            self._reset_loop(loop)
+        yield from self.warm_up()
+
+    @asyncio.coroutine
+    def warm_up(self):
+        """预先建立minsize条连接"""
+        if self.closed:
+            raise PoolClosedError("Pool is closed")
+        with (yield from self._cond):
+            yield from self._fill_free(overall=False)
+
+    def _create_new_connection(self):
+        flow = None
+        if self._flow is not None:
+            flow = FlowControl(self._conn_max_pending, self._conn_max_pending_bytes, parent=self._flow, loop=self._loop)
+        return create_connection(self._address, password=self._password,
+                                 encoding=self._encoding, parser=self._parser_class,
+                                 loop=self._loop, timeout=self._timeout,
+                                 connect_cls=self._connection_cls, slowlog=self._slowlog,
+                                 flow=flow, write_buffer_limits=self._write_buffer_limits,
+                                 offload=self._offload, capture=self._capture)
 
     @asyncio.coroutine
     def _fill_free(self, *, overall):
@@ -134,12 +508,13 @@ class SSDBConnectionPool:
         # 首先将size填充到最小连接数
         while self.size < self._minsize:
             try:
-                conn = yield from create_connection(self._address, password=self._password,
-                                                    encoding=self._encoding, parser=self._parser_class,
-                                                    loop=self._loop, timeout=self._timeout,
-                                                    connect_cls=self._connection_cls)
+                conn = yield from self._create_new_connection()
             except Exception as e:
                 logger.error("create connection encountered error: {}".format(e))
+                # 一条连接都没有的时候继续尝试只会一直失败，直接引发异常
+                if not self.size:
+                    raise
+                break
             else:
                 self._pool.append(conn)
         if self.freesize:
@@ -148,12 +523,13 @@ class SSDBConnectionPool:
             # 一直填充到可用连接池中有连接，并且size应该小于最大size
             while not self._pool and self.size < self.maxsize:
                 try:
-                    conn = yield from create_connection(self._address, password=self._password,
-                                                        encoding=self._encoding, parser=self._parser_class,
-                                                        loop=self._loop, timeout=self._timeout,
-                                                        connect_cls=self._connection_cls)
+                    conn = yield from self._create_new_connection()
                 except Exception as e:
                     logger.error("create connection encountered error: {}".format(e))
+                    # 没有正在使用的连接可以等待释放，说明节点不可用，直接引发异常
+                    if not self._used:
+                        raise
+                    break
                 else:
                     self._pool.append(conn)
 
@@ -169,18 +545,66 @@ class SSDBConnectionPool:
         # 如果连接还未关闭，则置入可用连接池
         if not conn.closed:
             self._pool.append(conn)
+            if self._autoscaler is not None:
+                self._released_at[conn] = self._loop.time()
         else:
             # 如果已经关闭，则不管理
             logger.warn("Connection {} has been closed".format(conn))
 
-        # 在这里提供信号量通知
-        asyncio.ensure_future(self._wake_up(), loop=self._loop)
+        # 在这里提供信号量通知，没有协程在等待的时候不需要创建task
+        if self._cond_waiters:
+            asyncio.ensure_future(self._wake_up(), loop=self._loop)
 
     @asyncio.coroutine
-    def _wake_up(self):
+    def _wake_up(self, all=False):
         with (yield from self._cond):
             # 通知其他协程开始工作
-            self._cond.notify()
+            if all:
+                self._cond.notify_all()
+            else:
+                self._cond.notify()
+
+    def _resize(self, maxsize):
+        """调整maxsize，调用之前要保证连接数不超过新的maxsize"""
+        grow = maxsize > self._maxsize
+        self._maxsize = maxsize
+        if self._lanes is not None:
+            # 额度不能小于各通道保留的连接数之和
+            self._lanes.capacity = max(maxsize, sum(lane.reserved for lane in self._lanes.lanes))
+            self._lanes.dispatch()
+        if grow:
+            # 等待中的协程可以创建新连接了
+            asyncio.ensure_future(self._wake_up(all=True), loop=self._loop)
+
+    @asyncio.coroutine
+    def _autoscale(self):
+        scaler = self._autoscaler
+        while not self.closed:
+            yield from asyncio.sleep(scaler.interval, loop=self._loop)
+            if self.closed:
+                return
+            now = self._loop.time()
+            # 清理已经不在连接池中的连接，填充minsize时创建的连接从现在开始计算空闲时间
+            for conn in list(self._released_at):
+                if conn not in self._pool:
+                    del self._released_at[conn]
+            for conn in self._pool:
+                self._released_at.setdefault(conn, now)
+            idle = [conn for conn in self._pool if now - self._released_at.get(conn, now) >= scaler.idle_timeout]
+            action = scaler.decide(size=self.size, maxsize=self._maxsize, minsize=self._minsize,
+                                   waiting=self.waiting, idle=len(idle))
+            if action == AutoScaler.GROW:
+                self._resize(min(self._maxsize + scaler.step, scaler.max_limit))
+                logger.debug("Pool %r grows, wait %.6f", self, scaler.wait)
+            elif action == AutoScaler.SHRINK:
+                closed = 0
+                for conn in idle[:self.size - self._minsize]:
+                    self._pool.remove(conn)
+                    self._released_at.pop(conn, None)
+                    conn.close()
+                    closed += 1
+                self._resize(max(self._minsize, self.size, self._maxsize - closed))
+                logger.debug("Pool %r shrinks, %d idle connections closed", self, closed)
 
     def _drop_closed(self):
         """清除关闭的连接，pool里的和used的"""
@@ -202,6 +626,10 @@ class SSDBConnectionPool:
     def close(self):
         """关闭所有的连接，pool以及正在使用的连接"""
         self._closing = True
+        if self._autoscale_task is not None:
+            self._autoscale_task.cancel()
+        if self._server_stats is not None:
+            self._server_stats.stop()
         self._waiter = asyncio.ensure_future(self._do_close(), loop=self._loop)
 
     @asyncio.coroutine
@@ -217,6 +645,8 @@ class SSDBConnectionPool:
             for conn in self._used:
                 conn.close()
                 waiters.append(conn.wait_closed())
+            if self._server_stats is not None:
+                waiters.append(self._server_stats.wait_stopped())
             yield from asyncio.gather(*waiters, loop=self._loop)
             self._closed = True
 
@@ -233,6 +663,8 @@ class SSDBConnectionPool:
     def auth(self, password):
         """将pool里面的每个连接进行auth"""
         self._password = password
+        if self._server_stats is not None:
+            self._server_stats.password = password
         with (yield from self._cond):
             for i in range(self.freesize):
                 yield from self._pool[i].auth(password)
@@ -0,0 +1,125 @@
+"""回放aiossdb.capture录制的命令，按照录制时的时间间隔(可以加速)发送，报告吞吐量和延迟分位数
+
+命令行用法:
+    python -m aiossdb.replay capture.gz 127.0.0.1:8888 --speed 2 --concurrency 200
+    python -m aiossdb.replay capture.gz --stub --stub-latency 0.0005
+
+没有指定目标或者指定--stub的时候，在本地启动aiossdb.stubserver作为替身
+"""
+import asyncio
+import argparse
+
+from .bulk import _parse_address
+from .capture import read_capture
+from .errors import ReplyError
+from .log import logger
+from .pool import create_pool
+from .stubserver import StubServer
+
+
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+@asyncio.coroutine
+def replay(pool, records, *, speed=1.0, concurrency=100, loop=None):
+    """按照录制的时间发送records中的命令，返回统计报告
+
+    :param pool: SSDBConnectionPool，返回值不需要解码，建议使用encoding=None创建
+    :param speed: 回放速度的倍数，0表示不等待，尽快发送
+    :param concurrency: 最多同时在途的命令数，达到之后发送会延后，延后的命令数记为late
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    semaphore = asyncio.Semaphore(concurrency, loop=loop)
+    latencies = []
+    counts = {'commands': 0, 'errors': 0, 'failures': 0, 'late': 0}
+    tasks = set()
+
+    @asyncio.coroutine
+    def run(record):
+        start = loop.time()
+        try:
+            yield from pool.execute(record.command, *record.args, encoding=None, missing_ok=True)
+        except ReplyError:
+            counts['errors'] += 1
+        except Exception as e:
+            counts['failures'] += 1
+            logger.debug("Replay %s failed: %r", record.command, e)
+        finally:
+            latencies.append(loop.time() - start)
+            semaphore.release()
+
+    start = loop.time()
+    for record in records:
+        if speed:
+            delay = start + record.time / speed - loop.time()
+            if delay > 0:
+                yield from asyncio.sleep(delay, loop=loop)
+        yield from semaphore.acquire()
+        if speed and loop.time() - (start + record.time / speed) > 0.001:
+            counts['late'] += 1
+        counts['commands'] += 1
+        task = asyncio.ensure_future(run(record), loop=loop)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        yield from asyncio.wait(list(tasks), loop=loop)
+    elapsed = loop.time() - start
+
+    latencies.sort()
+    report = dict(counts, elapsed=elapsed, throughput=counts['commands'] / elapsed if elapsed else 0.0)
+    report['latency'] = {
+        'p{:g}'.format(p * 100): latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else None
+        for p in PERCENTILES
+    }
+    report['latency']['max'] = latencies[-1] if latencies else None
+    return report
+
+
+def _format_report(report):
+    lines = ["{commands} commands in {elapsed:.2f}s, {throughput:.0f} ops/s, "
+             "errors: {errors}, failures: {failures}, late: {late}".format(**report)]
+    for name, value in report['latency'].items():
+        lines.append("  {:6s} {}".format(name, '-' if value is None else '{:.3f}ms'.format(value * 1000)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m aiossdb.replay', description="Replay captured SSDB traffic")
+    parser.add_argument('capture', help="capture file recorded by aiossdb.capture.TrafficCapture")
+    parser.add_argument('target', nargs='?', help="host:port, a local stub server is used when omitted")
+    parser.add_argument('--password')
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed multiplier, 0 means no pacing")
+    parser.add_argument('--concurrency', type=int, default=100, help="max commands in flight")
+    parser.add_argument('--maxsize', type=int, default=10, help="max connections of the pool")
+    parser.add_argument('--stub', action='store_true', help="replay against a local stub server")
+    parser.add_argument('--stub-latency', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    loop = asyncio.get_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        server = None
+        if args.stub or args.target is None:
+            server = StubServer(latency=args.stub_latency, loop=loop)
+            address = yield from server.start()
+        else:
+            address = _parse_address(args.target)
+        pool = yield from create_pool(address, password=args.password, encoding=None, loop=loop,
+                                      maxsize=args.maxsize)
+        try:
+            return (yield from replay(pool, read_capture(args.capture), speed=args.speed,
+                                      concurrency=args.concurrency, loop=loop))
+        finally:
+            pool.close()
+            yield from pool.wait_closed()
+            if server is not None:
+                server.close()
+                yield from server.wait_closed()
+
+    print(_format_report(loop.run_until_complete(run())))
+
+
+if __name__ == '__main__':
+    main()
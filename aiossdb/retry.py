@@ -0,0 +1,106 @@
+import asyncio
+import random
+
+from .commands import IDEMPOTENT_COMMANDS
+from .errors import ConnectionClosedError, CircuitOpenError
+
+
+# 这些异常说明连接或者服务器出了问题，而不是命令本身有问题
+RETRYABLE_ERRORS = (ConnectionClosedError, OSError, asyncio.TimeoutError)
+
+
+class RetryPolicy:
+    """重试策略，只有幂等的命令才会在连接出错时重试，重试之间使用带抖动的指数退避
+
+    :param retries: 最多重试的次数
+    :param backoff: 第一次重试前等待的秒数，之后每次翻倍
+    :param max_backoff: 等待时间的上限
+    :param jitter: 抖动比例，实际等待时间在[delay * (1 - jitter), delay]之间随机，
+                   避免大量客户端在同一时刻一起重试
+    :param commands: 可以重试的命令集合，默认为幂等命令
+    """
+
+    def __init__(self, retries=3, backoff=0.05, max_backoff=2.0, jitter=0.5, commands=None):
+        assert isinstance(retries, int) and retries >= 0, ("retries must be int >= 0", retries)
+        assert 0 <= jitter <= 1, ("jitter must be in [0, 1]", jitter)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.commands = IDEMPOTENT_COMMANDS if commands is None else frozenset(commands)
+
+    def should_retry(self, command, attempt):
+        return attempt < self.retries and command.lower().strip() in self.commands
+
+    def get_delay(self, attempt):
+        delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+        return delay * (1 - self.jitter * random.random())
+
+    def __repr__(self):
+        return '<RetryPolicy [retries:{}, backoff:{}-{}]>'.format(self.retries, self.backoff, self.max_backoff)
+
+
+class CircuitBreaker:
+    """熔断器，连续失败达到阈值后断开，在recovery_timeout内所有请求直接失败，
+    超时后进入半开状态，只放行一个探测请求，成功则闭合，失败则重新断开"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=5.0, loop=None):
+        assert isinstance(failure_threshold, int) and failure_threshold > 0, (
+            "failure_threshold must be int > 0", failure_threshold)
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._loop = loop
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    def before_call(self):
+        """在请求之前调用，熔断的时候引发CircuitOpenError"""
+        if self._state == self.CLOSED:
+            return
+        if self._state == self.OPEN:
+            if self._loop.time() - self._opened_at < self.recovery_timeout:
+                self._rejected += 1
+                raise CircuitOpenError("Circuit breaker is open")
+            self._state = self.HALF_OPEN
+        if self._probing:
+            self._rejected += 1
+            raise CircuitOpenError("Circuit breaker is half open, probe in progress")
+        self._probing = True
+
+    def release_probe(self):
+        self._probing = False
+
+    def record_success(self):
+        self._failures = 0
+        self._probing = False
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._trips += 1
+            self._state = self.OPEN
+            self._opened_at = self._loop.time()
+
+    def stats(self):
+        return {'state': self._state, 'failures': self._failures,
+                'rejected': self._rejected, 'trips': self._trips}
+
+    def __repr__(self):
+        return '<CircuitBreaker [state:{}, failures:{}]>'.format(self._state, self._failures)
@@ -0,0 +1,272 @@
+import os
+import bisect
+import string
+import asyncio
+
+from .log import logger
+from .parser import utf8_encode
+
+
+# 命令 -> (是否需要hash名称, 返回的是否是key/value对)
+SCAN_COMMANDS = {
+    'scan': (False, True),
+    'keys': (False, False),
+    'hscan': (True, True),
+    'hkeys': (True, False),
+}
+
+_DONE = object()
+
+
+# 推测key中每个位置的字符集，从小到大选择第一个包含了所有出现过的字符的
+CHARSETS = [bytes(sorted(charset.encode())) for charset in (
+    string.digits, string.digits + 'abcdef', string.digits + 'ABCDEF', string.ascii_lowercase,
+    string.digits + string.ascii_lowercase, string.digits + string.ascii_letters)] + [bytes(range(256))]
+# 最多使用共同前缀之后的多少个位置来估计key的分布
+MAX_KEY_WIDTH = 16
+
+
+class _KeySpace:
+    """把共同前缀之后的各个位置当作一个多进制的整数，每一位的进制是这个位置的字符集的大小加一(0表示key已经结束)，
+    这样按照整数均匀选取的位置在数字、十六进制之类的key中也是均匀的"""
+
+    def __init__(self, keys):
+        keys = [utf8_encode(key) for key in keys]
+        self.prefix = os.path.commonprefix(keys)
+        width = min(max(len(key) for key in keys) - len(self.prefix), MAX_KEY_WIDTH)
+        self.charsets = []
+        for i in range(len(self.prefix), len(self.prefix) + width):
+            chars = set(key[i] for key in keys if len(key) > i)
+            self.charsets.append(next(charset for charset in CHARSETS if chars.issubset(charset)))
+
+    def to_number(self, key):
+        key = utf8_encode(key)
+        if not key.startswith(self.prefix):
+            return 0 if key < self.prefix else self.to_number(self.prefix + b'\xff' * len(self.charsets))
+        number = 0
+        for i, charset in enumerate(self.charsets, len(self.prefix)):
+            number *= len(charset) + 1
+            if i < len(key):
+                # 不在字符集中的字符按照它在字符集中的位置计算
+                number += bisect.bisect_right(charset, key[i])
+        return number
+
+    def to_key(self, number):
+        digits = []
+        for charset in reversed(self.charsets):
+            number, digit = divmod(number, len(charset) + 1)
+            digits.append(digit)
+        key = bytearray(self.prefix)
+        for digit, charset in zip(reversed(digits), self.charsets):
+            if not digit:
+                break
+            key.append(charset[digit - 1])
+        return bytes(key)
+
+
+@asyncio.coroutine
+def sample_split_points(executor, partitions, *, command='scan', name=None, start='', end='', sample_size=10000,
+                        probes=None, loop=None):
+    """在范围中均匀分布的几个位置上各读取少量的key，估计key的分布，选取partitions - 1个分割点
+
+    不会遍历整个范围: 先读取范围开头的一批key和最后一个key，按照它们推测key的字符集，
+    在两者之间均匀的选取probes个位置，每个位置使用keys/hkeys读取sample_size // probes个key，
+    同一轮的请求并发发送，总共只有三轮请求，最多读取sample_size个左右的key
+
+    分割点只是估计: 一个位置之后读到的key已经越过下一个位置的时候，这一段的key数量是准确的，
+    否则按照读到的key的密度推算这一段的key数量；
+    key分布很不均匀的时候(比如集中在某几个前缀下)，各个子范围的大小可能相差较多，
+    增加probes或者sample_size可以提高精度，key的分布已知的时候最好直接指定分割点
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    with_name = SCAN_COMMANDS[command][0]
+    prefix = [name] if with_name else []
+    if probes is None:
+        probes = max(16, partitions * 4)
+    probe_size = max(sample_size // probes, 2)
+
+    def keys_after(seek, limit):
+        return executor.execute('hkeys' if with_name else 'keys', *(prefix + [seek, end, limit]))
+
+    # rscan/hrscan从end往前读取，得到范围内的最后一个key
+    head, last = yield from asyncio.gather(
+        keys_after(start, probe_size), executor.execute('hrscan' if with_name else 'rscan', *(prefix + [end, start, 1])),
+        loop=loop)
+    if not head or not last or utf8_encode(head[0]) >= utf8_encode(last[0]):
+        return []
+    space = _KeySpace(head + last[:1])
+    low, high = space.to_number(head[0]), space.to_number(last[0])
+    probes = max(min(probes, high - low), 1)
+    bounds = [low + (high - low) * i // probes for i in range(probes + 1)]
+    seeks = [start] + [space.to_key(number) for number in bounds[1:-1]]
+    # 第一段就是开头的那批key，不需要重新读取
+    results = [head] + (yield from asyncio.gather(*[keys_after(seek, probe_size) for seek in seeks[1:]], loop=loop))
+
+    # 每一段(seeks[i], seeks[i + 1]]的(估计的key数量, 准确的时候是这一段所有的key否则是None)
+    segments = []
+    for i, keys in enumerate(results):
+        inside = keys if i + 1 == len(seeks) else [key for key in keys if utf8_encode(key) <= seeks[i + 1]]
+        if len(inside) < len(keys) or len(keys) < probe_size:
+            segments.append((len(inside), inside))
+        else:
+            span = max(space.to_number(keys[-1]) - bounds[i], 1)
+            segments.append((max(len(keys) * (bounds[i + 1] - bounds[i]) / span, len(keys)), None))
+
+    total = sum(count for count, keys in segments)
+    points = []
+    lookups = []
+    index = 0
+    passed = 0
+    for i in range(1, partitions):
+        target = total * i / partitions
+        while index + 1 < len(segments) and passed + segments[index][0] < target:
+            passed += segments[index][0]
+            index += 1
+        count, keys = segments[index]
+        if keys is not None:
+            if keys:
+                points.append(keys[min(max(round(target - passed) - 1, 0), len(keys) - 1)])
+        else:
+            # 在这一段中按照比例插值，分割点是插值位置之后的第一个key
+            number = bounds[index] + int((bounds[index + 1] - bounds[index]) * (target - passed) / count)
+            lookups.append(len(points))
+            points.append(space.to_key(number))
+    if lookups:
+        found = yield from asyncio.gather(*[keys_after(points[i], 1) for i in lookups], loop=loop)
+        for i, keys in zip(lookups, found):
+            points[i] = keys[0] if keys else None
+    result = []
+    for point in points:
+        if point is not None and (not result or utf8_encode(point) > utf8_encode(result[-1])):
+            result.append(point)
+    return result
+
+
+class ParallelScan:
+    """把(start, end]的范围按照分割点分成多个子范围，每个子范围使用单独的连接并发分页读取
+
+    可以使用async for迭代，每次得到一页数据，格式和对应的scan命令的返回值相同；
+    也可以使用yield from stream.get()，读取完毕之后返回None
+    ordered为True的时候按照key的顺序返回，否则哪个子范围先读到就先返回哪个
+
+    :param executor: Client或者SSDBConnectionPool
+    :param command: scan、keys、hscan或hkeys
+    :param name: hscan/hkeys的hash名称
+    :param splits: 分割点，没有指定的时候通过sample_split_points采样得到
+    :param buffer: 每个子范围最多缓存的页数，消费跟不上的时候读取会暂停
+    """
+
+    def __init__(self, executor, command='scan', name=None, start='', end='', *, partitions=4, splits=None,
+                 page_size=1000, ordered=False, sample_size=10000, buffer=4, loop=None):
+        if command not in SCAN_COMMANDS:
+            raise ValueError("Unsupported scan command: {}".format(command))
+        if SCAN_COMMANDS[command][0] and name is None:
+            raise ValueError("Command {} requires a name".format(command))
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._executor = executor
+        self._command = command
+        self._name = name
+        self._start = start
+        self._end = end
+        self._partitions = partitions
+        self._splits = splits
+        self._page_size = page_size
+        self._ordered = ordered
+        self._sample_size = sample_size
+        self._buffer = buffer
+        self._loop = loop
+        self._queues = None
+        self._tasks = []
+        self._current = 0
+        self._finished = 0
+
+    @property
+    def ranges(self):
+        """各个子范围的(start, end)，开始之后才有值"""
+        if self._splits is None:
+            return None
+        bounds = [self._start] + list(self._splits) + [self._end]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    @asyncio.coroutine
+    def _begin(self):
+        if self._splits is None:
+            self._splits = yield from sample_split_points(
+                self._executor, self._partitions, command=self._command, name=self._name,
+                start=self._start, end=self._end, sample_size=self._sample_size, loop=self._loop)
+        ranges = self.ranges
+        if self._ordered:
+            self._queues = [asyncio.Queue(maxsize=self._buffer, loop=self._loop) for r in ranges]
+        else:
+            queue = asyncio.Queue(maxsize=self._buffer * len(ranges), loop=self._loop)
+            self._queues = [queue] * len(ranges)
+        self._tasks = [asyncio.ensure_future(self._scan_range(start, end, queue), loop=self._loop)
+                       for (start, end), queue in zip(ranges, self._queues)]
+
+    @asyncio.coroutine
+    def _scan_range(self, start, end, queue):
+        with_name, pairs = SCAN_COMMANDS[self._command]
+        prefix = [self._name] if with_name else []
+        step = 2 if pairs else 1
+        try:
+            while 1:
+                res = yield from self._executor.execute(self._command, *(prefix + [start, end, self._page_size]))
+                if not res:
+                    break
+                yield from queue.put(res)
+                if len(res) < self._page_size * step:
+                    break
+                start = res[-step]
+        except Exception as e:
+            logger.error("Parallel scan of range (%r, %r] encountered error: %r", start, end, e)
+            yield from queue.put(e)
+        else:
+            yield from queue.put(_DONE)
+
+    @asyncio.coroutine
+    def get(self):
+        """返回下一页数据，全部读取完毕返回None"""
+        if self._queues is None:
+            yield from self._begin()
+        while self._finished < len(self._queues):
+            queue = self._queues[self._current] if self._ordered else self._queues[0]
+            page = yield from queue.get()
+            if page is _DONE:
+                self._finished += 1
+                self._current += 1
+                continue
+            if isinstance(page, Exception):
+                self.close()
+                raise page
+            return page
+        return None
+
+    @asyncio.coroutine
+    def collect(self):
+        """读取所有的数据，合并成一个列表"""
+        result = []
+        while 1:
+            page = yield from self.get()
+            if page is None:
+                return result
+            result.extend(page)
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        page = yield from self.get()
+        if page is None:
+            raise StopAsyncIteration
+        return page
+
+    def __repr__(self):
+        return '<ParallelScan [command:{}, partitions:{}, ordered:{}]>'.format(
+            self._command, self._partitions if self._splits is None else len(self._splits) + 1, self._ordered)
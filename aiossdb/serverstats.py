@@ -0,0 +1,248 @@
+import asyncio
+
+from .connection import create_connection
+from .log import logger
+
+
+# 复制状态中表示从节点数据不完整的状态
+UNHEALTHY_REPLICATION = frozenset(['DISCONNECTED', 'OUT_OF_SYNC', 'INIT'])
+
+
+def _number(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _parse_lines(text):
+    """解析binlogs、replication这类每行一个'key : value'的文本，
+    replication的第一行是'slaveof host:port'或者'client host:port'，解析到role和peer中"""
+    result = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        key, sep, value = line.partition(':')
+        key = key.strip()
+        if sep and ' ' not in key:
+            result[key] = _number(value.strip())
+        else:
+            role, _, peer = line.partition(' ')
+            result['role'], result['peer'] = role, peer.strip()
+    return result
+
+
+def _parse_compaction(text):
+    """解析leveldb.stats中的Compactions表格，返回每一层以及所有层合计的文件数、大小和耗时"""
+    levels = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) == 6 and fields[0].isdigit():
+            level, files, size, seconds, read, write = fields
+            levels.append({'level': int(level), 'files': int(files), 'size_mb': _number(size),
+                           'time_sec': _number(seconds), 'read_mb': _number(read), 'write_mb': _number(write)})
+    total = {name: sum(level[name] for level in levels)
+             for name in ('files', 'size_mb', 'time_sec', 'read_mb', 'write_mb')}
+    total['levels'] = levels
+    return total
+
+
+def _parse_calls(text):
+    """解析'calls: 10\ttime_wait: 0\ttime_proc: 1'"""
+    result = {}
+    for item in text.split('\t'):
+        key, sep, value = item.partition(':')
+        if sep:
+            result[key.strip()] = _number(value.strip())
+    return result
+
+
+def parse_info(reply):
+    """把info命令的返回(以'ssdb-server'开头的key/value列表)解析成字典
+
+    binlogs解析成字典，replication可能有多个，解析成列表，leveldb.stats中的Compactions表格
+    解析到compaction中，cmd.*开头的命令统计(info cmd)解析到calls中，其它字段原样保留
+    """
+    items = reply[1:] if reply and reply[0] == 'ssdb-server' else reply
+    info = {'replication': [], 'calls': {}}
+    for i in range(0, len(items) - 1, 2):
+        key, value = items[i], items[i + 1]
+        if key == 'binlogs':
+            info['binlogs'] = _parse_lines(value)
+        elif key == 'replication':
+            info['replication'].append(_parse_lines(value))
+        elif key == 'leveldb.stats':
+            info['compaction'] = _parse_compaction(value)
+        elif key.startswith('cmd.'):
+            info['calls'][key[4:]] = _parse_calls(value)
+        elif key in ('links', 'total_calls', 'dbsize'):
+            info[key] = _number(value)
+        else:
+            info[key] = value
+    return info
+
+
+class ServerStatsPoller:
+    """在一条单独的、不属于连接池的连接上定时执行info和dbsize，解析成结构化的服务端统计数据
+
+    通过create_pool的server_stats参数使用，连接池启动和关闭轮询，pool.stats()中的server
+    就是这里的stats()，healthy可以用于路由和健康检查，比如对冲请求不发往不健康的副本
+
+    :param interval: 轮询间隔的秒数
+    :param timeout: 连接和每次轮询的超时时间
+    :param info_args: info命令的参数，比如('cmd',)可以同时读取每个命令的调用次数
+    :param max_failures: 连续失败达到这个次数的时候认为节点不健康
+    """
+
+    def __init__(self, interval=5.0, *, timeout=1.0, info_args=(), max_failures=1):
+        assert interval > 0, ("interval must be > 0", interval)
+        self.interval = interval
+        self.timeout = timeout
+        self.info_args = tuple(info_args)
+        self.max_failures = max_failures
+        self.address = None
+        self.password = None
+        self.info = None
+        self.dbsize = None
+        self._loop = None
+        self._conn = None
+        # fork之后放弃的连接和任务，持有它们避免被回收时访问父进程的事件循环
+        self._orphans = []
+        self._task = None
+        self._last_poll = None
+        self._last_calls = None
+        # 统计数据
+        self._polls = 0
+        self._failures = 0
+        self._consecutive_failures = 0
+        self._last_error = None
+        self._poll_latency = None
+        self._qps = None
+
+    def start(self, address, *, password=None, loop=None):
+        """开始轮询，由连接池在创建的时候调用"""
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.address = address
+        self.password = password
+        self._loop = loop
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run(), loop=loop)
+
+    def after_fork(self, loop):
+        """子进程中放弃继承的连接和任务，在新的事件循环中重新开始轮询"""
+        if self._conn is not None:
+            self._conn.orphan()
+        self._orphans.append((self._conn, self._task))
+        self._conn = None
+        self._task = None
+        self.start(self.address, password=self.password, loop=loop)
+
+    def restart(self, loop):
+        """同一个进程中换到新的事件循环，关闭原来的连接和任务，在新的事件循环中重新开始轮询
+
+        旧的事件循环已经关闭的时候无法再正常关闭，和fork之后一样放弃它们"""
+        if self._loop is not None and self._loop.is_closed():
+            self.after_fork(loop)
+            return
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._close_conn()
+        self.start(self.address, password=self.password, loop=loop)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    @asyncio.coroutine
+    def wait_stopped(self):
+        if self._task is not None:
+            try:
+                yield from self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def healthy(self):
+        """节点可以访问并且复制状态正常，还没有轮询过的时候认为是健康的"""
+        if self._consecutive_failures >= self.max_failures:
+            return False
+        if self.info is None:
+            return True
+        return not any(item.get('status') in UNHEALTHY_REPLICATION for item in self.info['replication'])
+
+    @asyncio.coroutine
+    def _run(self):
+        loop = self._loop
+        try:
+            while 1:
+                yield from self.poll()
+                yield from asyncio.sleep(self.interval, loop=loop)
+        finally:
+            # restart之后连接属于新的事件循环中的任务
+            if self._loop is loop:
+                self._close_conn()
+
+    def _close_conn(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @asyncio.coroutine
+    def _poll(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = yield from create_connection(self.address, password=self.password, loop=self._loop,
+                                                      timeout=self.timeout)
+        info = yield from self._conn.execute('info', *self.info_args)
+        dbsize = yield from self._conn.execute('dbsize')
+        return info, dbsize
+
+    @asyncio.coroutine
+    def poll(self):
+        """执行一次轮询，失败的时候关闭连接，下次轮询重新连接"""
+        start = self._loop.time()
+        self._polls += 1
+        try:
+            info, dbsize = yield from asyncio.wait_for(self._poll(), self.timeout, loop=self._loop)
+            info = parse_info(info)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failures += 1
+            self._consecutive_failures += 1
+            self._last_error = repr(e)
+            logger.warning("Poll server stats of %r encountered error: %r", self.address, e)
+            self._close_conn()
+            return
+        now = self._loop.time()
+        total_calls = info.get('total_calls')
+        if isinstance(total_calls, int) and self._last_calls is not None and now > self._last_poll:
+            self._qps = max(total_calls - self._last_calls, 0) / (now - self._last_poll)
+        self._last_calls = total_calls if isinstance(total_calls, int) else None
+        self._last_poll = now
+        self._poll_latency = now - start
+        self._consecutive_failures = 0
+        self.info = info
+        self.dbsize = _number(dbsize[0]) if dbsize else None
+
+    def stats(self):
+        return {
+            'healthy': self.healthy,
+            'polls': self._polls,
+            'failures': self._failures,
+            'consecutive_failures': self._consecutive_failures,
+            'last_error': self._last_error,
+            'poll_latency': self._poll_latency,
+            'qps': self._qps,
+            'dbsize': self.dbsize,
+            'info': self.info,
+        }
+
+    def __repr__(self):
+        return '<ServerStatsPoller [address:{}, interval:{}, healthy:{}]>'.format(
+            self.address, self.interval, self.healthy)
@@ -0,0 +1,88 @@
+import time
+import random
+import collections
+
+from .log import logger
+
+
+SlowLogEntry = collections.namedtuple('SlowLogEntry', [
+    'id', 'timestamp', 'address', 'command', 'args', 'reply_size', 'blocks',
+    'queue_time', 'write_time', 'server_time', 'parse_time', 'duration'])
+
+
+class SlowLog:
+    """慢命令日志，记录耗时超过阈值的单条命令
+
+    每条记录包含命令、截断后的参数、返回数据大小、数据块数量，以及分段耗时:
+        queue_time  在连接池中等待连接的时间
+        write_time  编码并写入套接字的时间
+        server_time 写入完成到收到第一批返回数据的时间
+        parse_time  从收到返回数据到解析完成的时间
+    只有被采样的命令才会计时，sample_rate用来控制计时本身的开销
+    """
+
+    def __init__(self, threshold=0.01, sample_rate=1.0, maxlen=128, max_args=8, max_arg_len=64, callback=None):
+        assert threshold >= 0, ("threshold must be >= 0", threshold)
+        assert 0 <= sample_rate <= 1, ("sample_rate must be in [0, 1]", sample_rate)
+        assert isinstance(maxlen, int) and maxlen > 0, ("maxlen must be int > 0", maxlen)
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_args = max_args
+        self.max_arg_len = max_arg_len
+        # 每条记录生成后调用，可以用来接入外部的采样分析器
+        self.callback = callback
+        # 环形缓冲区，超过maxlen后最早的记录会被丢弃
+        self._entries = collections.deque(maxlen=maxlen)
+        self._next_id = 0
+
+    def sample(self):
+        """判断这一条命令是否需要计时"""
+        if self.sample_rate >= 1:
+            return True
+        return random.random() < self.sample_rate
+
+    def _truncate_args(self, args):
+        truncated = []
+        for arg in args[:self.max_args]:
+            if not isinstance(arg, (str, bytes, bytearray)):
+                arg = str(arg)
+            if len(arg) > self.max_arg_len:
+                arg = arg[:self.max_arg_len] + ('...' if isinstance(arg, str) else b'...')
+            truncated.append(arg)
+        if len(args) > self.max_args:
+            truncated.append('... ({} more arguments)'.format(len(args) - self.max_args))
+        return tuple(truncated)
+
+    def record(self, address, command, args, *, reply_size=0, blocks=0,
+               queue_time=0.0, write_time=0.0, server_time=0.0, parse_time=0.0):
+        """如果总耗时超过阈值则记录，返回记录或者None"""
+        duration = queue_time + write_time + server_time + parse_time
+        if duration < self.threshold:
+            return None
+        entry = SlowLogEntry(self._next_id, time.time(), address, command, self._truncate_args(args),
+                             reply_size, blocks, queue_time, write_time, server_time, parse_time, duration)
+        self._next_id += 1
+        self._entries.append(entry)
+        if self.callback is not None:
+            try:
+                self.callback(entry)
+            except Exception as e:
+                logger.error("Slow log callback encountered error: %r", e, exc_info=True)
+        return entry
+
+    def get(self, count=None):
+        """返回最近的记录，最新的在最前面"""
+        entries = list(reversed(self._entries))
+        if count is not None:
+            entries = entries[:count]
+        return entries
+
+    def reset(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '<SlowLog [threshold:{}, sample_rate:{}, entries:{}]>'.format(
+            self.threshold, self.sample_rate, len(self._entries))
@@ -0,0 +1,239 @@
+"""本地的SSDB替身服务器，数据只保存在内存中，用于回放压测和没有SSDB的测试环境
+
+只实现了常用的kv、hash、队列命令，其它只读命令返回空结果，其它写命令返回1，
+latency参数模拟服务端的处理时间，每次读到的一批命令在返回之前等待latency秒
+
+命令行用法:
+    python -m aiossdb.stubserver --port 8888 --latency 0.001
+"""
+import asyncio
+import argparse
+import collections
+
+from .commands import READONLY_COMMANDS
+from .log import logger
+
+
+def _int(value):
+    return int(value) if value else 0
+
+
+class StubServer:
+    """内存中的SSDB协议服务器"""
+
+    def __init__(self, *, latency=0.0, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.latency = latency
+        self._loop = loop
+        self._server = None
+        self.kv = {}
+        self.hashes = collections.defaultdict(dict)
+        self.queues = collections.defaultdict(collections.deque)
+        # 统计数据
+        self.connections = 0
+        self.commands = 0
+
+    @asyncio.coroutine
+    def start(self, host='127.0.0.1', port=0):
+        self._server = yield from asyncio.start_server(self._handle, host, port, loop=self._loop)
+        return self._server.sockets[0].getsockname()[:2]
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    @asyncio.coroutine
+    def wait_closed(self):
+        if self._server is not None:
+            yield from self._server.wait_closed()
+
+    @asyncio.coroutine
+    def _handle(self, reader, writer):
+        self.connections += 1
+        buf = bytearray()
+        try:
+            while 1:
+                data = yield from reader.read(65536)
+                if not data:
+                    break
+                buf += data
+                out = bytearray()
+                pos = 0
+                while 1:
+                    blocks, pos = self._parse(buf, pos)
+                    if blocks is None:
+                        break
+                    self.commands += 1
+                    out += self._encode(self.handle(blocks[0].decode('utf8', 'replace'), blocks[1:]))
+                del buf[:pos]
+                if out:
+                    if self.latency:
+                        yield from asyncio.sleep(self.latency, loop=self._loop)
+                    writer.write(bytes(out))
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error("Stub server encountered error: %r", e, exc_info=True)
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse(buf, pos):
+        """返回一条完整的请求中的数据块以及请求结束的位置，请求不完整的时候返回(None, pos)"""
+        blocks = []
+        start = pos
+        while 1:
+            offset = buf.find(b'\n', pos)
+            if offset < 0:
+                return None, start
+            if offset == pos:
+                return blocks, pos + 1
+            size = int(buf[pos:offset])
+            if offset + size + 2 > len(buf):
+                return None, start
+            blocks.append(bytes(buf[offset + 1:offset + 1 + size]))
+            pos = offset + size + 2
+
+    @staticmethod
+    def _encode(blocks):
+        out = bytearray()
+        for block in blocks:
+            if isinstance(block, str):
+                block = block.encode('utf8')
+            elif isinstance(block, int):
+                block = str(block).encode('utf8')
+            out += b'%d\n' % len(block)
+            out += block
+            out += b'\n'
+        out += b'\n'
+        return out
+
+    def handle(self, command, args):
+        """执行一条命令，返回包括状态在内的数据块列表"""
+        kv, hashes, queues = self.kv, self.hashes, self.queues
+        if command in ('auth', 'ping'):
+            return ['ok', 1]
+        if command in ('set', 'setx'):
+            kv[args[0]] = args[1]
+            return ['ok', 1]
+        if command == 'setnx':
+            if args[0] in kv:
+                return ['ok', 0]
+            kv[args[0]] = args[1]
+            return ['ok', 1]
+        if command in ('get', 'getset'):
+            old = kv.get(args[0])
+            if command == 'getset':
+                kv[args[0]] = args[1]
+            return ['ok', old] if old is not None else ['not_found']
+        if command in ('del', 'delete'):
+            kv.pop(args[0], None)
+            return ['ok', 1]
+        if command == 'exists':
+            return ['ok', int(args[0] in kv)]
+        if command in ('incr', 'decr'):
+            try:
+                value = _int(kv.get(args[0])) + (_int(args[1]) if len(args) > 1 else 1) * (
+                    1 if command == 'incr' else -1)
+            except ValueError:
+                return ['error']
+            kv[args[0]] = str(value).encode()
+            return ['ok', value]
+        if command == 'multi_set':
+            for i in range(0, len(args) - 1, 2):
+                kv[args[i]] = args[i + 1]
+            return ['ok', len(args) // 2]
+        if command == 'multi_get':
+            return ['ok'] + [block for key in args if key in kv for block in (key, kv[key])]
+        if command == 'multi_del':
+            for key in args:
+                kv.pop(key, None)
+            return ['ok', len(args)]
+        if command == 'hset':
+            hashes[args[0]][args[1]] = args[2]
+            return ['ok', 1]
+        if command == 'hget':
+            value = hashes[args[0]].get(args[1]) if args[0] in hashes else None
+            return ['ok', value] if value is not None else ['not_found']
+        if command == 'hdel':
+            if args[0] in hashes:
+                hashes[args[0]].pop(args[1], None)
+            return ['ok', 1]
+        if command in ('hincr', 'hdecr'):
+            fields = hashes[args[0]]
+            try:
+                value = _int(fields.get(args[1])) + (_int(args[2]) if len(args) > 2 else 1) * (
+                    1 if command == 'hincr' else -1)
+            except ValueError:
+                return ['error']
+            fields[args[1]] = str(value).encode()
+            return ['ok', value]
+        if command == 'hsize':
+            return ['ok', len(hashes.get(args[0], ()))]
+        if command == 'hclear':
+            return ['ok', len(hashes.pop(args[0], ()))]
+        if command == 'hgetall':
+            return ['ok'] + [block for item in hashes.get(args[0], {}).items() for block in item]
+        if command == 'multi_hset':
+            fields = hashes[args[0]]
+            for i in range(1, len(args) - 1, 2):
+                fields[args[i]] = args[i + 1]
+            return ['ok', len(args) // 2]
+        if command == 'multi_hget':
+            fields = hashes.get(args[0], {})
+            return ['ok'] + [block for key in args[1:] if key in fields for block in (key, fields[key])]
+        if command in ('qpush', 'qpush_back', 'qpush_front'):
+            queue = queues[args[0]]
+            for item in args[1:]:
+                if command == 'qpush_front':
+                    queue.appendleft(item)
+                else:
+                    queue.append(item)
+            return ['ok', len(queue)]
+        if command in ('qpop', 'qpop_front', 'qpop_back'):
+            queue = queues.get(args[0])
+            if not queue:
+                return ['ok']
+            count = min(_int(args[1]) if len(args) > 1 else 1, len(queue))
+            pop = queue.pop if command == 'qpop_back' else queue.popleft
+            return ['ok'] + [pop() for i in range(count)]
+        if command == 'qsize':
+            return ['ok', len(queues.get(args[0], ()))]
+        if command == 'qclear':
+            return ['ok', len(queues.pop(args[0], ()))]
+        if command == 'dbsize':
+            return ['ok', len(kv) + len(hashes) + len(queues)]
+        if command == 'info':
+            return ['ok', 'ssdb-server', 'version', 'stub', 'links', self.connections,
+                    'total_calls', self.commands]
+        if command in READONLY_COMMANDS:
+            return ['ok']
+        return ['ok', 1]
+
+    def __repr__(self):
+        return '<StubServer [connections:{}, commands:{}]>'.format(self.connections, self.commands)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m aiossdb.stubserver', description="In-memory SSDB stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every reply")
+    args = parser.parse_args(argv)
+
+    loop = asyncio.get_event_loop()
+    server = StubServer(latency=args.latency, loop=loop)
+    address = loop.run_until_complete(server.start(args.host, args.port))
+    print("Stub SSDB server listening on {}:{}".format(*address))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+
+
+if __name__ == '__main__':
+    main()
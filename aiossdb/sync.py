@@ -0,0 +1,246 @@
+import asyncio
+import functools
+import threading
+import collections
+import concurrent.futures
+
+from .codecs import get_codec, encode_args, decode_reply
+from .commands import VALUE_REPLIES
+from .errors import PoolClosedError, ConnectionClosedError
+from .log import logger
+from .pool import create_pool
+
+
+# 这些create_pool参数只在pool.execute中生效，直接在连接上pipeline会绕过它们
+POOL_EXECUTE_OPTIONS = ('retry_policy', 'circuit_breaker', 'lanes', 'max_pending', 'max_pending_bytes',
+                        'write_buffer_limits', 'autoscaler', 'hedge_policy')
+
+
+class SyncClient:
+    """线程安全的同步客户端，所有线程共享一个后台线程中的事件循环和连接池
+
+    各个线程提交的命令放入同一个队列，由事件循环线程按批取出，
+    每批命令在一条连接上连续发送(pipeline)再依次等待返回，
+    这样少量连接就可以服务大量线程，不需要每个线程一个事件循环和连接池
+
+    pool_kwargs中有POOL_EXECUTE_OPTIONS中的参数(重试、熔断、优先级通道、流控、自动伸缩、对冲)时，
+    这些功能需要按命令执行，每批命令改为并发的通过pool.execute执行，不再在一条连接上pipeline，
+    这时可以通过priority参数指定优先级通道
+
+        client = SyncClient(port=8888)
+        client.set('a', 1)
+        client.get('a')
+        client.close()
+
+    :param batch_size: 一条连接上一次最多发送的命令数
+    :param call_timeout: execute等待结果的超时时间，None表示一直等待
+    :param pool_kwargs: 其它传给create_pool的参数
+    """
+
+    def __init__(self, host='127.0.0.1', port=8888, password=None, timeout=None, max_connection=10, *,
+                 batch_size=64, call_timeout=None, codec=None, encoding='utf-8', **pool_kwargs):
+        self.batch_size = batch_size
+        self.call_timeout = call_timeout
+        self.codec = get_codec(codec)
+        self.encoding = encoding
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='aiossdb-sync-loop', daemon=True)
+        self._thread.start()
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._closed = False
+        # 正在执行的批次，关闭的时候等待它们结束
+        self._tasks = set()
+        self._via_pool = any(pool_kwargs.get(name) is not None for name in POOL_EXECUTE_OPTIONS)
+        # 统计数据
+        self._batches = 0
+        self._commands = 0
+        self._max_batch = 0
+        try:
+            self._pool = self._call(create_pool((host, port), password=password, encoding=encoding,
+                                                timeout=timeout, maxsize=max_connection, loop=self._loop,
+                                                **pool_kwargs))
+        except Exception:
+            self._stop_loop()
+            raise
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _call(self, coro, timeout=None):
+        """在事件循环线程中运行协程，等待并返回结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def submit(self, command, *args, codec=None, **kwargs):
+        """提交命令，返回concurrent.futures.Future"""
+        if self._closed:
+            raise PoolClosedError("SyncClient is closed")
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("SyncClient can not be used in its own event loop thread")
+        codec = get_codec(codec) if codec is not None else self.codec
+        if codec is not None:
+            # 序列化在调用者的线程中完成
+            command = command.lower().strip()
+            args = encode_args(codec, command, args)
+            if command in VALUE_REPLIES:
+                encoding = kwargs.pop('encoding', self.encoding)
+                kwargs['encoding'] = None
+                kwargs['decoder'] = functools.partial(decode_reply, codec, command, encoding=encoding)
+        future = concurrent.futures.Future()
+        with self._lock:
+            # 在锁中检查，保证close之后不会再有命令放入队列
+            if self._closed:
+                raise PoolClosedError("SyncClient is closed")
+            self._pending.append((command, args, kwargs, future))
+            if not self._scheduled:
+                self._scheduled = True
+                self._loop.call_soon_threadsafe(self._flush)
+        return future
+
+    def execute(self, command, *args, **kwargs):
+        return self.submit(command, *args, **kwargs).result(self.call_timeout)
+
+    def _flush(self):
+        with self._lock:
+            self._scheduled = False
+        while self._pending:
+            batch = [self._pending.popleft() for i in range(min(len(self._pending), self.batch_size))]
+            self._batches += 1
+            self._commands += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            # 调用者已经取消的命令不再发送
+            batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self._closed:
+                # close已经在关闭连接池，不再开始新的批次
+                for command, args, kwargs, future in batch:
+                    future.set_exception(PoolClosedError("SyncClient is closed"))
+                continue
+            execute = self._execute_pooled if self._via_pool else self._execute_batch
+            task = asyncio.ensure_future(self._run_batch(execute, batch), loop=self._loop)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _closed_error(self):
+        if self._closed:
+            return PoolClosedError("SyncClient is closed")
+        return ConnectionClosedError("Connection closed or corrupted")
+
+    @asyncio.coroutine
+    def _run_batch(self, execute, batch):
+        try:
+            yield from execute(batch)
+        finally:
+            # 连接关闭的时候等待返回的期物被取消(3.8之后CancelledError不是Exception)，
+            # 或者SyncClient关闭的时候批次被取消，没有结果的命令不能让调用者一直等待
+            for command, args, kwargs, future in batch:
+                if not future.done():
+                    future.set_exception(self._closed_error())
+
+    @asyncio.coroutine
+    def _execute_pooled(self, batch):
+        """每条命令通过pool.execute执行，使用连接池的重试、熔断、通道、流控和对冲"""
+        yield from asyncio.gather(*[self._execute_one(*item) for item in batch], loop=self._loop)
+
+    @asyncio.coroutine
+    def _execute_one(self, command, args, kwargs, future):
+        try:
+            res = yield from self._pool.execute(command, *args, **kwargs)
+        except asyncio.CancelledError:
+            future.set_exception(self._closed_error())
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(res)
+
+    @asyncio.coroutine
+    def _execute_batch(self, batch):
+        try:
+            conn, address = yield from self._pool.get_connection()
+        except Exception as e:
+            for command, args, kwargs, future in batch:
+                future.set_exception(e)
+            return
+        try:
+            waiters = []
+            for command, args, kwargs, future in batch:
+                try:
+                    waiters.append(conn.execute(command, *args, **kwargs))
+                except Exception as e:
+                    waiters.append(e)
+            for (command, args, kwargs, future), waiter in zip(batch, waiters):
+                if isinstance(waiter, Exception):
+                    future.set_exception(waiter)
+                    continue
+                try:
+                    res = yield from waiter
+                except asyncio.CancelledError:
+                    # 连接关闭的时候，还没有返回的命令的期物被取消
+                    future.set_exception(self._closed_error())
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(res)
+        finally:
+            yield from self._pool.release(conn)
+
+    def stats(self):
+        stats = self._call(self._pool_stats())
+        stats['sync'] = {'batches': self._batches, 'commands': self._commands, 'max_batch': self._max_batch}
+        return stats
+
+    @asyncio.coroutine
+    def _pool_stats(self):
+        return self._pool.stats()
+
+    @asyncio.coroutine
+    def _close_pool(self):
+        self._pool.close()
+        yield from self._pool.wait_closed()
+        # 连接已经全部关闭，还在执行的批次(比如在等待获取连接)取消掉，没有结果的命令在_run_batch中失败
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            yield from asyncio.wait(tasks, loop=self._loop)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._call(self._close_pool())
+        except Exception as e:
+            logger.error("Close SyncClient encountered error: %r", e)
+        # 还在队列中没有取出的命令
+        while self._pending:
+            command, args, kwargs, future = self._pending.popleft()
+            if future.set_running_or_notify_cancel():
+                future.set_exception(PoolClosedError("SyncClient is closed"))
+        self._stop_loop()
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        if item not in self.__dict__:
+            self.__dict__[item] = functools.partial(self.execute, item)
+        return self.__dict__[item]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return '<SyncClient [pool:{!r}, batches:{}, commands:{}]>'.format(
+            getattr(self, '_pool', None), self._batches, self._commands)
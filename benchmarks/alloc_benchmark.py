@@ -0,0 +1,93 @@
+"""get命令的内存分配基准测试
+
+使用aiossdb.stubserver作为服务端，不需要真实的SSDB，运行:
+
+    python benchmarks/alloc_benchmark.py --inflight 1000 --ops 100000
+
+输出三部分:
+    inflight  同时在途的N条get，每条命令在连接上占用的对象数和字节数(waiter、期物、编码后的命令等)
+    peak      N条get发送并全部读取返回的过程中，内存占用峰值平均到每条命令的字节数
+    gc        连续执行ops次pool.execute('get')，每秒的命令数以及每10万次命令触发的0代GC次数
+"""
+import gc
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+sys.path.insert(0, '.')
+
+import aiossdb  # noqa: E402
+
+
+def _diff(after, before):
+    stats = after.compare_to(before, 'filename')
+    return sum(s.count_diff for s in stats), sum(s.size_diff for s in stats)
+
+
+@asyncio.coroutine
+def run(loop, inflight, ops, value_size):
+    server = aiossdb.StubServer(loop=loop)
+    host, port = yield from server.start()
+
+    conn = yield from aiossdb.create_connection(('127.0.0.1', port), loop=loop)
+    pool = yield from aiossdb.create_pool(('127.0.0.1', port), loop=loop, minsize=1, maxsize=1)
+    yield from conn.execute('set', 'key', 'x' * value_size)
+    for i in range(1000):
+        yield from conn.execute('get', 'key')
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    futures = [conn.execute('get', 'key') for i in range(inflight)]
+    sent = tracemalloc.take_snapshot()
+    yield from asyncio.gather(*futures, loop=loop)
+    objects, size = _diff(sent, before)
+    print('inflight  {:8.2f} objects {:10.1f} bytes per get'.format(objects / inflight, size / inflight))
+    del futures, before, sent
+
+    gc.collect()
+    tracemalloc.clear_traces()
+    current = tracemalloc.get_traced_memory()[0]
+    futures = [conn.execute('get', 'key') for i in range(inflight)]
+    yield from asyncio.gather(*futures, loop=loop)
+    peak = tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    print('peak      {:8s}         {:10.1f} bytes per get'.format('', peak / inflight))
+    del futures
+
+    gc.collect()
+    collections = gc.get_stats()[0]['collections']
+    start = time.perf_counter()
+    for i in range(ops):
+        yield from pool.execute('get', 'key')
+    elapsed = time.perf_counter() - start
+    collections = gc.get_stats()[0]['collections'] - collections
+    print('gc        {:8.0f} ops/s {:10.1f} gen0 collections per 100k ops'.format(
+        ops / elapsed, collections * 100000 / ops))
+
+    conn.close()
+    yield from conn.wait_closed()
+    pool.close()
+    yield from pool.wait_closed()
+    server.close()
+    yield from server.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Allocation benchmark of get round trips")
+    parser.add_argument('--inflight', type=int, default=1000)
+    parser.add_argument('--ops', type=int, default=100000)
+    parser.add_argument('--value-size', type=int, default=16)
+    args = parser.parse_args(argv)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(run(loop, args.inflight, args.ops, args.value_size))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
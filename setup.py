@@ -24,5 +24,15 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
     include_package_data=True,
-    extras_require={},
+    extras_require={
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+        'msgpack': ['msgpack'],
+        'orjson': ['orjson'],
+    },
+    entry_points={
+        'console_scripts': [
+            'aiossdb-bulk=aiossdb.bulk:main',
+        ],
+    },
 )
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from aiossdb import AutoScaler
+
+
+def test_grow_when_waiting():
+    scaler = AutoScaler(4, target_wait=0.001)
+    scaler.observe(0.01, 0.001)
+    assert scaler.decide(size=2, maxsize=2, minsize=1, waiting=0, idle=0) == AutoScaler.GROW
+    assert scaler.decide(size=4, maxsize=4, minsize=1, waiting=3, idle=0) == AutoScaler.AT_LIMIT
+
+
+def test_hold_when_saturated():
+    scaler = AutoScaler(10, target_wait=0.001, latency_factor=2.0, alpha=1)
+    scaler.observe(0, 0.001)
+    assert scaler.decide(size=2, maxsize=2, minsize=1, waiting=0, idle=0) == AutoScaler.HOLD
+    assert scaler.baseline_latency == 0.001
+    # 延迟是基线的10倍，增加连接只会让SSDB更慢
+    scaler.observe(0.05, 0.01)
+    assert scaler.decide(size=2, maxsize=2, minsize=1, waiting=5, idle=0) == AutoScaler.SATURATED
+    assert scaler.stats()['decisions'] == {AutoScaler.HOLD: 1, AutoScaler.SATURATED: 1}
+
+
+def test_shrink_idle():
+    scaler = AutoScaler(10)
+    assert scaler.decide(size=3, maxsize=3, minsize=1, waiting=0, idle=2) == AutoScaler.SHRINK
+    assert scaler.decide(size=1, maxsize=1, minsize=1, waiting=0, idle=1) == AutoScaler.HOLD
+    assert [entry.action for entry in scaler.history()] == [AutoScaler.HOLD, AutoScaler.SHRINK]
+
+
+@pytest.mark.asyncio
+async def test_pool_autoscale(create_connection_pool, event_loop, local_server):
+    scaler = AutoScaler(4, target_wait=0, interval=0.05, idle_timeout=0.1)
+    pool = await create_connection_pool(local_server, loop=event_loop, minsize=1, maxsize=1, autoscaler=scaler)
+
+    async def worker():
+        for i in range(20):
+            await pool.execute('set', 'a', i)
+
+    for i in range(5):
+        await asyncio.gather(*[worker() for j in range(10)], loop=event_loop)
+        await asyncio.sleep(0.06, loop=event_loop)
+    assert pool.maxsize > 1
+    assert 'autoscaler' in pool.stats()
+
+    # 空闲之后回收到minsize
+    await asyncio.sleep(0.5, loop=event_loop)
+    assert pool.size == pool.maxsize == 1
@@ -0,0 +1,91 @@
+import io
+import asyncio
+import pytest
+import gzip
+from aiossdb.bulk import BulkLoader, Checkpoint, read_dump_chunks, _read_record, DUMP_HEADER
+from aiossdb.parser import encode_command
+
+
+def test_checkpoint_order(tmpdir):
+    path = str(tmpdir.join('checkpoint.json'))
+    checkpoint = Checkpoint(path)
+    assert checkpoint.load() is None
+
+    # 批次1先完成，但是批次0还没有完成，不能保存
+    checkpoint.done(1, ['kv', '', 'b', ''])
+    assert checkpoint.load() is None
+    checkpoint.done(0, ['kv', '', 'a', ''])
+    assert checkpoint.load() == ['kv', '', 'b', '']
+
+    checkpoint.clear()
+    assert checkpoint.load() is None
+
+
+def test_read_record():
+    f = io.BytesIO(encode_command('multi_set', 'a', b'1\n2', 'b', 2) + encode_command('multi_hset', 'h', 'k', 'v'))
+    assert _read_record(f) == [b'multi_set', b'a', b'1\n2', b'b', b'2']
+    assert _read_record(f) == [b'multi_hset', b'h', b'k', b'v']
+    assert _read_record(f) is None
+
+
+@pytest.mark.asyncio
+async def test_dump_and_load(create_connection_pool, event_loop, local_server, tmpdir):
+    pool = await create_connection_pool(local_server, loop=event_loop, encoding=None)
+    await pool.execute('set', 'bulk_a', b'\x00\n1')
+    await pool.execute('setx', 'bulk_ttl', 'x', 100)
+    await pool.execute('hset', 'bulk_h', 'k', 'v')
+    await pool.execute('zset', 'bulk_z', 'm', 3)
+
+    path = str(tmpdir.join('backup.dump.gz'))
+    result = await BulkLoader(chunk_size=2, loop=event_loop).dump(pool, path)
+    assert result['items'] >= 3
+
+    await pool.execute('del', 'bulk_a')
+    await pool.execute('del', 'bulk_ttl')
+    await pool.execute('hclear', 'bulk_h')
+    await pool.execute('zclear', 'bulk_z')
+
+    result = await BulkLoader(loop=event_loop).load(path, pool)
+    assert result['items'] >= 3
+    assert (await pool.execute('get', 'bulk_a')) == [b'\x00\n1']
+    # 过期时间被保留，没有过期时间的key仍然是永久的
+    assert (await pool.execute('get', 'bulk_ttl')) == [b'x']
+    assert 0 < int((await pool.execute('ttl', 'bulk_ttl'))[0]) <= 100
+    assert (await pool.execute('ttl', 'bulk_a')) == [b'-1']
+    assert (await pool.execute('hget', 'bulk_h', 'k')) == [b'v']
+    assert (await pool.execute('zget', 'bulk_z', 'm')) == [b'3']
+
+
+@pytest.mark.asyncio
+async def test_dump_resume_truncates(create_connection_pool, event_loop, local_server, tmpdir):
+    pool = await create_connection_pool(local_server, loop=event_loop, encoding=None)
+    await pool.execute('multi_set', 'bulk_r1', '1', 'bulk_r2', '2')
+    path = str(tmpdir.join('resume.dump.gz'))
+    written = DUMP_HEADER + encode_command('multi_set', 'bulk_r1', '1')
+    # 检查点之后写入了一半的记录，续传的时候要丢弃
+    with gzip.open(path, 'wb') as f:
+        f.write(written + b'9\nmulti_')
+    checkpoint = str(tmpdir.join('checkpoint.json'))
+    Checkpoint(checkpoint).save(['kv', '', 'bulk_r1', ''], len(written))
+
+    await BulkLoader(checkpoint=checkpoint, loop=event_loop).dump(pool, path)
+    queue = asyncio.Queue(loop=event_loop)
+    await read_dump_chunks(path, queue, loop=event_loop)
+    keys = []
+    while 1:
+        chunk = queue.get_nowait()
+        if chunk is None:
+            break
+        if chunk.command == 'multi_set':
+            keys.extend(chunk.args[::2])
+    assert keys.count(b'bulk_r1') == 1
+    assert b'bulk_r2' in keys
+    await pool.execute('multi_del', 'bulk_r1', 'bulk_r2')
+
+
+@pytest.mark.asyncio
+async def test_invalid_dump_header(event_loop, tmpdir):
+    path = tmpdir.join('bad.dump')
+    path.write_binary(b'not a dump\n')
+    with pytest.raises(ValueError):
+        await read_dump_chunks(str(path), asyncio.Queue(loop=event_loop), loop=event_loop)
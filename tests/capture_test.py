@@ -0,0 +1,95 @@
+import pytest
+from aiossdb import TrafficCapture, StubServer, create_connection
+from aiossdb.capture import read_capture
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_capture_roundtrip(event_loop, tmpdir):
+    path = str(tmpdir.join('traffic.gz'))
+    clock = Clock()
+    capture = TrafficCapture(path, salt='s', clock=clock, loop=event_loop)
+    capture.record('set', ('user:1', 'x' * 100))
+    clock.now = 0.5
+    capture.record('get', ('user:1',))
+    capture.record('scan', ('', '', 10))
+    capture.close()
+    records = list(read_capture(path))
+    assert [r.time for r in records] == [0.0, 0.5, 0.5]
+    assert [r.command for r in records] == ['set', 'get', 'scan']
+    # key被匿名化，相同的key得到相同的值，value只保留长度
+    key = records[0].args[0]
+    assert key != b'user:1' and records[1].args == [key]
+    assert records[0].args[1] == b'x' * 100
+    assert records[2].args == [b'', b'', b'10']
+    assert capture.stats()['records'] == 3
+
+
+def test_capture_options(event_loop, tmpdir):
+    path = str(tmpdir.join('traffic.txt'))
+    capture = TrafficCapture(path, anonymize=False, max_records=2, buffer_size=1, loop=event_loop)
+    capture.record('hget', ('name', 'a\tb'))
+    assert capture.stats()['buffered'] == 0
+    capture.record('get', ('a',))
+    capture.record('get', ('b',))
+    capture.close()
+    records = list(read_capture(path))
+    assert records[0].args == [b'name', b'a\tb']
+    assert len(records) == 2
+
+    sampled = TrafficCapture(str(tmpdir.join('sampled.txt')), sample_rate=0.5, loop=event_loop)
+    for i in range(1000):
+        sampled.record('get', ('a',))
+    sampled.close()
+    assert 300 < sampled.stats()['records'] < 700
+
+
+def test_not_capture_file(tmpdir):
+    path = tmpdir.join('other.txt')
+    path.write('hello\n')
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+
+@pytest.mark.asyncio
+async def test_capture_flush_in_executor(event_loop, tmpdir):
+    path = str(tmpdir.join('traffic.txt'))
+    capture = TrafficCapture(path, anonymize=False, loop=event_loop)
+    capture.record('get', ('a',))
+    # 写文件在后台线程中进行，等待返回的期物之后数据已经写入
+    await capture.flush()
+    with open(path) as f:
+        assert f.read().count('\n') == 2
+    assert capture.flush() is None
+    capture.close()
+    assert capture.stats()['errors'] == 0
+
+
+@pytest.mark.asyncio
+async def test_capture_password_and_numeric_keys(event_loop, tmpdir):
+    path = str(tmpdir.join('traffic.txt'))
+    capture = TrafficCapture(path, salt='s', loop=event_loop)
+    server = StubServer(loop=event_loop)
+    address = await server.start()
+    conn = await create_connection(address, password='123456', loop=event_loop, capture=capture)
+    await conn.execute('set', '10086', 'v')
+    await conn.execute('scan', '', '', 10)
+    conn.close()
+    capture.close()
+
+    # auth不会被录制，数字的key也会被匿名化，只有limit这类参数原样保存
+    records = list(read_capture(path))
+    assert [r.command for r in records] == ['set', 'scan']
+    assert records[0].args[0] != b'10086'
+    assert records[1].args == [b'', b'', b'10']
+    with open(path) as f:
+        content = f.read()
+    assert '123456' not in content and '10086' not in content
+    server.close()
+    await server.wait_closed()
@@ -0,0 +1,47 @@
+import pytest
+from aiossdb import Client, Codec, get_codec, register_codec
+from aiossdb.codecs import encode_args, decode_reply
+
+
+class UpperCodec(Codec):
+    name = 'upper'
+
+    def encode(self, value):
+        return value.upper().encode()
+
+    def decode(self, data):
+        return data.decode().lower()
+
+
+def test_registry():
+    assert get_codec(None) is None
+    assert get_codec('json') is get_codec('json')
+    codec = UpperCodec()
+    assert get_codec(codec) is codec
+    register_codec('upper', UpperCodec)
+    assert isinstance(get_codec('upper'), UpperCodec)
+    with pytest.raises(ValueError):
+        get_codec('unknown')
+
+
+def test_value_positions():
+    codec = get_codec('json')
+    assert encode_args(codec, 'hset', ['h', 'k', {'a': 1}]) == ['h', 'k', b'{"a":1}']
+    assert encode_args(codec, 'multi_set', ['a', 1, 'b', [2]]) == ['a', b'1', 'b', b'[2]']
+    assert encode_args(codec, 'incr', ['a', 1]) == ['a', 1]
+    reply = [bytearray(b'a'), bytearray(b'{"a":1}'), bytearray(b'b'), bytearray(b'null')]
+    assert decode_reply(codec, 'multi_get', reply, 'utf-8') == ['a', {'a': 1}, 'b', None]
+    assert decode_reply(get_codec('raw'), 'get', [bytearray(b'\xff')]) == [b'\xff']
+
+
+@pytest.mark.asyncio
+async def test_client_codec(event_loop):
+    c = Client(loop=event_loop, codec='json')
+    await c.set('a', {'x': [1, 2]})
+    assert await c.get('a') == [{'x': [1, 2]}]
+    # 单次调用覆盖客户端的codec
+    assert await c.get('a', codec='str') == ['{"x":[1,2]}']
+    assert await c.get('a', codec=None) == ['{"x":[1,2]}']
+    await c.hset('hash_name', 'key', [1, 'b'])
+    assert await c.hget('hash_name', 'key') == [[1, 'b']]
+    await c.close()
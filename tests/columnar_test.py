@@ -0,0 +1,39 @@
+import pytest
+from aiossdb import SSDBParser, ColumnarList, ColumnarPairs
+
+
+def test_parser_reply_factory():
+    parser = SSDBParser()
+    parser.reply_factory = ColumnarPairs
+    parser.feed(b'2\nok\n1\na\n2\n10\n1\nb\n2\n-3\n\n')
+    reply = parser.gets()
+    assert isinstance(reply, ColumnarPairs)
+    assert len(reply) == 2
+    assert list(reply) == [(b'a', 10), (b'b', -3)]
+    assert list(reply.values) == [10, -3]
+    assert reply[1] == (b'b', -3)
+    assert reply.decode() == [('a', 10), ('b', -3)]
+
+    parser.reply_factory = ColumnarList
+    parser.feed(b'2\nok\n1\na\n3\nbcd\n\n')
+    reply = parser.gets()
+    assert list(reply) == [b'a', b'bcd']
+    assert list(reply.offsets) == [0, 1, 4]
+    assert reply[-1] == b'bcd'
+
+
+def test_not_int_value():
+    parser = SSDBParser()
+    parser.reply_factory = ColumnarPairs
+    parser.feed(b'2\nok\n1\na\n1\nx\n\n')
+    reply = parser.gets()
+    assert isinstance(reply.error, ValueError)
+
+
+@pytest.mark.asyncio
+async def test_columnar_zscan(pool):
+    await pool.execute('multi_zset', 'zset_name', 'a', 1, 'b', 2, 'c', 3)
+    reply = await pool.execute('zscan', 'zset_name', '', '', '', 10, reply_factory=ColumnarPairs)
+    assert list(reply) == [(b'a', 1), (b'b', 2), (b'c', 3)]
+    # 同一条连接上后续的命令不受影响
+    assert await pool.execute('zget', 'zset_name', 'a') == ['1']
@@ -0,0 +1,55 @@
+import json
+import pytest
+from aiossdb import Client, Compression, CompressionPolicy
+from aiossdb.compression import MAGIC
+
+
+@pytest.mark.asyncio
+async def test_compress_roundtrip(event_loop):
+    compression = Compression(CompressionPolicy('zlib', threshold=100), loop=event_loop)
+    doc = json.dumps({'items': list(range(1000))}).encode()
+    data = await compression.compress(doc, compression.policy)
+    assert data.startswith(MAGIC)
+    assert len(data) < len(doc)
+    assert await compression.decompress(data) == doc
+    # 低于阈值的value原样保存
+    assert await compression.compress('short', compression.policy) == b'short'
+    assert await compression.decompress(b'short') == b'short'
+    # 原始数据本身以MAGIC开头时，读取的时候不能被当作压缩数据
+    raw = MAGIC + b'abc'
+    assert await compression.decompress(await compression.compress(raw, None)) == raw
+
+
+@pytest.mark.asyncio
+async def test_prefix_policy(event_loop):
+    policy = CompressionPolicy('zlib', threshold=10)
+    compression = Compression(policy, prefixes={'raw:': None, 'raw:zip:': policy}, loop=event_loop)
+    assert compression.get_policy('user:1') is policy
+    assert compression.get_policy('raw:1') is None
+    assert compression.get_policy(b'raw:zip:1') is policy
+    args = await compression.compress_args('multi_set', ['a', 'x' * 100, 'raw:b', 'x' * 100])
+    assert args[1].startswith(MAGIC)
+    assert args[3] == b'x' * 100
+
+
+@pytest.mark.asyncio
+async def test_client_compression(event_loop):
+    compression = Compression(CompressionPolicy('zlib', threshold=100), offload_threshold=1000, loop=event_loop)
+    c = Client(loop=event_loop, compression=compression)
+    doc = json.dumps({'items': list(range(1000))})
+    await c.set('a', doc)
+    await c.hset('hash_name', 'key', doc)
+    assert await c.get('a') == [doc]
+    assert await c.hget('hash_name', 'key') == [doc]
+    assert await c.multi_get('a') == ['a', doc]
+    assert await c.get('a', encoding=None) == [doc.encode()]
+    stats = compression.stats()
+    assert stats['compressed'] == 2
+    assert stats['offloaded'] > 0
+
+    # 没有配置压缩的客户端读到的是压缩后的数据
+    plain = Client(loop=event_loop)
+    res = await plain.get('a', encoding=None)
+    assert res[0].startswith(MAGIC)
+    await c.close()
+    await plain.close()
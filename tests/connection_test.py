@@ -172,9 +172,8 @@ async def test_execute_commands(create_connection, event_loop, local_server):
     with pytest.raises(ReplyError):
         await conn.execute('get', 'a')
 
-    assert conn.closed
-
-    conn = await create_connection(address, loop=event_loop)
+    # 错误返回会被完整读取，连接可以继续使用
+    assert not conn.closed
 
     await conn.execute('hset', 'hname', 'hkey', 1)
 
@@ -186,7 +185,7 @@ async def test_execute_commands(create_connection, event_loop, local_server):
     with pytest.raises(ReplyError):
         await conn.execute('hget', 'hname', 'hkey')
 
-    assert conn.closed
+    assert not conn.closed
 
     conn = await create_connection(address, loop=event_loop)
 
@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from aiossdb import QueueConsumer, QueueProducer
+
+
+@pytest.mark.asyncio
+async def test_producer_batches(pool, event_loop):
+    await pool.execute('qclear', 'consumer_q')
+    producer = QueueProducer(pool, 'consumer_q', batch_size=10, loop=event_loop)
+    await asyncio.gather(*[producer.put(i) for i in range(25)], loop=event_loop)
+    await producer.flush()
+    res = await pool.execute('qsize', 'consumer_q')
+    assert res[0] == '25'
+    await pool.execute('qclear', 'consumer_q')
+
+
+@pytest.mark.asyncio
+async def test_producer_put_nothing(pool, event_loop):
+    await pool.execute('qclear', 'consumer_q')
+    producer = QueueProducer(pool, 'consumer_q', loop=event_loop)
+    assert await asyncio.wait_for(producer.put(), 1, loop=event_loop) == 0
+    # 之后的put不受影响
+    await asyncio.wait_for(asyncio.gather(producer.put(1), producer.put(), producer.put(2), loop=event_loop),
+                           1, loop=event_loop)
+    res = await pool.execute('qsize', 'consumer_q')
+    assert res[0] == '2'
+    await pool.execute('qclear', 'consumer_q')
+
+
+@pytest.mark.asyncio
+async def test_consumer(pool, event_loop):
+    await pool.execute('qclear', 'consumer_q')
+    await pool.execute('qpush_back', 'consumer_q', *range(50))
+    items = []
+
+    async def handler(item):
+        items.append(item)
+
+    consumer = QueueConsumer(pool, 'consumer_q', handler, batch_size=8, concurrency=3, loop=event_loop)
+    consumer.start()
+    for i in range(100):
+        if len(items) == 50:
+            break
+        await asyncio.sleep(0.01, loop=event_loop)
+    await consumer.stop()
+
+    assert sorted(items, key=int) == [str(i) for i in range(50)]
+    stats = consumer.stats()
+    assert stats['processed'] == 50
+    assert stats['popped'] == 50
+    assert stats['empty_polls'] > 0
+
+
+@pytest.mark.asyncio
+async def test_consumer_push_back(pool, event_loop):
+    await pool.execute('qclear', 'consumer_q')
+    await pool.execute('qpush_back', 'consumer_q', *range(20))
+
+    async def handler(item):
+        await asyncio.sleep(1, loop=event_loop)
+
+    consumer = QueueConsumer(pool, 'consumer_q', handler, batch_size=10, concurrency=1, loop=event_loop)
+    consumer.start()
+    await asyncio.sleep(0.05, loop=event_loop)
+    await consumer.stop()
+
+    # 只有正在处理的一个元素被消费，其它的按照原来的顺序放回队列
+    res = await pool.execute('qrange', 'consumer_q', 0, -1)
+    assert res == [str(i) for i in range(1, 20)]
+    await pool.execute('qclear', 'consumer_q')
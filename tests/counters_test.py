@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from aiossdb import Client, CounterAggregator, PoolClosedError
+
+
+@pytest.mark.asyncio
+async def test_coalesce(pool, event_loop):
+    await pool.execute('del', 'counter_a')
+    await pool.execute('hclear', 'counter_h')
+    counters = CounterAggregator(pool, interval=10, loop=event_loop)
+    for i in range(100):
+        counters.incr('counter_a')
+        counters.hincr('counter_h', 'x', 2)
+    counters.incr('counter_a', -10)
+    assert counters.pending == 2
+    await counters.flush()
+    assert await pool.execute('get', 'counter_a') == ['90']
+    assert await pool.execute('hget', 'counter_h', 'x') == ['200']
+    stats = counters.stats()
+    assert stats['increments'] == 201
+    assert stats['commands'] == 2
+    assert stats['pending'] == 0
+    await counters.close()
+    with pytest.raises(PoolClosedError):
+        counters.incr('counter_a')
+    await pool.execute('del', 'counter_a')
+    await pool.execute('hclear', 'counter_h')
+
+
+@pytest.mark.asyncio
+async def test_flush_on_interval_and_size(pool, event_loop):
+    keys = ['counter_{}'.format(i) for i in range(10)]
+    await pool.execute('multi_del', *keys)
+    counters = CounterAggregator(pool, interval=0.05, max_keys=5, batch_size=2, loop=event_loop)
+    for key in keys[:5]:
+        counters.incr(key)
+    # 达到max_keys立即写入
+    assert counters.pending == 0
+    counters.incr(keys[5], 3)
+    await asyncio.sleep(0.2, loop=event_loop)
+    assert counters.pending == 0
+    assert await pool.execute('get', keys[5]) == ['3']
+    assert counters.stats()['flushes'] == 2
+    await counters.close()
+    await pool.execute('multi_del', *keys)
+
+
+@pytest.mark.asyncio
+async def test_loss_metrics(pool, event_loop):
+    await pool.execute('set', 'counter_text', 'abc')
+    counters = CounterAggregator(pool, interval=10, max_keys=10, max_pending=2, loop=event_loop)
+    counters.incr('counter_text', 5)
+    counters.incr('counter_b')
+    counters.incr('counter_c', 7)
+    stats = counters.stats()
+    assert stats['dropped'] == 1
+    await counters.close()
+    stats = counters.stats()
+    # value不是整数，服务器返回错误
+    assert stats['rejected'] == 1
+    assert stats['lost_delta'] == 12
+    await pool.execute('multi_del', 'counter_text', 'counter_b')
+
+
+@pytest.mark.asyncio
+async def test_client_executor(event_loop):
+    c = Client(loop=event_loop)
+    await c.delete('counter_a')
+    counters = CounterAggregator(c, loop=event_loop)
+    counters.incr('counter_a', 5)
+    await counters.close()
+    assert await c.get('counter_a') == ['5']
+    await c.delete('counter_a')
+    await c.close()
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from aiossdb import FlowControl, StubServer, ConnectionClosedError, create_connection
+
+
+@pytest.mark.asyncio
+async def test_flow_control_limits(event_loop):
+    parent = FlowControl(max_commands=3, loop=event_loop)
+    flow = FlowControl(max_bytes=10, parent=parent, loop=event_loop)
+
+    # 没有在途命令的时候总是放行
+    await flow.wait()
+    flow.add(20)
+    assert flow.full
+    assert parent.pending == 1
+    assert parent.pending_bytes == 20
+
+    waiter = asyncio.ensure_future(flow.wait(), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    assert not waiter.done()
+    assert flow.waiting == 1
+
+    flow.release(20)
+    await asyncio.sleep(0, loop=event_loop)
+    assert waiter.done()
+    assert parent.pending == 0
+    assert flow.stats()['waits'] == 1
+    assert flow.stats()['peak_bytes'] == 20
+
+
+@pytest.mark.asyncio
+async def test_flow_control_parent_blocks(event_loop):
+    parent = FlowControl(max_commands=1, loop=event_loop)
+    flow1 = FlowControl(parent=parent, loop=event_loop)
+    flow2 = FlowControl(parent=parent, loop=event_loop)
+    flow1.add(1)
+
+    waiter = asyncio.ensure_future(flow2.wait(), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    assert not waiter.done()
+    assert parent.waiting == 1
+
+    flow1.release(1)
+    await asyncio.sleep(0, loop=event_loop)
+    assert waiter.done()
+
+
+@pytest.mark.asyncio
+async def test_flow_control_cancel_woken_waiter(event_loop):
+    flow = FlowControl(max_commands=1, loop=event_loop)
+    flow.add(1)
+    first = asyncio.ensure_future(flow.wait(), loop=event_loop)
+    second = asyncio.ensure_future(flow.wait(), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+
+    # 第一个协程被唤醒之后、使用名额之前被取消，名额要交给第二个
+    flow.release(1)
+    first.cancel()
+    await asyncio.sleep(0, loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    assert first.cancelled()
+    assert second.done()
+
+
+@pytest.mark.asyncio
+async def test_flow_control_wake_several(event_loop):
+    flow = FlowControl(max_bytes=10, loop=event_loop)
+    flow.add(10)
+    waiters = [asyncio.ensure_future(flow.wait(), loop=event_loop) for i in range(4)]
+    await asyncio.sleep(0, loop=event_loop)
+
+    async def send(waiter):
+        await waiter
+        flow.add(3)
+
+    senders = [asyncio.ensure_future(send(waiter), loop=event_loop) for waiter in waiters]
+    # 一条大命令返回之后，能放下的几条小命令都被放行
+    flow.release(10)
+    await asyncio.sleep(0.01, loop=event_loop)
+    assert [sender.done() for sender in senders] == [True, True, True, True]
+    assert flow.pending_bytes == 12
+
+    flow = FlowControl(max_commands=3, loop=event_loop)
+    for i in range(3):
+        flow.add(1)
+    waiters = [asyncio.ensure_future(flow.wait(), loop=event_loop) for i in range(3)]
+    await asyncio.sleep(0, loop=event_loop)
+    senders = [asyncio.ensure_future(send(waiter), loop=event_loop) for waiter in waiters]
+    flow.release(1)
+    flow.release(1)
+    await asyncio.sleep(0.01, loop=event_loop)
+    # 释放了两个名额，放行两个，第三个继续等待
+    assert [sender.done() for sender in senders] == [True, True, False]
+    flow.release(1)
+    await asyncio.wait_for(senders[2], 1, loop=event_loop)
+
+
+@pytest.mark.asyncio
+async def test_flow_control_connection_closed_while_waiting(event_loop):
+    server = StubServer(latency=0.05, loop=event_loop)
+    address = await server.start()
+    parent = FlowControl(max_commands=1, loop=event_loop)
+    conns = [await create_connection(address, loop=event_loop, flow=FlowControl(parent=parent, loop=event_loop))
+             for i in range(3)]
+    busy = conns[0].execute('set', 'a', 1)
+
+    closing = asyncio.ensure_future(conns[1].wait_writable(), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    waiting = asyncio.ensure_future(conns[2].wait_writable(), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    conns[1].close()
+
+    # 第一个被唤醒的连接已经关闭，名额要交给下一个等待的协程
+    await busy
+    with pytest.raises(ConnectionClosedError):
+        await closing
+    await asyncio.wait_for(waiting, 1, loop=event_loop)
+    assert await conns[2].execute('get', 'a') == ['1']
+    for conn in conns:
+        conn.close()
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_pool_flow_control(create_connection_pool, event_loop, local_server):
+    pool = await create_connection_pool(local_server, loop=event_loop, maxsize=4,
+                                        max_pending=2, write_buffer_limits=(4096, 1024))
+    await asyncio.gather(*[pool.execute('set', 'a', i) for i in range(10)], loop=event_loop)
+    stats = pool.stats()
+    assert stats['pending'] == 0
+    assert stats['flow']['pending'] == 0
+    assert stats['flow']['peak_pending'] <= 2
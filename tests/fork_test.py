@@ -0,0 +1,76 @@
+import os
+import asyncio
+import pytest
+
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="fork is not supported")
+
+
+def _run_in_child(func):
+    """在fork出的子进程中使用新的事件循环运行func，返回子进程的退出码"""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(func(loop))
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return status
+
+
+def test_after_fork(create_connection_pool, local_server, event_loop):
+    pool = event_loop.run_until_complete(create_connection_pool(local_server, minsize=2))
+    event_loop.run_until_complete(pool.execute('set', 'fork_key', 'parent'))
+
+    async def child(loop):
+        await pool.after_fork(loop)
+        # 预先建立了minsize条新的连接
+        assert pool.freesize == 2
+        assert len(pool._orphans) == 2
+        assert await pool.execute('get', 'fork_key') == ['parent']
+        pool.close()
+        await pool.wait_closed()
+
+    assert _run_in_child(child) == 0
+    # 子进程关闭的只是自己的文件描述符，父进程的连接不受影响
+    assert event_loop.run_until_complete(pool.execute('get', 'fork_key')) == ['parent']
+    assert pool.size == 2
+    event_loop.run_until_complete(pool.execute('del', 'fork_key'))
+
+
+def test_detect_fork(create_connection_pool, local_server, event_loop):
+    pool = event_loop.run_until_complete(create_connection_pool(local_server))
+
+    async def child(loop):
+        # 没有调用after_fork，第一次使用的时候发现pid变化
+        assert await pool.execute('set', 'fork_key', 'child') == ['1']
+        assert len(pool._orphans) == 1
+        assert pool.size == 1
+
+    assert _run_in_child(child) == 0
+    assert event_loop.run_until_complete(pool.execute('get', 'fork_key')) == ['child']
+    event_loop.run_until_complete(pool.execute('del', 'fork_key'))
+
+
+def test_after_fork_new_loop(create_connection_pool, local_server, event_loop):
+    pool = event_loop.run_until_complete(create_connection_pool(local_server, minsize=2))
+    connections = list(pool._pool)
+    loop = asyncio.new_event_loop()
+    try:
+        # 同一个进程中换到新的事件循环，原来的连接正常关闭而不是放弃
+        loop.run_until_complete(pool.after_fork(loop))
+        assert all(conn.closed for conn in connections)
+        assert pool._orphans == []
+        assert pool.freesize == 2
+        assert loop.run_until_complete(pool.execute('set', 'fork_key', 'loop')) == ['1']
+        # 换回原来的事件循环，由fixture关闭连接池
+        event_loop.run_until_complete(pool.after_fork(event_loop))
+        assert pool._orphans == []
+        assert event_loop.run_until_complete(pool.execute('get', 'fork_key')) == ['loop']
+        event_loop.run_until_complete(pool.execute('del', 'fork_key'))
+    finally:
+        loop.close()
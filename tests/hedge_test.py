@@ -0,0 +1,40 @@
+import pytest
+from aiossdb import HedgePolicy
+
+
+def test_budget():
+    policy = HedgePolicy(0.01, budget=0.1, burst=1)
+    assert not policy.should_hedge('set')
+    assert policy.should_hedge('get')
+    assert policy.try_hedge()
+    assert not policy.try_hedge()
+    for i in range(11):
+        policy.should_hedge('hget')
+    assert policy.try_hedge()
+    stats = policy.stats()
+    assert stats['requests'] == 12
+    assert stats['hedged'] == 2
+    assert stats['budget_exhausted'] == 1
+
+
+def test_percentile_delay():
+    policy = HedgePolicy(0.05, percentile=0.9, min_delay=0.001)
+    assert policy.get_delay() == 0.05
+    for i in range(128):
+        policy.record(0.002 if i % 10 else 0.02)
+    assert 0.001 <= policy.get_delay() <= 0.02
+    for i in range(1024):
+        policy.record(0)
+    assert policy.get_delay() == 0.001
+
+
+@pytest.mark.asyncio
+async def test_pool_hedge(create_connection_pool, event_loop, local_server):
+    policy = HedgePolicy(0, min_delay=0, budget=1)
+    pool = await create_connection_pool(local_server, loop=event_loop, maxsize=4, hedge_policy=policy)
+    await pool.execute('set', 'a', 1)
+    assert await pool.execute('get', 'a') == ['1']
+    assert pool.stats()['hedge']['hedged'] == 1
+    # 落后的请求完成之后连接会正常释放
+    await pool.execute('set', 'b', 2)
+    assert await pool.execute('get', 'b') == ['2']
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from aiossdb import Lane
+from aiossdb.lanes import LaneScheduler
+
+
+@pytest.mark.asyncio
+async def test_reserved_connections(event_loop):
+    interactive, background = Lane('interactive', reserved=1), Lane('background')
+    scheduler = LaneScheduler([background, interactive], 3, loop=event_loop)
+
+    await scheduler.acquire(background)
+    await scheduler.acquire(background)
+    # 最后一个连接保留给interactive
+    waiter = asyncio.ensure_future(scheduler.acquire(background), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    assert not waiter.done()
+
+    await scheduler.acquire(interactive)
+    assert interactive.in_use == 1
+
+    scheduler.release(interactive)
+    await asyncio.sleep(0, loop=event_loop)
+    assert not waiter.done()
+
+    scheduler.release(background)
+    await asyncio.sleep(0, loop=event_loop)
+    assert waiter.done()
+    assert background.in_use == 2
+    assert scheduler.stats()['background']['waited'] == 1
+
+
+@pytest.mark.asyncio
+async def test_weighted_dispatch(event_loop):
+    interactive, background = Lane('interactive', weight=3), Lane('background', weight=1)
+    scheduler = LaneScheduler([background, interactive], 1, loop=event_loop)
+    await scheduler.acquire(background)
+
+    order = []
+
+    async def worker(lane):
+        await scheduler.acquire(lane)
+        order.append(lane.name)
+
+    tasks = [asyncio.ensure_future(worker(lane), loop=event_loop)
+             for lane in [background] * 4 + [interactive] * 4]
+    await asyncio.sleep(0, loop=event_loop)
+    for i in range(8):
+        scheduler.release(interactive if interactive.in_use else background)
+        await asyncio.sleep(0, loop=event_loop)
+    await asyncio.gather(*tasks, loop=event_loop)
+    # 权重3:1，前4个中interactive占3个
+    assert order[:4].count('interactive') == 3
+
+
+@pytest.mark.asyncio
+async def test_pool_priority(create_connection_pool, event_loop, local_server):
+    pool = await create_connection_pool(local_server, loop=event_loop, maxsize=2,
+                                        lanes=[Lane('default'), Lane('interactive', weight=4, reserved=1)])
+    await asyncio.gather(*[pool.execute('set', 'a', i, priority='interactive' if i % 2 else None)
+                           for i in range(10)], loop=event_loop)
+    stats = pool.stats()['lanes']
+    assert stats['default']['acquired'] == 5
+    assert stats['interactive']['acquired'] == 5
+    assert stats['interactive']['in_use'] == 0
+
+    with pytest.raises(ValueError):
+        await pool.execute('get', 'a', priority='unknown')
@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+from aiossdb import Client, NegativeCache, ReplyError, StubServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_invalidate():
+    clock = Clock()
+    cache = NegativeCache(ttl=1.0, clock=clock)
+    assert not cache.get('get', ('a',))
+    cache.add('get', ('a',), cache.version)
+    cache.add('hget', ('h', 'k'), cache.version)
+    assert cache.get('get', (b'a',))
+    assert cache.get('hget', ('h', 'k'))
+    # 其它命令不使用缓存
+    assert not cache.get('exists', ('a',))
+
+    cache.invalidate('multi_set', ['x', 1, 'a', 2])
+    assert not cache.get('get', ('a',))
+    cache.invalidate('hincr', ['h', 'k', 1])
+    assert not cache.get('hget', ('h', 'k'))
+
+    cache.add('get', ('b',), cache.version)
+    clock.now = 1.5
+    assert not cache.get('get', ('b',))
+    assert len(cache) == 0
+
+
+def test_write_while_in_flight():
+    cache = NegativeCache(ttl=1.0, maxsize=2)
+    version = cache.version
+    cache.invalidate('set', ['a', 1])
+    # 读命令在途的时候a被写入，not_found不能记录
+    cache.add('get', ('a',), version)
+    assert not cache.get('get', ('a',))
+    # 没有被写过的key仍然可以记录
+    cache.add('get', ('b',), version)
+    assert cache.get('get', ('b',))
+    # 失效记录超过maxsize被丢弃之后，保守地不再记录更早版本的结果
+    cache.invalidate('multi_set', ['c', 1, 'd', 1, 'e', 1])
+    cache.add('get', ('f',), version)
+    assert not cache.get('get', ('f',))
+    assert cache.stats()['skipped'] == 2
+
+
+def test_prefixes():
+    cache = NegativeCache(ttl=None, maxsize=2, prefixes={'user:': 10, 'user:tmp:': None})
+    for key in ['user:1', 'user:2', 'user:3', 'user:tmp:1', 'other']:
+        cache.add('get', (key,), cache.version)
+    assert not cache.get('get', ('user:1',))
+    assert cache.get('get', ('user:3',))
+    assert not cache.get('get', ('user:tmp:1',))
+    assert not cache.get('get', ('other',))
+    assert cache.stats()['evicted'] == 1
+
+
+@pytest.mark.asyncio
+async def test_client_missing_ok(event_loop):
+    c = Client(loop=event_loop)
+    await c.delete('not_exist')
+    assert await c.get('not_exist', missing_ok=True) is None
+    with pytest.raises(ReplyError) as exc_info:
+        await c.get('not_exist')
+    assert exc_info.value.etype == 'not_found'
+    assert exc_info.value.command == 'get'
+    await c.close()
+
+
+@pytest.mark.asyncio
+async def test_client_negative_cache(event_loop):
+    cache = NegativeCache(ttl=10)
+    c = Client(loop=event_loop, negative_cache=cache, missing_ok=True)
+    await c.delete('neg_a')
+    await c.hclear('neg_h')
+    assert await c.get('neg_a') is None
+    assert await c.get('neg_a') is None
+    assert await c.hget('neg_h', 'k') is None
+    with pytest.raises(ReplyError):
+        await c.get('neg_a', missing_ok=False)
+    assert cache.stats()['hits'] == 2
+
+    await c.set('neg_a', 1)
+    await c.hset('neg_h', 'k', 2)
+    assert await c.get('neg_a') == ['1']
+    assert await c.hget('neg_h', 'k') == ['2']
+    await c.delete('neg_a')
+    await c.hclear('neg_h')
+    await c.close()
+
+
+class DelayedWriteServer(StubServer):
+    """set在收到之后latency / 2秒才生效，返回仍然在latency秒之后，期间其它连接上的get返回not_found"""
+
+    def handle(self, command, args):
+        if command == 'set':
+            self._loop.call_later(self.latency / 2, super().handle, command, args)
+            return ['ok', 1]
+        return super().handle(command, args)
+
+
+@pytest.mark.asyncio
+async def test_client_negative_cache_overlapping_write(event_loop):
+    server = DelayedWriteServer(latency=0.1, loop=event_loop)
+    host, port = await server.start()
+    cache = NegativeCache(ttl=10)
+    c = Client(host, port, loop=event_loop, negative_cache=cache, missing_ok=True, minsize=2)
+    writing = asyncio.ensure_future(c.set('neg_race', 1), loop=event_loop)
+    await asyncio.sleep(0.01, loop=event_loop)
+    # set已经发送但还没有生效，另一条连接上的get返回not_found
+    assert await c.get('neg_race') is None
+    await writing
+    assert await c.get('neg_race') == ['1']
+    await c.close()
+    server.close()
+    await server.wait_closed()
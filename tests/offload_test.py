@@ -0,0 +1,38 @@
+import pytest
+from aiossdb import ReplyOffload, ReplyError, ProtocolError
+from aiossdb.offload import ReplyFramer, parse_frame
+
+
+def test_framer():
+    framer = ReplyFramer()
+    buf = bytearray(b'2\nok\n3\na\nb\n')
+    assert framer.frame(buf) == -1
+    buf.extend(b'\n9\nnot_found\n\n')
+    end = framer.frame(buf)
+    assert end == 12
+    del buf[:end]
+    assert framer.frame(buf) == len(buf)
+
+    with pytest.raises(ProtocolError):
+        ReplyFramer().frame(bytearray(b'x\nok\n'))
+
+
+def test_parse_frame():
+    assert parse_frame(b'2\nok\n1\na\n\n', 'utf-8') == ['a']
+    assert parse_frame(b'2\nok\n1\na\n\n', decoder=lambda reply: [bytes(val) * 2 for val in reply]) == [b'aa']
+    assert isinstance(parse_frame(b'9\nnot_found\n\n'), ReplyError)
+
+
+@pytest.mark.asyncio
+async def test_pool_offload(create_connection_pool, event_loop, local_server):
+    offload = ReplyOffload(threshold=1000)
+    pool = await create_connection_pool(local_server, loop=event_loop, offload=offload)
+    await pool.execute('set', 'big', 'x' * 2000)
+    assert await pool.execute('get', 'big') == ['x' * 2000]
+    with pytest.raises(ReplyError):
+        await pool.execute('get', 'not_exists_key')
+    # 按照完整的返回切分之后，错误返回不会破坏连接
+    assert await pool.execute('get', 'big', encoding=None) == [b'x' * 2000]
+    stats = pool.stats()['offload']
+    assert stats['offloaded'] == 2
+    assert stats['inline'] == 2
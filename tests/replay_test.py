@@ -0,0 +1,53 @@
+import pytest
+from aiossdb import StubServer, TrafficCapture, Client
+from aiossdb.capture import read_capture
+from aiossdb.replay import replay
+
+
+@pytest.mark.asyncio
+async def test_stub_server(event_loop):
+    server = StubServer(loop=event_loop)
+    host, port = await server.start()
+    c = Client(host, port, loop=event_loop)
+    await c.set('a', 1)
+    assert await c.get('a') == ['1']
+    assert await c.incr('a', 2) == ['3']
+    assert await c.get('b', missing_ok=True) is None
+    await c.qpush_back('q', 1, 2)
+    assert await c.qpop_front('q', 5) == ['1', '2']
+    assert await c.qpop_front('q', 5) == []
+    await c.close()
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_capture_and_replay(event_loop, create_connection_pool, tmpdir):
+    path = str(tmpdir.join('traffic.gz'))
+    capture = TrafficCapture(path)
+    server = StubServer(loop=event_loop)
+    address = await server.start()
+    pool = await create_connection_pool(address, capture=capture)
+    for i in range(50):
+        await pool.execute('set', 'key{}'.format(i % 5), 'v' * i)
+        await pool.execute('get', 'key{}'.format(i % 7), missing_ok=True)
+    assert pool.stats()['capture']['records'] == 100
+    pool.close()
+    await pool.wait_closed()
+    capture.close()
+
+    target = StubServer(loop=event_loop)
+    address = await target.start()
+    pool = await create_connection_pool(address, encoding=None)
+    report = await replay(pool, read_capture(path), speed=0, concurrency=10, loop=event_loop)
+    assert report['commands'] == 100
+    assert report['errors'] == report['failures'] == 0
+    assert report['latency']['p50'] is not None
+    assert target.commands == 100
+    # 5个不同的key被写入
+    assert len(target.kv) == 5
+    pool.close()
+    await pool.wait_closed()
+    for s in (server, target):
+        s.close()
+        await s.wait_closed()
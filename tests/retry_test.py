@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from aiossdb import RetryPolicy, CircuitBreaker, CircuitOpenError, ConnectionClosedError
+
+
+def test_retry_policy():
+    policy = RetryPolicy(retries=2, backoff=0.1, max_backoff=0.3, jitter=0)
+    assert policy.should_retry('get', 0)
+    assert policy.should_retry('SET ', 1)
+    assert not policy.should_retry('get', 2)
+    # incr重复执行会改变结果，不能重试
+    assert not policy.should_retry('incr', 0)
+    assert policy.get_delay(0) == pytest.approx(0.1)
+    assert policy.get_delay(1) == pytest.approx(0.2)
+    assert policy.get_delay(5) == pytest.approx(0.3)
+
+    policy = RetryPolicy(backoff=0.1, jitter=0.5)
+    assert 0.05 <= policy.get_delay(0) <= 0.1
+
+
+def test_circuit_breaker(event_loop):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.1, loop=event_loop)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    event_loop.run_until_complete(asyncio.sleep(0.1, loop=event_loop))
+    # 半开状态只放行一个探测请求
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['trips'] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_retry(create_connection_pool, event_loop, local_server):
+    pool = await create_connection_pool(local_server, loop=event_loop,
+                                        retry_policy=RetryPolicy(backoff=0.01))
+    await pool.execute('set', 'a', 1)
+
+    # 模拟服务器断开连接
+    conn, addr = await pool.get_connection()
+    await pool.release(conn)
+    conn._writer.transport.abort()
+
+    res = await pool.execute('get', 'a')
+    assert res[0] == '1'
+    assert pool.size == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_circuit_breaker(create_connection_pool, event_loop, local_server):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, loop=event_loop)
+    pool = await create_connection_pool(local_server, loop=event_loop, circuit_breaker=breaker)
+
+    async def fail(*args, **kwargs):
+        raise ConnectionClosedError("Connection closed or corrupted")
+    pool._execute = fail
+
+    with pytest.raises(ConnectionClosedError):
+        await pool.execute('get', 'a')
+    with pytest.raises(CircuitOpenError):
+        await pool.execute('get', 'a')
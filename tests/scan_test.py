@@ -0,0 +1,83 @@
+import pytest
+from aiossdb import Client, ParallelScan
+from aiossdb.scan import sample_split_points
+
+
+@pytest.fixture
+def scan_keys(pool, event_loop):
+    keys = ['pscan_{:03d}'.format(i) for i in range(100)]
+    event_loop.run_until_complete(pool.execute('multi_set', *[x for k in keys for x in (k, k)]))
+    yield keys
+    event_loop.run_until_complete(pool.execute('multi_del', *keys))
+
+
+@pytest.mark.asyncio
+async def test_parallel_scan_ordered(pool, scan_keys):
+    stream = pool.parallel_scan(start='pscan_', end='pscan_~', partitions=4, page_size=10, ordered=True)
+    pages = []
+    async for page in stream:
+        pages.append(page)
+    items = [x for page in pages for x in page]
+    assert items[::2] == scan_keys
+    assert len(stream.ranges) == 4
+
+
+@pytest.mark.asyncio
+async def test_parallel_scan_splits(pool, scan_keys):
+    stream = pool.parallel_scan('keys', start='pscan_', end='pscan_~',
+                                splits=['pscan_030', 'pscan_060'], page_size=7)
+    assert stream.ranges == [('pscan_', 'pscan_030'), ('pscan_030', 'pscan_060'), ('pscan_060', 'pscan_~')]
+    keys = await stream.collect()
+    assert sorted(keys) == scan_keys
+
+
+@pytest.mark.asyncio
+async def test_client_parallel_scan(event_loop, scan_keys):
+    c = Client(loop=event_loop)
+    stream = c.parallel_scan(start='pscan_', end='pscan_~', partitions=2)
+    assert isinstance(stream, ParallelScan)
+    items = await stream.collect()
+    assert sorted(items[::2]) == scan_keys
+    await c.close()
+
+
+class CountingExecutor:
+    def __init__(self, executor):
+        self.executor = executor
+        self.calls = 0
+        self.keys = 0
+
+    async def execute(self, command, *args):
+        self.calls += 1
+        res = await self.executor.execute(command, *args)
+        self.keys += len(res)
+        return res
+
+
+@pytest.mark.asyncio
+async def test_sample_split_points_whole_range(pool, scan_keys):
+    # key的数量远大于sample_size，只在几个位置上读取少量的key，分割点仍然大致均匀
+    executor = CountingExecutor(pool)
+    points = await sample_split_points(executor, 4, start='pscan_', end='pscan_~', sample_size=20, probes=5)
+    assert len(points) == 3
+    assert executor.calls <= 2 + 5 + 3
+    assert executor.keys < len(scan_keys) / 2
+    positions = [scan_keys.index(point) for point in points]
+    for i, position in enumerate(positions, 1):
+        assert abs(position - 25 * i) <= 10
+    stream = pool.parallel_scan('keys', start='pscan_', end='pscan_~', partitions=4, sample_size=20)
+    assert sorted(await stream.collect()) == scan_keys
+
+
+@pytest.mark.asyncio
+async def test_sample_split_points_small_range(pool, scan_keys):
+    # 范围内的key都被读到的时候分割点是准确的
+    points = await sample_split_points(pool, 4, start='pscan_', end='pscan_~', sample_size=1000)
+    assert points == ['pscan_024', 'pscan_049', 'pscan_074']
+
+
+def test_parallel_scan_invalid(pool):
+    with pytest.raises(ValueError):
+        pool.parallel_scan('zscan')
+    with pytest.raises(ValueError):
+        pool.parallel_scan('hscan')
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from aiossdb import ServerStatsPoller
+from aiossdb.serverstats import parse_info
+
+
+INFO = [
+    'ssdb-server', 'version', '1.9.7', 'links', '3', 'total_calls', '1024', 'dbsize', '2048',
+    'binlogs', '    capacity : 20000000\n    min_seq  : 1\n    max_seq  : 300',
+    'replication', 'slaveof 127.0.0.1:8889\n    id         : svc_2\n    type       : sync\n'
+                   '    status     : SYNC\n    last_seq   : 300\n    copy_count : 0\n    sync_count : 12',
+    'replication', 'client 127.0.0.1:50001\n    type     : sync\n    status   : OUT_OF_SYNC\n    last_seq : 200',
+    'leveldb.stats', '                               Compactions\n'
+                     'Level  Files Size(MB) Time(sec) Read(MB) Write(MB)\n'
+                     '--------------------------------------------------\n'
+                     '  0        2        0         0        0         0\n'
+                     '  1        5       10         2       20        10\n',
+    'cmd.get', 'calls: 100\ttime_wait: 0\ttime_proc: 3',
+]
+
+
+def test_parse_info():
+    info = parse_info(INFO)
+    assert info['version'] == '1.9.7'
+    assert info['links'] == 3
+    assert info['total_calls'] == 1024
+    assert info['binlogs'] == {'capacity': 20000000, 'min_seq': 1, 'max_seq': 300}
+    master, client = info['replication']
+    assert master['role'] == 'slaveof' and master['peer'] == '127.0.0.1:8889'
+    assert master['status'] == 'SYNC' and master['sync_count'] == 12
+    assert client['status'] == 'OUT_OF_SYNC'
+    assert info['compaction']['files'] == 7
+    assert info['compaction']['size_mb'] == 10
+    assert len(info['compaction']['levels']) == 2
+    assert info['calls']['get'] == {'calls': 100, 'time_wait': 0, 'time_proc': 3}
+
+
+@pytest.mark.asyncio
+async def test_pool_server_stats(create_connection_pool, local_server, event_loop):
+    poller = ServerStatsPoller(interval=0.05)
+    pool = await create_connection_pool(local_server, server_stats=poller)
+    for i in range(50):
+        if poller.info is not None:
+            break
+        await asyncio.sleep(0.01, loop=event_loop)
+    stats = pool.stats()['server']
+    assert stats['healthy']
+    assert stats['polls'] >= 1
+    assert isinstance(stats['dbsize'], int)
+    assert isinstance(stats['info']['total_calls'], int)
+    # 轮询使用单独的连接，不占用连接池
+    assert pool.size == pool.freesize
+    pool.close()
+    await pool.wait_closed()
+    assert poller._conn is None
+
+
+@pytest.mark.asyncio
+async def test_unreachable(event_loop):
+    poller = ServerStatsPoller(timeout=0.5, max_failures=2)
+    poller.start(('127.0.0.1', 1), loop=event_loop)
+    poller.stop()
+    await poller.wait_stopped()
+    await poller.poll()
+    assert poller.healthy
+    await poller.poll()
+    assert not poller.healthy
+    assert poller.stats()['last_error'] is not None
@@ -0,0 +1,58 @@
+import pytest
+from aiossdb import SlowLog
+
+
+def test_slowlog_threshold():
+    slowlog = SlowLog(threshold=0.1, maxlen=2)
+    assert slowlog.record(('127.0.0.1', 8888), 'get', ('a',), server_time=0.05) is None
+    assert len(slowlog) == 0
+
+    entry = slowlog.record(('127.0.0.1', 8888), 'get', ('a',), queue_time=0.05, server_time=0.06)
+    assert entry.command == 'get'
+    assert entry.args == ('a',)
+    assert entry.duration == pytest.approx(0.11)
+
+    slowlog.record(('127.0.0.1', 8888), 'set', ('a', 1), server_time=0.2)
+    slowlog.record(('127.0.0.1', 8888), 'del', ('a',), server_time=0.3)
+    # 环形缓冲区只保留最近的两条，最新的在最前面
+    assert [e.command for e in slowlog.get()] == ['del', 'set']
+    assert [e.command for e in slowlog.get(1)] == ['del']
+
+    slowlog.reset()
+    assert len(slowlog) == 0
+
+
+def test_slowlog_truncate_args():
+    slowlog = SlowLog(threshold=0, max_args=2, max_arg_len=4)
+    entry = slowlog.record(('127.0.0.1', 8888), 'multi_set', ('abcdefg', 1, 'c', 'd'))
+    assert entry.args == ('abcd...', '1', '... (2 more arguments)')
+
+
+def test_slowlog_sample():
+    assert not SlowLog(sample_rate=0).sample()
+    assert SlowLog(sample_rate=1).sample()
+
+
+@pytest.mark.asyncio
+async def test_connection_slowlog(create_connection, event_loop, local_server):
+    slowlog = SlowLog(threshold=0)
+    conn = await create_connection(local_server, loop=event_loop, slowlog=slowlog)
+    await conn.execute('set', 'a', 1)
+    await conn.execute('get', 'a')
+
+    entries = slowlog.get()
+    assert [e.command for e in entries] == ['get', 'set']
+    assert entries[0].args == ('a',)
+    assert entries[0].blocks == 1
+    assert entries[0].reply_size > 0
+    assert entries[0].address == conn.address
+
+
+@pytest.mark.asyncio
+async def test_pool_slowlog(create_connection_pool, event_loop, local_server):
+    slowlog = SlowLog(threshold=0)
+    pool = await create_connection_pool(local_server, loop=event_loop, slowlog=slowlog)
+    assert pool.slowlog is slowlog
+    await pool.execute('set', 'a', 1)
+    assert len(slowlog) == 1
+    assert slowlog.get()[0].queue_time >= 0
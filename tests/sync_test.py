@@ -0,0 +1,104 @@
+import time
+import asyncio
+import threading
+import pytest
+from aiossdb import SyncClient, PoolClosedError, ConnectionClosedError, RetryPolicy, Lane, StubServer
+
+
+def test_sync_client(local_server):
+    host, port = local_server
+    with SyncClient(host, port, max_connection=2) as c:
+        c.set('a', 1)
+        assert c.get('a') == ['1']
+        assert c.get('a', encoding=None) == [b'1']
+        c.set('json_key', {'x': 1}, codec='json')
+        assert c.get('json_key', codec='json') == [{'x': 1}]
+        with pytest.raises(TypeError):
+            c.set('a', None)
+    with pytest.raises(PoolClosedError):
+        c.get('a')
+
+
+def test_sync_client_threads(local_server):
+    host, port = local_server
+    c = SyncClient(host, port, max_connection=2)
+    errors = []
+
+    def worker(n):
+        for i in range(50):
+            c.set('sync_key_{}'.format(n), i)
+            if c.get('sync_key_{}'.format(n)) != [str(i)]:
+                errors.append(n)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    stats = c.stats()
+    # 所有线程共享最多两条连接
+    assert stats['size'] <= 2
+    assert stats['sync']['commands'] == 8 * 100
+    c.close()
+
+
+def test_sync_client_pool_features(local_server):
+    host, port = local_server
+    # 配置了连接池按命令生效的功能时，命令通过pool.execute执行
+    with SyncClient(host, port, max_connection=2, retry_policy=RetryPolicy(),
+                    lanes=[Lane('default'), Lane('background', reserved=1)]) as c:
+        c.set('sync_lane_key', 1, priority='background')
+        assert c.get('sync_lane_key') == ['1']
+        stats = c.stats()
+        assert stats['lanes']['background']['acquired'] == 1
+        assert stats['lanes']['default']['acquired'] == 1
+        c.delete('sync_lane_key')
+
+
+@pytest.fixture
+def slow_client():
+    """连接到在单独线程中运行、每次返回都延迟的StubServer的SyncClient"""
+    loop = asyncio.new_event_loop()
+    server = StubServer(latency=0.2, loop=loop)
+    host, port = loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    c = SyncClient(host, port)
+    yield c
+    c.close()
+
+    async def stop():
+        server.close()
+        await server.wait_closed()
+        # 等待处理中的请求返回，连接已经关闭，处理协程随后退出
+        await asyncio.sleep(server.latency * 2, loop=loop)
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_sync_client_connection_closed(slow_client):
+    future = slow_client.submit('get', 'a')
+    time.sleep(0.05)
+
+    def close_connections():
+        for conn in list(slow_client._pool._used):
+            conn.close()
+
+    slow_client._loop.call_soon_threadsafe(close_connections)
+    # 连接关闭的时候等待返回的期物被取消，调用者得到异常而不是一直等待
+    with pytest.raises(ConnectionClosedError):
+        future.result(2)
+    assert slow_client.get('a', missing_ok=True) is None
+
+
+def test_sync_client_close_with_inflight(slow_client):
+    futures = [slow_client.submit('get', 'a') for i in range(3)]
+    time.sleep(0.05)
+    slow_client.close()
+    for future in futures:
+        with pytest.raises((PoolClosedError, ConnectionClosedError)):
+            future.result(2)